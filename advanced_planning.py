@@ -2,6 +2,16 @@ from agent import Agent
 from environment import DIRECTIONS
 import heapq
 import random
+import weakref
+import numpy as np
+import planning
+from inference import SAFE, UNCERTAIN, UNSAFE
+from topology import DIRECTION_DELTAS
+from distance_field import DistanceField
+
+# Distance field home per game, keyed by the game's inference engine so it
+# goes away with the game
+home_fields = weakref.WeakKeyDictionary()
 
 def make_random_action(agent, env, actions, action_log):
     possible_actions = ["FORWARD", "TURN_LEFT", "TURN_RIGHT", "GRAB", "CLIMB"]
@@ -24,7 +34,7 @@ def make_random_action(agent, env, actions, action_log):
     elif action == "GRAB":
         if env.grid[agent.position[0]][agent.position[1]].has_gold:
             agent.has_gold = True
-            env.grid[agent.position[0]][agent.position[1]].has_gold = False
+            env.cell(*agent.position).has_gold = False
     elif action == "CLIMB":
         if agent.position == [0, 0] and agent.has_gold:
             agent.exited = True
@@ -32,37 +42,35 @@ def make_random_action(agent, env, actions, action_log):
         agent.arrows -= 1
 
 
-def make_advanced_action(agent, inference, env, actions, action_log):
+def make_advanced_action(agent, inference, env, actions, action_log, params=None):
+    params = params or planning.params
     x, y = agent.position
     # dir_map = {(-1, 0): "N", (0, 1): "E", (1, 0): "S", (0, -1): "W"}
     dir_map = {(0, 1): "N", (1, 0): "E", (0, -1): "S", (-1, 0): "W"}
     dir_index = {"N": 0, "E": 1, "S": 2, "W": 3}
-    env.grid[x][y].visited = True
+    env.cell(x, y).visited = True
+
+    # Status of every cell from one propagation step, plus the visited mask
+    status = inference.status_grid(env.size)
+    visited_mask = np.array([[cell.visited for cell in column] for column in env.grid])
+    # Cells next to a visited one
+    adjacent = env.topology.spread(visited_mask)
+    neighbors = env.topology.neighbors
 
     # Estimate risk/cost for entering a cell
     def get_cell_cost(px, py):
         
-        status = inference.infer([px, py])
-        # print(f"Inferring cell {px}, {py} status: {status}")
+        code = status[px, py]
+        # print(f"Inferring cell {px}, {py} status: {code}")
         
-        if status == "unsafe":
+        if code == UNSAFE:
             return float('inf')  # completely avoid
-        elif status == "uncertain":
-            return 1000  # high penalty
-        elif not env.grid[px][py].visited:
-            return 1  # unvisited but inferred safe
+        elif code == UNCERTAIN:
+            return params.advanced_uncertain_cost  # high penalty
+        elif not visited_mask[px, py]:
+            return params.advanced_unvisited_cost  # unvisited but inferred safe
         else:
-            return 2  # visited and safe
-    def is_adjacent_to_visited(i, j):
-        for x in range(env.size):
-            for y in range(env.size):
-                if env.grid[x][y].visited:
-                    for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                        nx, ny = x + dx, y + dy
-                        if 0 <= nx < env.size and 0 <= ny < env.size:
-                            if nx == i and ny == j:
-                                return True
-        return False
+            return params.advanced_visited_cost  # visited and safe
 
     # Dijkstra search with customizable target
     def run_dijkstra(is_target):
@@ -80,31 +88,24 @@ def make_advanced_action(agent, inference, env, actions, action_log):
             if is_target(pos[0], pos[1]):
                 return path
 
-            for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                nx, ny = pos[0] + dx, pos[1] + dy
-                if 0 <= nx < env.size and 0 <= ny < env.size:
-                    move_cost = get_cell_cost(nx, ny)
-                    if move_cost < float('inf'):
-                        heapq.heappush(heap, (cost + move_cost, (nx, ny), path + [[nx, ny]]))
+            for nx, ny in neighbors[pos[0]][pos[1]]:
+                move_cost = get_cell_cost(nx, ny)
+                if move_cost < float('inf'):
+                    heapq.heappush(heap, (cost + move_cost, (nx, ny), path + [[nx, ny]]))
         return []
     
+    safe_targets = (status == SAFE) & ~visited_mask & adjacent
+    uncertain_targets = (status == UNCERTAIN) & ~visited_mask & adjacent
+
     def target_safe_unvisited_adjacent(i, j):
-        result = (
-            inference.infer([i, j]) == "safe" and 
-            not env.grid[i][j].visited and 
-            is_adjacent_to_visited(i, j)
-        )
-        if result:
+        result = bool(safe_targets[i, j])
+        if result and planning.verbose:
             print(f"Checking cell ({i}, {j}): {result}")
         return result
     
     def target_uncertained_unvisited_adjacent(i, j):
-        result = (
-            inference.infer([i, j]) == "uncertain" and 
-            not env.grid[i][j].visited and 
-            is_adjacent_to_visited(i, j)
-        )
-        if result:
+        result = bool(uncertain_targets[i, j])
+        if result and planning.verbose:
             print(f"Checking cell ({i}, {j}): {result}")
         # print(f"Checking cell ({i}, {j}): {result}")
         return result
@@ -117,8 +118,9 @@ def make_advanced_action(agent, inference, env, actions, action_log):
         actions.append("GRAB")
         action_log.append("GRAB")
         agent.has_gold = True
-        env.grid[x][y].has_gold = False
-        env.grid[x][y].glitter = False
+        cell = env.cell(x, y)
+        cell.has_gold = False
+        cell.glitter = False
         return
 
     # 2. If agent has gold, return to start and climb out
@@ -127,16 +129,29 @@ def make_advanced_action(agent, inference, env, actions, action_log):
             actions.append("CLIMB")
             action_log.append("CLIMB")
             return
-        path = run_dijkstra(lambda i, j: [i, j] == [0, 0])
+        # Read the way home from a distance field kept across steps, instead
+        # of searching again every step
+        field = home_fields.get(inference)
+        if field is None or field.size != env.size:
+            field = home_fields[inference] = DistanceField(env.size)
+        cost = np.where(visited_mask, float(params.advanced_visited_cost), float(params.advanced_unvisited_cost))
+        cost[status == UNCERTAIN] = params.advanced_uncertain_cost
+        cost[status == UNSAFE] = np.inf
+        field.update(cost)
+        dx, dy = DIRECTION_DELTAS[agent.direction]
+        path = field.path((x, y), prefer=(x + dx, y + dy))
+        path = [list(cell) for cell in path[1:]] if path else []
 
     # 3. Otherwise, explore safe & unvisited cells
     else:
         # path = run_dijkstra(lambda i, j: inference.infer([i, j]) == "safe" and not env.grid[i][j].visited)
         path = run_dijkstra(target_safe_unvisited_adjacent)
-        print("Path found to safe unvisited adjacent cells:", path)
+        if planning.verbose:
+            print("Path found to safe unvisited adjacent cells:", path)
         if not path:
             path = run_dijkstra(target_uncertained_unvisited_adjacent)
-            print("Path found to uncertain unvisited adjacent cells:", path)
+            if planning.verbose:
+                print("Path found to uncertain unvisited adjacent cells:", path)
         #     # 4. If nothing safe/unvisited, explore safe (even visited) to keep moving
         #     path = run_dijkstra(lambda i, j: inference.infer([i, j]) == "safe")
         # if not path:
@@ -176,7 +191,7 @@ def make_advanced_action(agent, inference, env, actions, action_log):
     # Move forward
     if agent.move_forward(env):
         new_x, new_y = agent.position
-        env.grid[new_x][new_y].visited = True
+        env.cell(new_x, new_y).visited = True
         actions.append("FORWARD")
         action_log.append("FORWARD")
     else:
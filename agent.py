@@ -1,5 +1,5 @@
-from environment import in_bounds
 from environment import DIRECTIONS
+from topology import DIRECTION_DELTAS
 class Agent:
     def __init__(self):
         self.position = [0, 0]
@@ -7,6 +7,13 @@ class Agent:
         self.has_gold = False
         self.actions = []
         self.arrows = 1
+
+    def fork(self):
+        agent = Agent.__new__(Agent)
+        agent.__dict__ = self.__dict__.copy()
+        agent.position = list(self.position)
+        agent.actions = list(self.actions)
+        return agent
     
     def reset(self):
         self.position = [0, 0]
@@ -22,28 +29,23 @@ class Agent:
         x, y = self.position
         direction = self.direction
 
-        dx, dy = {"N": (0, 1), "E": (1, 0), "S": (0, -1), "W": (-1, 0)}[direction]
-        x += dx
-        y += dy
+        dx, dy = DIRECTION_DELTAS[direction]
 
-        while in_bounds(x, y, env.size):
-            cell = env.grid[x][y]
-            if cell.has_wumpus:
-                cell.has_wumpus = False
-                env.remaining_wumpuses -= 1  # Update count in environment
-                return True  # Wumpus killed
-            x += dx
-            y += dy
+        # The arrow stops at the first wumpus in its line of fire
+        hit = env.wumpus_lines.first_hit(x, y, dx, dy)
+        if hit is not None:
+            env.kill_wumpus(*hit)  # Update count in environment
+            return True  # Wumpus killed
         return False  # Arrow missed
 
 
     def move_forward(self, env):
-        dx, dy = {"N": (0, 1), "E": (1, 0), "S": (0, -1), "W": (-1, 0)}[self.direction]
+        dx, dy = DIRECTION_DELTAS[self.direction]
         new_x = self.position[0] + dx
         new_y = self.position[1] + dy
-        if in_bounds(new_x, new_y, env.size):
+        if env.topology.in_bounds(new_x, new_y):
             self.position = [new_x, new_y]
-            env.grid[new_x][new_y].visited = True
+            env.cell(new_x, new_y).visited = True
             return True
         return False
 
@@ -59,7 +61,7 @@ class Agent:
         x, y = self.position
         if env.grid[x][y].has_gold:
             self.has_gold = True
-            env.grid[x][y].has_gold = False
+            env.cell(x, y).has_gold = False
             return True
         return False
     
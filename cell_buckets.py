@@ -0,0 +1,67 @@
+from bisect import insort
+
+# Cells grouped by square blocks of the board, for nearest-cell queries.
+# A query looks at the blocks closest to the asked position first and stops
+# at the first block that cannot hold anything nearer than what it already
+# has, so the work follows the blocks around the answer, not every cell.
+class CellBuckets:
+    def __init__(self, block=16):
+        self.block = block
+        self.blocks = {}  # (x // block, y // block) -> set of cells
+        self.count = 0
+
+    def add(self, cell):
+        cells = self.blocks.setdefault((cell[0] // self.block, cell[1] // self.block), set())
+        if cell not in cells:
+            cells.add(cell)
+            self.count += 1
+
+    def discard(self, cell):
+        key = (cell[0] // self.block, cell[1] // self.block)
+        cells = self.blocks.get(key)
+        if cells is None or cell not in cells:
+            return
+        cells.discard(cell)
+        if not cells:
+            del self.blocks[key]
+        self.count -= 1
+
+    def copy(self):
+        buckets = CellBuckets(self.block)
+        buckets.blocks = {key: set(cells) for key, cells in self.blocks.items()}
+        buckets.count = self.count
+        return buckets
+
+    def __contains__(self, cell):
+        return cell in self.blocks.get((cell[0] // self.block, cell[1] // self.block), ())
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for cells in self.blocks.values():
+            yield from cells
+
+    # Up to k (distance, cell) pairs closest to pos by Manhattan distance,
+    # nearest first and ties by cell, as sorting every pair would give
+    def nearest(self, pos, k=1):
+        x, y = pos
+        size = self.block
+        order = []
+        for bx, by in self.blocks:
+            x0, y0 = bx * size, by * size
+            dx = x0 - x if x < x0 else max(0, x - x0 - size + 1)
+            dy = y0 - y if y < y0 else max(0, y - y0 - size + 1)
+            order.append((dx + dy, bx, by))
+        order.sort()
+        best = []
+        for bound, bx, by in order:
+            if len(best) == k and bound > best[-1][0]:
+                break
+            for cell in self.blocks[(bx, by)]:
+                pair = (abs(cell[0] - x) + abs(cell[1] - y), cell)
+                if len(best) < k or pair < best[-1]:
+                    insort(best, pair)
+                    if len(best) > k:
+                        best.pop()
+        return best
@@ -0,0 +1,353 @@
+import numpy as np
+from inference import KnowledgeBase, cell_name, STATUS_NAMES, UNCERTAIN
+from line_index import LineIndex
+from zobrist import TranspositionTable
+
+# Clause-based inference backend.
+#
+# Every cell owns a pit variable and a wumpus variable. Percepts are turned
+# into CNF clauses over those variables, unit propagation runs incrementally
+# with two watched literals per clause, and a bounded DPLL search answers
+# entailment queries for a single cell. Literals are signed ints: +v means
+# "variable v is true", -v means "variable v is false".
+
+class ClauseInferenceEngine:
+    def __init__(self, max_decisions=2000):
+        self.kb = KnowledgeBase()       # derived unit facts, same names as InferenceEngine
+        self.max_decisions = max_decisions
+        self.var_of = {}                # (kind, x, y) -> variable
+        self.cell_of = [None]           # variable -> (kind, x, y)
+        self.clauses = []               # clauses with two or more literals
+        self.watches = {}               # literal -> indices of clauses watching it
+        self.occurs = {}                # variable -> indices of clauses containing it
+        self.value = {}                 # variable -> True / False
+        self.trail = []                 # assigned literals, in order
+        self.qhead = 0                  # next trail position to propagate
+        self.original = []              # every clause as asserted, for rebuilds
+        self.inconsistent = False
+        self.synced = 0                 # trail prefix already mirrored into kb
+        self.marks = []                 # saved sizes at each push()
+        self.known_wumpus = LineIndex() # cells whose wumpus variable is true
+        self.size = None                # board size, set by the first percepts
+        self.grids = TranspositionTable(16) # state hash -> status_grid() array
+
+    # Hash of the knowledge state; the mirrored facts pin down the clause set
+    def state_hash(self):
+        return self.kb.hash
+
+    # Variable for a pit ("P") or wumpus ("W") in cell (x, y)
+    def var(self, kind, x, y):
+        key = (kind, x, y)
+        v = self.var_of.get(key)
+        if v is None:
+            v = len(self.cell_of)
+            self.var_of[key] = v
+            self.cell_of.append(key)
+        return v
+
+    def lit_value(self, lit):
+        val = self.value.get(abs(lit))
+        if val is None:
+            return None
+        return val if lit > 0 else not val
+
+    # Add a clause (a list of literals) to the database and propagate
+    def add_clause(self, lits, record=True):
+        if record:
+            self.original.append(tuple(lits))
+        if self.inconsistent:
+            return False
+        clause = []
+        for lit in dict.fromkeys(lits):
+            val = self.lit_value(lit)
+            if val is True or -lit in clause:
+                return True     # already satisfied or tautology
+            if val is None:
+                clause.append(lit)
+        if not clause:
+            self.inconsistent = True
+            return False
+        if len(clause) == 1:
+            self._enqueue(clause[0])
+        else:
+            idx = len(self.clauses)
+            self.clauses.append(clause)
+            self.watches.setdefault(clause[0], []).append(idx)
+            self.watches.setdefault(clause[1], []).append(idx)
+            for lit in clause:
+                self.occurs.setdefault(abs(lit), []).append(idx)
+        if not self._propagate():
+            self.inconsistent = True
+            return False
+        self._sync_facts()
+        return True
+
+    def _enqueue(self, lit):
+        self.value[abs(lit)] = lit > 0
+        self.trail.append(lit)
+
+    # Unit propagation; returns False on conflict
+    def _propagate(self):
+        while self.qhead < len(self.trail):
+            false_lit = -self.trail[self.qhead]
+            self.qhead += 1
+            watching = self.watches.get(false_lit)
+            if not watching:
+                continue
+            keep = []
+            conflict = False
+            for idx in watching:
+                if conflict:
+                    keep.append(idx)
+                    continue
+                clause = self.clauses[idx]
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], clause[0]
+                other = clause[0]
+                if self.lit_value(other) is True:
+                    keep.append(idx)
+                    continue
+                for k in range(2, len(clause)):
+                    if self.lit_value(clause[k]) is not False:
+                        clause[1], clause[k] = clause[k], clause[1]
+                        self.watches.setdefault(clause[1], []).append(idx)
+                        break
+                else:
+                    keep.append(idx)
+                    if self.lit_value(other) is False:
+                        conflict = True
+                    else:
+                        self._enqueue(other)
+            self.watches[false_lit] = keep
+            if conflict:
+                return False
+        return True
+
+    # Undo assignments back to a trail position
+    def _backtrack(self, mark):
+        for lit in self.trail[mark:]:
+            del self.value[abs(lit)]
+        del self.trail[mark:]
+        self.qhead = mark
+
+    # Mirror level-0 assignments into kb so planners can read facts directly
+    def _sync_facts(self):
+        for lit in self.trail[self.synced:]:
+            kind, x, y = self.cell_of[abs(lit)]
+            if lit > 0:
+                self.kb.addFact(f"{kind}{cell_name(x, y)}")
+                if kind == "W" and (x, y) not in self.known_wumpus:
+                    self.known_wumpus.add(x, y)
+                    self.kb.log(self.known_wumpus.discard, x, y)
+            else:
+                self.kb.addFact(f"-{kind}{cell_name(x, y)}")
+                other = self.var_of.get(("W" if kind == "P" else "P", x, y))
+                if other is not None and self.value.get(other) is False:
+                    self.kb.addFact(f"Safe{cell_name(x, y)}")
+        self.synced = len(self.trail)
+
+    # Clauses sharing unassigned variables with var, transitively
+    def _component(self, var):
+        seen_vars = {var}
+        seen_clauses = []
+        marked = set()
+        stack = [var]
+        while stack:
+            v = stack.pop()
+            for idx in self.occurs.get(v, ()):
+                if idx in marked:
+                    continue
+                marked.add(idx)
+                clause = self.clauses[idx]
+                if any(self.lit_value(l) is True for l in clause):
+                    continue
+                seen_clauses.append(clause)
+                for l in clause:
+                    u = abs(l)
+                    if u not in seen_vars and u not in self.value:
+                        seen_vars.add(u)
+                        stack.append(u)
+        return seen_clauses
+
+    # Bounded DPLL over the clauses of one component.
+    # Returns True (satisfiable), False (unsatisfiable) or None (budget spent).
+    def _solve(self, clauses, budget):
+        stack = []
+        while True:
+            if not self._propagate():
+                while stack:
+                    mark, lit, flipped = stack.pop()
+                    self._backtrack(mark)
+                    if not flipped:
+                        stack.append((mark, -lit, True))
+                        self._enqueue(-lit)
+                        break
+                else:
+                    return False
+                continue
+            branch = None
+            for clause in clauses:
+                if any(self.lit_value(l) is True for l in clause):
+                    continue
+                branch = next(l for l in clause if self.lit_value(l) is None)
+                break
+            if branch is None:
+                return True
+            budget -= 1
+            if budget < 0:
+                return None
+            stack.append((len(self.trail), branch, False))
+            self._enqueue(branch)
+
+    # Does the knowledge base entail the literal?
+    # True / False when decided, None if the search budget ran out.
+    def entails(self, lit):
+        val = self.lit_value(lit)
+        if val is not None:
+            return val
+        mark = len(self.trail)
+        self._enqueue(-lit)
+        result = self._solve(self._component(abs(lit)), self.max_decisions)
+        self._backtrack(mark)
+        if result is False:
+            # Refutation found: keep the consequence as a permanent unit
+            self._enqueue(lit)
+            self._propagate()
+            self._sync_facts()
+            return True
+        return False if result else None
+
+    # Known wumpus cells, and cells whose wumpus variable sits in an open clause
+    def wumpus_lines(self):
+        suspected = LineIndex()
+        for clause in self.clauses:
+            if any(self.lit_value(l) is True for l in clause):
+                continue
+            for lit in clause:
+                kind, x, y = self.cell_of[abs(lit)]
+                if kind == "W" and lit > 0 and abs(lit) not in self.value:
+                    suspected.add(x, y)
+        return self.known_wumpus, suspected
+
+    # Open a checkpoint: clauses and units added after this are undone by pop()
+    def push(self):
+        self.marks.append((len(self.trail), len(self.clauses), len(self.original),
+                           self.synced, self.inconsistent))
+        self.kb.push()
+
+    def pop(self):
+        trail_mark, clause_mark, original_mark, synced, inconsistent = self.marks.pop()
+        self._backtrack(trail_mark)
+        # Watched literals of surviving clauses stay valid after backtracking;
+        # clauses added since the checkpoint are unhooked and dropped.
+        for idx in range(len(self.clauses) - 1, clause_mark - 1, -1):
+            clause = self.clauses[idx]
+            self.watches[clause[0]].remove(idx)
+            self.watches[clause[1]].remove(idx)
+            for lit in clause:
+                self.occurs[abs(lit)].remove(idx)
+        del self.clauses[clause_mark:]
+        del self.original[original_mark:]
+        self.synced = synced
+        self.inconsistent = inconsistent
+        self.kb.pop()
+
+    def infer(self, query):
+        x, y = query
+        if self.inconsistent:
+            return "uncertain"
+        pit = self.var_of.get(("P", x, y))
+        wumpus = self.var_of.get(("W", x, y))
+        if pit is None or wumpus is None:
+            return "uncertain"  # nothing is known about this cell
+        if self.entails(pit) or self.entails(wumpus):
+            return "unsafe"
+        if self.entails(-pit) and self.entails(-wumpus):
+            return "safe"
+        return "uncertain"
+
+    # Status codes of every cell as a read-only int8 array indexed [x, y],
+    # like InferenceEngine.status_grid. One entailment pass covers the cells
+    # that have variables; the rest are uncertain, as in infer().
+    def status_grid(self, size=None):
+        key = self.state_hash()
+        grid = self.grids.get(key)
+        if grid is not None:
+            return grid
+        size = size or self.size
+        grid = np.full((size, size), UNCERTAIN, dtype=np.int8)
+        for kind, x, y in list(self.var_of):
+            if kind == "P" and ("W", x, y) in self.var_of:
+                grid[x, y] = STATUS_NAMES.index(self.infer((x, y)))
+        grid.setflags(write=False)
+        self.grids.put(key, grid)
+        self.grids.put(self.state_hash(), grid)  # entailment may have added units
+        return grid
+
+    # Which cells of status_grid() changed is not tracked here, so callers
+    # are always told to look at the whole grid again
+    def status_changes(self, since):
+        return None, 0
+
+    # Status codes of many cells at once, in the order given
+    def infer_many(self, cells):
+        cells = np.asarray(cells, dtype=np.intp).reshape(-1, 2)
+        return self.status_grid()[cells[:, 0], cells[:, 1]]
+
+    def process_percepts(self, x, y, percepts, world):
+        self.size = world.size
+        self.kb.addFact(f"Safe{cell_name(x, y)}")
+        self.add_clause([-self.var("P", x, y)])
+        self.add_clause([-self.var("W", x, y)])
+        neighbors = world.adjacent(x, y)
+
+        for kind, percept in (("W", "S"), ("P", "B")):
+            if percept in percepts:
+                self.kb.addFact(f"{percept}{cell_name(x, y)}")
+                self.add_clause([self.var(kind, i, j) for i, j in neighbors])
+            else:
+                for i, j in neighbors:
+                    self.add_clause([-self.var(kind, i, j)])
+
+    # Take in how an arrow shot from (x, y) along (dx, dy) went, as
+    # InferenceEngine.record_shot does. A miss clears the line of fire. A hit
+    # kills the first wumpus on it, so the clauses that may have counted on
+    # that wumpus are dropped, and the first cell the arrow could have hit is
+    # empty now either way. The wumpus count is not tracked here.
+    def record_shot(self, x, y, dx, dy, hit, remaining=None):
+        line = []
+        i, j = x + dx, y + dy
+        while 0 <= i < self.size and 0 <= j < self.size:
+            line.append((i, j))
+            i, j = i + dx, j + dy
+        if not hit:
+            for i, j in line:
+                self.add_clause([-self.var("W", i, j)])
+            return
+        cells = set(line)
+        self.rebuild(lambda clause: not any(
+            l > 0 and self.cell_of[l][0] == "W" and self.cell_of[l][1:] in cells for l in clause))
+        for i, j in line:
+            lit = -self.var("W", i, j)
+            if self.lit_value(lit) is not True:
+                self.add_clause([lit])
+                break
+
+    # Drop everything derived about wumpuses and rebuild from the pit clauses
+    def reset_wumpus_knowledge(self):
+        self.rebuild(lambda clause: self.cell_of[abs(clause[0])][0] != "W")
+
+    # Start over from the asserted clauses keep() accepts, holding on to the
+    # breeze and stench facts
+    def rebuild(self, keep):
+        kept = [[(l > 0, self.cell_of[abs(l)]) for l in clause]
+                for clause in self.original if keep(clause)]
+        felt = [f for f in self.kb.facts if f[0] in "BS" and not f.startswith("Safe")]
+        size = self.size
+        self.__init__(self.max_decisions)
+        self.size = size
+        for fact in felt:
+            self.kb.addFact(fact)
+        for clause in kept:
+            self.add_clause([self.var(*key) if positive else -self.var(*key)
+                             for positive, key in clause])
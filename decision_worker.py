@@ -0,0 +1,76 @@
+import threading
+
+# Runs the agent's thinking on a background thread so the UI keeps drawing
+# and handling events meanwhile. One job runs at a time; it is called with
+# a threading.Event that is set once the job is cancelled and should make
+# it return early.
+#
+# The hand-off is double-buffered: the worker writes a finished result to
+# the back slot and poll() moves it to the front slot for the UI thread, so
+# neither side sees a half-made decision. Every job belongs to a generation;
+# cancel() starts a new one, drops what the old one produced and waits until
+# the worker has let go of the game, so the caller may then reset it.
+class DecisionWorker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.idle = threading.Event()  # set while no job is queued or running
+        self.idle.set()
+        self.cancelled = threading.Event()
+        self.generation = 0
+        self.job = None    # (generation, job) waiting to run
+        self.back = None   # (generation, result, error) written by the worker
+        self.front = None  # last result handed to the UI thread
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def busy(self):
+        return not self.idle.is_set()
+
+    # Queue job(cancelled) to run next; only call while the worker is idle
+    def submit(self, job):
+        with self.lock:
+            self.cancelled.clear()
+            self.idle.clear()
+            self.job = (self.generation, job)
+            self.wake.notify()
+
+    # The result of the job of this generation once it is done, else None.
+    # An exception raised by the job is raised here instead.
+    def poll(self):
+        with self.lock:
+            done, self.back = self.back, None
+        if done is None or done[0] != self.generation:
+            return None
+        if done[2] is not None:
+            raise done[2]
+        self.front = done[1]
+        return self.front
+
+    # Drop the queued or running job and its result, and wait for the worker
+    def cancel(self):
+        with self.lock:
+            self.generation += 1
+            self.back = None
+            if self.job is not None:
+                self.job = None
+                self.idle.set()
+            self.cancelled.set()
+        self.idle.wait()
+
+    def run(self):
+        while True:
+            with self.lock:
+                while self.job is None:
+                    self.wake.wait()
+                generation, job = self.job
+                self.job = None
+            result, error = None, None
+            try:
+                result = job(self.cancelled)
+            except Exception as e:
+                error = e
+            with self.lock:
+                if generation == self.generation:
+                    self.back = (generation, result, error)
+                self.idle.set()
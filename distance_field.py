@@ -0,0 +1,109 @@
+import heapq
+import numpy as np
+from topology import topology
+
+INF = float("inf")
+
+# Cheapest cost of walking from every cell to one goal cell, kept up to date
+# as the cost of entering cells changes.
+#
+# dist[x][y] = min over neighbours n of cost[n] + dist[n], and 0 at the goal;
+# nxt[x][y] is the neighbour that achieves it. When costs drop, Dijkstra
+# runs from the cells that got cheaper and stops where nothing improves.
+# When costs rise, only the cells whose walk entered a dearer cell are
+# cleared, and they are filled in again from the cells that were not
+# cleared. Either way the work follows the part of the field that changes,
+# not the board. A path is then read by following nxt, in O(path length).
+class DistanceField:
+    def __init__(self, size, goal=(0, 0)):
+        self.size = size
+        self.topology = topology(size)
+        self.goal = goal
+        self.cost = np.full((size, size), np.inf)  # cost of entering each cell
+        self.costs = [[INF] * size for _ in range(size)]  # the same as lists, for scalar reads
+        self.dist = [[INF] * size for _ in range(size)]
+        self.nxt = [[None] * size for _ in range(size)]
+        self.dist[goal[0]][goal[1]] = 0
+
+    def copy(self):
+        field = DistanceField.__new__(DistanceField)
+        field.__dict__ = self.__dict__.copy()
+        field.cost = self.cost.copy()
+        field.costs = [list(row) for row in self.costs]
+        field.dist = [list(row) for row in self.dist]
+        field.nxt = [list(row) for row in self.nxt]
+        return field
+
+    # Take a new cost grid (np.inf where a cell cannot be entered) and
+    # repair the field where it changed
+    def update(self, cost):
+        changed = np.argwhere(cost != self.cost)
+        if not len(changed):
+            return
+        costs, dist, nxt = self.costs, self.dist, self.nxt
+        neighbors = self.topology.neighbors
+        raised, lowered = [], []
+        for x, y in changed.tolist():
+            new = float(cost[x, y])
+            (raised if new > costs[x][y] else lowered).append((x, y))
+            costs[x][y] = new
+        self.cost = cost.copy()
+
+        # Clear every cell whose walk enters a dearer cell
+        cleared = []
+        stack = [c for r in raised for c in neighbors[r[0]][r[1]] if nxt[c[0]][c[1]] == r]
+        while stack:
+            x, y = stack.pop()
+            if nxt[x][y] is None:
+                continue
+            nxt[x][y] = None
+            dist[x][y] = INF
+            cleared.append((x, y))
+            stack.extend(c for c in neighbors[x][y] if nxt[c[0]][c[1]] == (x, y))
+
+        heap = []
+        for x, y in cleared:
+            for nx, ny in neighbors[x][y]:
+                d = dist[nx][ny] + costs[nx][ny]
+                if d < dist[x][y]:
+                    dist[x][y] = d
+                    nxt[x][y] = (nx, ny)
+            if dist[x][y] < INF:
+                heapq.heappush(heap, (dist[x][y], (x, y)))
+        for cell in lowered:
+            if dist[cell[0]][cell[1]] < INF:
+                heapq.heappush(heap, (dist[cell[0]][cell[1]], cell))
+
+        # Dijkstra outwards from the seeds; entering cell c costs costs[c]
+        while heap:
+            d, (x, y) = heapq.heappop(heap)
+            if d > dist[x][y]:
+                continue
+            d += costs[x][y]
+            if d == INF:
+                continue
+            for nx, ny in neighbors[x][y]:
+                if d < dist[nx][ny]:
+                    dist[nx][ny] = d
+                    nxt[nx][ny] = (x, y)
+                    heapq.heappush(heap, (d, (nx, ny)))
+
+    def distance(self, cell):
+        return self.dist[cell[0]][cell[1]]
+
+    # Cells from start to the goal along the cheapest walk, or None if the
+    # goal cannot be reached. A first step onto prefer is taken whenever it
+    # is as cheap, e.g. the cell ahead so the walk starts without a turn.
+    def path(self, start, prefer=None):
+        if self.distance(start) == INF:
+            return None
+        path = [start]
+        cell = start
+        if prefer is not None and cell != self.goal and prefer in self.topology.neighbors[cell[0]][cell[1]]:
+            if self.costs[prefer[0]][prefer[1]] + self.distance(prefer) == self.distance(cell):
+                cell = prefer
+                path.append(cell)
+        while cell != self.goal:
+            cell = self.nxt[cell[0]][cell[1]]
+            path.append(cell)
+        return path
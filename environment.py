@@ -1,4 +1,6 @@
 import random
+from line_index import LineIndex
+from topology import topology
 
 DIRECTIONS = ["N", "E", "S", "W"]
 
@@ -15,16 +17,27 @@ class Cell:
         self.stench = False
         self.glitter = False
 
+    def copy(self):
+        cell = Cell.__new__(Cell)
+        cell.__dict__ = self.__dict__.copy()
+        return cell
+
 class Environment:
-    def __init__(self, size=8, num_wumpus=2, pit_prob=0.2, generate_random=True):
+    def __init__(self, size=8, num_wumpus=2, pit_prob=0.2, generate_random=True, rng=None):
         self.size = size
+        self.rng = rng or random  # draws the map and wumpus moves; forks share it
+        self.topology = topology(size)
         self.grid = [[Cell() for _ in range(size)] for _ in range(size)]
         self.agent_pos = [0, 0]
         self.agent_dir = "E"
         self.num_wumpus = num_wumpus
         self.pit_prob = pit_prob
         self.wumpus_positions = []
+        self.wumpus_lines = LineIndex()  # actual wumpus positions by row and column
         self.remaining_wumpuses = self.num_wumpus
+        self.shared = False  # grid rows and cells may be shared with a fork
+        self.own_rows = set()  # rows copied since the last fork
+        self.own_cells = set()  # cells copied since the last fork
         
         if generate_random:
             self.place_pits()
@@ -35,80 +48,115 @@ class Environment:
 
     def update_percepts(self):
         # """ Recalculates all stenches and breezes on the map. """
-        for x in range(self.size):
-            for y in range(self.size):
-                self.grid[x][y].breeze = False
-                self.grid[x][y].stench = False
+        neighbors = self.topology.neighbors
+        for x, y in self.topology.cells:
+            self.grid[x][y].breeze = False
+            self.grid[x][y].stench = False
 
-        for x in range(self.size):
-            for y in range(self.size):
-                if self.grid[x][y].has_pit:
-                    for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                        nx, ny = x + dx, y + dy
-                        if in_bounds(nx, ny, self.size):
-                            self.grid[nx][ny].breeze = True
+        for x, y in self.topology.cells:
+            if self.grid[x][y].has_pit:
+                for nx, ny in neighbors[x][y]:
+                    self.grid[nx][ny].breeze = True
         
-        for wumpus_pos in self.wumpus_positions:
-            wx, wy = wumpus_pos
-            for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                nx, ny = wx + dx, wy + dy
-                if in_bounds(nx, ny, self.size):
-                    self.grid[nx][ny].stench = True
+        for wx, wy in self.wumpus_positions:
+            for nx, ny in neighbors[wx][wy]:
+                self.grid[nx][ny].stench = True
 
     def place_pits(self):
         for x in range(self.size):
             for y in range(self.size):
-                if (x, y) != (0, 0) and random.random() < self.pit_prob:
+                if (x, y) != (0, 0) and self.rng.random() < self.pit_prob:
                     self.grid[x][y].has_pit = True
-                    for dx, dy in [(-1,0), (1,0), (0,-1), (0,1)]:
-                        nx, ny = x + dx, y + dy
-                        if in_bounds(nx, ny, self.size):
-                            self.grid[nx][ny].breeze = True
+                    for nx, ny in self.topology.neighbors[x][y]:
+                        self.grid[nx][ny].breeze = True
 
     def place_wumpuses(self):
         placed = 0
         while placed < self.num_wumpus:
-            x, y = random.randint(0, self.size-1), random.randint(0, self.size-1)
+            x, y = self.rng.randint(0, self.size-1), self.rng.randint(0, self.size-1)
             if (x, y) != (0, 0) and not self.grid[x][y].has_pit and not self.grid[x][y].has_wumpus:
                 self.grid[x][y].has_wumpus = True
                 self.wumpus_positions.append([x, y]) # Add position to our list
-                for dx, dy in [(-1,0), (1,0), (0,-1), (0,1)]:
-                    nx, ny = x + dx, y + dy
-                    if in_bounds(nx, ny, self.size):
-                        self.grid[nx][ny].stench = True
+                self.wumpus_lines.add(x, y)
+                for nx, ny in self.topology.neighbors[x][y]:
+                    self.grid[nx][ny].stench = True
                 placed += 1
 
     def place_gold(self):
         while True:
-            x, y = random.randint(0, self.size-1), random.randint(0, self.size-1)
+            x, y = self.rng.randint(0, self.size-1), self.rng.randint(0, self.size-1)
             if not self.grid[x][y].has_pit and not self.grid[x][y].has_wumpus:
                 self.grid[x][y].has_gold = True
                 self.grid[x][y].glitter = True
                 break
     
+    # Copy of the game state that shares the grid until either side writes to
+    # it. Pits, breezes and the topology never change, so most cells are
+    # never copied at all.
+    def fork(self):
+        env = Environment.__new__(Environment)
+        env.__dict__ = self.__dict__.copy()
+        env.grid = list(self.grid)
+        env.agent_pos = list(self.agent_pos)
+        env.wumpus_positions = list(self.wumpus_positions)
+        env.wumpus_lines = self.wumpus_lines.copy()
+        env.own_rows = set()
+        env.own_cells = set()
+        env.shared = self.shared = True
+        self.own_rows = set()
+        self.own_cells = set()
+        return env
+
+    # Cell (x, y) for writing; every change to a cell after generation goes
+    # through here so forks never see each other's writes
+    def cell(self, x, y):
+        if not self.shared or (x, y) in self.own_cells:
+            return self.grid[x][y]
+        if x not in self.own_rows:
+            self.grid[x] = list(self.grid[x])
+            self.own_rows.add(x)
+        cell = self.grid[x][y] = self.grid[x][y].copy()
+        self.own_cells.add((x, y))
+        return cell
+
+    def refresh_stench(self, around):
+        # """ Recomputes the stench of the cells next to the given positions. """
+        for x, y in around:
+            for nx, ny in self.adjacent(x, y):
+                self.cell(nx, ny).stench = any(self.grid[i][j].has_wumpus for i, j in self.adjacent(nx, ny))
+
     def move_wumpuses(self):
         # """ Moves each wumpus to a valid random adjacent cell. """
+        old_positions = [tuple(pos) for pos in self.wumpus_positions]
         new_positions = []
         occupied = {tuple(pos) for pos in self.wumpus_positions}
 
         for x, y in self.wumpus_positions:
-            self.grid[x][y].has_wumpus = False
+            self.cell(x, y).has_wumpus = False
             
             valid_moves = [[x, y]]
-            for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                nx, ny = x + dx, y + dy
-                if in_bounds(nx, ny, self.size) and not self.grid[nx][ny].has_pit and (nx, ny) not in occupied:
+            for nx, ny in self.topology.neighbors[x][y]:
+                if not self.grid[nx][ny].has_pit and (nx, ny) not in occupied:
                     valid_moves.append([nx, ny])
             
-            new_pos = random.choice(valid_moves)
+            new_pos = self.rng.choice(valid_moves)
             new_positions.append(new_pos)
             occupied.add(tuple(new_pos))  # prevent collisions
         
         self.wumpus_positions = new_positions
+        self.wumpus_lines = LineIndex(self.wumpus_positions)
         for x, y in self.wumpus_positions:
-            self.grid[x][y].has_wumpus = True
+            self.cell(x, y).has_wumpus = True
             
-        self.update_percepts() # Recalculate stenches
+        self.refresh_stench(old_positions + [tuple(pos) for pos in new_positions]) # Recalculate stenches
+
+    def kill_wumpus(self, x, y):
+        # """ Removes the wumpus at (x, y) and the stench around it. """
+        self.cell(x, y).has_wumpus = False
+        self.wumpus_positions = [p for p in self.wumpus_positions if p != [x, y]]
+        self.wumpus_lines.discard(x, y)
+        self.remaining_wumpuses -= 1
+        self.refresh_stench([(x, y)])
 
     def get_percepts(self):
         x, y = self.agent_pos
@@ -124,13 +172,7 @@ class Environment:
         return percepts
     
     def adjacent(self, i, j):
-        dirs = [(-1,0),(1,0),(0,-1),(0,1)]
-        result = []
-        for dx, dy in dirs:
-            ni, nj = i + dx, j + dy
-            if 0 <= ni < self.size and 0 <= nj < self.size:
-                result.append((ni, nj))
-        return result
+        return self.topology.neighbors[i][j]
     
     @classmethod
     def read_map_from_file(cls, grid_data, size):
@@ -144,6 +186,7 @@ class Environment:
                 if "W" in contents:
                     env.grid[i][j].has_wumpus = True
                     env.wumpus_positions.append([i, j])
+                    env.wumpus_lines.add(i, j)
                 if "G" in contents:
                     env.grid[i][j].has_gold = True
                     env.grid[i][j].glitter = True
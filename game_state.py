@@ -0,0 +1,111 @@
+from agent import Agent
+from inference import InferenceEngine
+from wumpus_belief import WumpusBelief
+import planning
+from planning import Planner, make_next_action
+
+GRAB_REWARD = 10
+WIN_REWARD = 1000
+DEATH_PENALTY = 1000
+
+# The rules for one step the agent has just played, shared by every game
+# loop: the step's cost, the grab reward, climbing out, dying in a pit or to
+# a wumpus, and in dynamic games the wumpuses moving every
+# params.wumpus_move_every steps, after which moved() is called.
+# Returns (score change, outcome or None while the game goes on).
+def settle_step(env, agent, had_gold, climbed, steps, dynamic=False, moved=None):
+    gained = -1
+    if agent.has_gold and not had_gold:
+        gained += GRAB_REWARD
+    x, y = agent.position
+    if climbed and (x, y) == (0, 0):
+        if agent.has_gold:
+            return gained + WIN_REWARD, "win"
+        return gained, "tie"
+    if env.grid[x][y].has_pit or env.grid[x][y].has_wumpus:
+        return gained - DEATH_PENALTY, "lose"
+    if dynamic and steps % planning.params.wumpus_move_every == 0:
+        env.move_wumpuses()
+        if moved is not None:
+            moved()
+        if env.grid[x][y].has_wumpus:
+            return gained - DEATH_PENALTY, "lose"
+    return gained, None
+
+# Everything one game needs to continue from where it is, forkable in a few
+# microseconds so lookahead can branch it many times per decision.
+# runner.run_episode plays its episodes through this class.
+class GameState:
+    def __init__(self, env, dynamic=False, planner=None):
+        env.grid[0][0].has_pit = False
+        env.grid[0][0].has_wumpus = False
+        self.env = env
+        self.agent = Agent()
+        self.inference = InferenceEngine(WumpusBelief(env.size, env.remaining_wumpuses))
+        self.planner = planner  # built on the first step the state plans itself
+        self.dynamic = dynamic
+        self.score = 0
+        self.steps = 0
+        self.outcome = None  # "win", "tie" or "lose" once the game is over
+        self.action_log = []
+        self.had_gold = False  # whether the agent held the gold before this step's action
+
+    # Independent copy; pits, the topology, the rules and the planner's
+    # decision table stay shared
+    def fork(self):
+        state = GameState.__new__(GameState)
+        state.__dict__ = self.__dict__.copy()
+        state.env = self.env.fork()
+        state.agent = self.agent.fork()
+        state.inference = self.inference.fork()
+        state.planner = self.planner.fork() if self.planner is not None else None
+        state.action_log = list(self.action_log)
+        return state
+
+    # Play one step with a policy taking (agent, inference, env, actions,
+    # action_log); by default the state's own planner picks the action.
+    # Returns the actions taken.
+    def step(self, policy=None):
+        self.sense()
+        actions = self.act(policy)
+        self.settle(actions)
+        return actions
+
+    # Start a step: the inference engine takes in the percepts at the
+    # agent's cell, which are returned
+    def sense(self):
+        env, agent = self.env, self.agent
+        self.steps += 1
+        env.agent_pos = agent.position
+        x, y = agent.position
+        percepts = env.get_percepts()
+        self.inference.process_percepts(x, y, percepts, env)
+        return percepts
+
+    # Let the policy act and return the actions taken
+    def act(self, policy=None):
+        self.had_gold = self.agent.has_gold
+        actions = []
+        if policy is None:
+            if self.planner is None:
+                self.planner = Planner(self.env.size, params=planning.params)
+            make_next_action(self.agent, self.inference, self.env, actions, self.action_log, self.planner)
+        else:
+            policy(self.agent, self.inference, self.env, actions, self.action_log)
+        return actions
+
+    # Finish a step by the rules in settle_step
+    def settle(self, actions):
+        climbed = any(a.lower() == "climb" for a in actions)
+        gained, self.outcome = settle_step(self.env, self.agent, self.had_gold, climbed, self.steps,
+                                           self.dynamic, self.wumpuses_moved)
+        self.score += gained
+
+    def wumpuses_moved(self):
+        self.inference.track_wumpus_move(self.env.remaining_wumpuses)
+
+    # Play until the game ends or max_steps have been played in total
+    def play(self, policy=None, max_steps=1000):
+        while self.outcome is None and self.steps < max_steps:
+            self.step(policy)
+        return self.outcome or "timeout"
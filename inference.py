@@ -1,9 +1,36 @@
+import sys
 import random
+import operator
+import numpy as np
+from zobrist import keys, TranspositionTable
+from line_index import LineIndex
+
+# Name suffix for a cell; the separator keeps names unique on any board size
+def cell_name(i, j):
+    return f"{i}_{j}"
+
+_fact_cells = {} #parsed fact names, cleared when it grows past _FACT_CELLS_MAX
+_FACT_CELLS_MAX = 1 << 16
+
+# Cell of a fact name, e.g. "-W3_12" -> (3, 12)
+def fact_cell(fact):
+    cell = _fact_cells.get(fact)
+    if cell is None:
+        i, j = fact.lstrip("-").lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz").split("_")
+        if len(_fact_cells) >= _FACT_CELLS_MAX:
+            _fact_cells.clear()
+        cell = _fact_cells[fact] = (int(i), int(j))
+    return cell
+
+# Status codes used by status_grid() and infer_many()
+SAFE, UNCERTAIN, UNSAFE = 0, 1, 2
+STATUS_NAMES = ("safe", "uncertain", "unsafe")
 
 class Rule:
     def __init__(self, premises, conclusions):
         self.premises = set(premises)
         self.conclusions = set(conclusions)
+        self.key = (frozenset(self.premises), frozenset(self.conclusions)) #canonical form, for dedup
     
     def triggered(self, facts):
         return self.premises.issubset(facts)
@@ -14,24 +41,92 @@ class KnowledgeBase:
         self.facts = set() #unit facts
         self.neg_facts = set() #negative unit facts
         self.rules = [] #implications
+        self.rule_keys = set() #Rule.key of every rule in self.rules
+        self.trail = [] #undo log, only written while a checkpoint is open
+        self.marks = [] #trail lengths and hashes at each push()
+        self.undoing = False #set while pop() replays the trail
+        self.hash = 0 #Zobrist hash of facts and neg_facts
+        self.changed = None #names of facts added or removed, if someone collects them
         
     def addFact(self, fact):
         if (fact.startswith('-')):
-            self.neg_facts.add(fact[1:])
-        else:
+            if fact[1:] not in self.neg_facts:
+                self.neg_facts.add(fact[1:])
+                self.hash ^= keys.key(fact)
+                self.log(self.neg_facts.discard, fact[1:])
+                self.note(fact)
+        elif fact not in self.facts:
             self.facts.add(fact)
+            self.hash ^= keys.key(fact)
+            self.log(self.facts.discard, fact)
+            self.note(fact)
     
+    # Add a rule unless an identical one is already waiting; True if added
     def addRule(self, rule):
+        if rule.key in self.rule_keys:
+            return False
         self.rules.append(rule)
+        self.rule_keys.add(rule.key)
+        self.log(self.rules.pop)
+        self.log(self.rule_keys.discard, rule.key)
+        return True
         
     def removeFact(self, fact):
         if (fact.startswith('-')):
-            self.neg_facts.discard(fact)
-        else:
-            self.facts.discard(fact[1:])
+            if fact[1:] in self.neg_facts:
+                self.neg_facts.discard(fact[1:])
+                self.hash ^= keys.key(fact)
+                self.log(self.neg_facts.add, fact[1:])
+                self.note(fact)
+        elif fact in self.facts:
+            self.facts.discard(fact)
+            self.hash ^= keys.key(fact)
+            self.log(self.facts.add, fact)
+            self.note(fact)
         
     def removeRule(self, rule):
-        self.rules.remove(rule)
+        index = self.rules.index(rule)
+        del self.rules[index]
+        self.rule_keys.discard(rule.key)
+        self.log(self.rules.insert, index, rule)
+        self.log(self.rule_keys.add, rule.key)
+
+    def note(self, fact):
+        if self.changed is not None:
+            self.changed.add(fact)
+
+    # Record how to undo a change, if someone may roll it back
+    def log(self, undo, *args):
+        if self.marks and not self.undoing:
+            self.trail.append((undo, args))
+
+    # Open a checkpoint
+    def push(self):
+        self.marks.append((len(self.trail), self.hash))
+
+    # Roll back every change made since the matching push()
+    def pop(self):
+        mark, self.hash = self.marks.pop()
+        self.undoing = True
+        while len(self.trail) > mark:
+            undo, args = self.trail.pop()
+            undo(*args)
+        self.undoing = False
+
+    # Copy of the facts and rules without any open checkpoints. Rules are
+    # never changed once added, so the copies share them.
+    def fork(self):
+        kb = KnowledgeBase()
+        kb.facts = self.facts.copy()
+        kb.neg_facts = self.neg_facts.copy()
+        kb.rules = list(self.rules)
+        kb.rule_keys = self.rule_keys.copy()
+        kb.hash = self.hash
+        return kb
+
+    # Recompute the hash after the fact sets were replaced wholesale
+    def rehash(self):
+        self.hash = keys.combine(self.facts) ^ keys.combine(f"-{f}" for f in self.neg_facts)
     
     
     def show(self):
@@ -39,76 +134,632 @@ class KnowledgeBase:
         print("Negated:", self.neg_facts)
         print("Rules:", self.rules)
 
+# Safety answers shared by every engine, keyed by InferenceEngine.state_hash()
+safety_table = TranspositionTable(8192)
+
+# Status changes kept for status_changes() before the log starts over
+STATUS_LOG_MAX = 1 << 14
+
+# Fact prefixes folded into a resolved cell by compact(). Wumpus facts stay
+# in the knowledge base because wumpuses can move away.
+COMPACTED = ("Safe", "S", "B", "P")
+
 class InferenceEngine:
-    def __init__(self):
+    def __init__(self, wumpus_belief=None, fact_limit=512):
         self.kb = KnowledgeBase()
         self.uncertains = []
+        self.resolved = {} #cell -> "safe" or "unsafe" (pit), for compacted cells
+        self.resolved_key = 0 #hash of the resolved entries
+        self.resolved_pits = set() #pit facts of cells resolved unsafe
+        self.fact_limit = fact_limit #compact once this many facts are live
+        self.compact_at = fact_limit
+        self.wumpus_belief = wumpus_belief
+        self.size = None #board size, set by the first percepts
+        self.size_key = 0 #hash of the board size, set by the first percepts
+        self.grids = TranspositionTable(16) #state hash -> status_grid() array
+        self.live = None #status grid kept up to date cell by cell, built on first use
+        self.dirty = set() #cells whose status may differ from self.live
+        self.kb.changed = set()
+        self.unchecked = set() #cells changed since step() last looked at their disjunctions
+        self.checked = {} #id -> disjunction step() kept unchanged, valid while its cells are untouched
+        self.settled = () #the disjunctions minimal() returned last
+        self.live_marks = [] #(live, dirty, log version, shown, live_shown) saved at each push()
+        self.shown = None #the grid status_grid() returned last
+        self.live_shown = True #whether that was a copy of self.live
+        self.status_log = [] #cells whose code in self.live changed, oldest first
+        self.status_base = 0 #version of the first entry of status_log
+        self.belief_key = 0 #hash of the cells in the wumpus disjunction added after a move
+        self.table = safety_table
+        self.known_wumpus = LineIndex() #cells proven to hold a wumpus
+        self.suspected_wumpus = LineIndex() #cells whose wumpus fact is in self.maybe
+        self.maybe = set() #hazard facts some percept made possible and nothing has ruled out
+        self.wumpus_count = None #wumpuses alive, if known
+        self.count_key = 0 #hash of the wumpus count
+        if wumpus_belief is not None:
+            self.set_wumpus_count(wumpus_belief.count)
+
+    # Independent copy of the knowledge for lookahead. Disjunctions are never
+    # changed in place and status grids are keyed by state hash, so both are
+    # shared; the safety table is shared by every engine anyway.
+    def fork(self):
+        engine = InferenceEngine.__new__(InferenceEngine)
+        engine.__dict__ = self.__dict__.copy()
+        engine.kb = self.kb.fork()
+        engine.uncertains = list(self.uncertains)
+        engine.resolved = self.resolved.copy()
+        engine.resolved_pits = self.resolved_pits.copy()
+        engine.known_wumpus = self.known_wumpus.copy()
+        engine.suspected_wumpus = self.suspected_wumpus.copy()
+        engine.maybe = self.maybe.copy()
+        engine.kb.changed = self.kb.changed.copy()
+        engine.live = self.live.copy() if self.live is not None else None
+        engine.dirty = self.dirty.copy()
+        engine.unchecked = self.unchecked.copy()
+        engine.checked = self.checked.copy()
+        engine.live_marks = []
+        engine.status_base = self.status_version()
+        engine.status_log = []
+        if self.wumpus_belief is not None:
+            engine.wumpus_belief = self.wumpus_belief.fork()
+        return engine
+
+    # Hash of everything infer() depends on
+    def state_hash(self):
+        return self.kb.hash ^ self.size_key ^ self.belief_key ^ self.resolved_key ^ self.count_key
+
+    # Number of wumpuses still alive, for the counting argument in step()
+    def set_wumpus_count(self, count):
+        if count == self.wumpus_count:
+            return
+        self.kb.log(setattr, self, 'wumpus_count', self.wumpus_count)
+        self.kb.log(setattr, self, 'count_key', self.count_key)
+        self.wumpus_count = count
+        self.count_key = keys.key(('wumpuses', count))
+
+    # Set or clear the resolved status of a cell
+    def resolve(self, cell, status):
+        old = self.resolved.get(cell)
+        if old == status:
+            return
+        self.kb.log(self.resolve, cell, old)
+        self.dirty.add(cell)
+        self.unchecked.add(cell)
+        if old is not None:
+            self.resolved_key ^= keys.key(('resolved', cell, old))
+            self.resolved_pits.discard(f"P{cell_name(*cell)}")
+            del self.resolved[cell]
+        if status is not None:
+            self.resolved_key ^= keys.key(('resolved', cell, status))
+            if status == "unsafe":
+                self.resolved_pits.add(f"P{cell_name(*cell)}")
+            self.resolved[cell] = status
+
+    # Whether a positive fact is known, including pits folded into resolved cells
+    def holds(self, fact):
+        return fact in self.kb.facts or fact in self.resolved_pits
+
+    # Collapse every cell proven safe or proven to hold a pit into one resolved
+    # entry, dropping its facts and the disjunctions that only name resolved cells.
+    # Runs one propagation step first, so no pending rule still needs the
+    # percept facts being dropped. Skipped while a checkpoint is open.
+    def compact(self):
+        if self.kb.marks:
+            return
+        self.step()
+        self.drain()
+        cells = {}
+        for fact in self.kb.facts:
+            if fact.startswith(COMPACTED):
+                cells.setdefault(fact_cell(fact), set()).add(fact)
+        for fact in self.kb.neg_facts:
+            cells.setdefault(fact_cell(fact), set()).add(f"-{fact}")
+        for cell, facts in cells.items():
+            tag = cell_name(*cell)
+            if f"Safe{tag}" in facts or self.resolved.get(cell) == "safe":
+                status = "safe"
+            elif f"P{tag}" in facts:
+                status = "unsafe"
+            else:
+                continue
+            self.resolve(cell, status)
+            for fact in facts:
+                self.kb.removeFact(fact)
+        self.uncertains = [opts for opts in self.uncertains
+                           if not all(fact_cell(f) in self.resolved for f in opts)]
+        self.dismiss([f for f in self.maybe if fact_cell(f) in self.resolved])
+        # What survives compaction is irreducible, so leave room before the next pass
+        live = len(self.kb.facts) + len(self.kb.neg_facts)
+        self.compact_at = max(self.fact_limit, 2 * live)
+
+    # Sizes of the stores and a rough byte count of what they hold
+    def footprint(self):
+        size = sys.getsizeof
+        facts = self.kb.facts | self.kb.neg_facts
+        counts = {
+            "facts": len(self.kb.facts),
+            "neg_facts": len(self.kb.neg_facts),
+            "rules": len(self.kb.rules),
+            "uncertains": len(self.uncertains),
+            "maybe": len(self.maybe),
+            "resolved": len(self.resolved),
+        }
+        counts["bytes"] = (size(self.kb.facts) + size(self.kb.neg_facts) + size(self.resolved)
+                           + size(self.maybe) + size(self.kb.rule_keys)
+                           + sum(size(f) for f in facts)
+                           + sum(size(opts) + sum(size(f) for f in opts) for opts in self.uncertains)
+                           + sum(size(r.premises) + size(r.conclusions) for r in self.kb.rules)
+                           + len(self.resolved) * size((0, 0))
+                           + sum(size(f) for f in self.resolved_pits))
+        return counts
     
+    # Known and suspected wumpus cells, indexed by row and column
+    def wumpus_lines(self):
+        return self.known_wumpus, self.suspected_wumpus
+
+    # Mark hazard facts as possible; wumpus ones also enter the suspected index
+    def consider(self, facts):
+        added = [f for f in facts if f not in self.maybe]
+        for fact in added:
+            self.maybe.add(fact)
+            self.dirty.add(fact_cell(fact))
+            if fact[0] == 'W':
+                self.suspected_wumpus.add(*fact_cell(fact))
+        if added:
+            self.kb.log(self.dismiss, added)
+
+    # Forget hazard facts that were ruled out or proven
+    def dismiss(self, facts):
+        removed = [f for f in facts if f in self.maybe]
+        for fact in removed:
+            self.maybe.discard(fact)
+            self.dirty.add(fact_cell(fact))
+            if fact[0] == 'W':
+                self.suspected_wumpus.discard(*fact_cell(fact))
+        if removed:
+            self.kb.log(self.consider, removed)
+
+    # Whether a hazard fact is known to be false
+    def refuted(self, fact):
+        if fact in self.kb.neg_facts:
+            return True
+        if f"Safe{fact[1:]}" in self.kb.facts:  # hazard names are one letter and the cell
+            return True
+        status = self.resolved.get(fact_cell(fact))
+        # a resolved unsafe cell holds a pit, and wumpuses never share a cell with one
+        return status == "safe" or (status == "unsafe" and fact[0] == 'W')
+
+    # Record a proven wumpus in the known index
+    def learn_wumpus(self, fact):
+        if not fact.startswith('W'):
+            return
+        cell = fact_cell(fact)
+        if cell not in self.known_wumpus:
+            self.known_wumpus.add(*cell)
+            self.kb.log(self.known_wumpus.discard, *cell)
+
+    # Take a proven wumpus back out of the known index
+    def forget_wumpus(self, fact):
+        cell = fact_cell(fact)
+        self.kb.removeFact(fact)
+        if cell in self.known_wumpus:
+            self.known_wumpus.discard(*cell)
+            self.kb.log(self.known_wumpus.add, *cell)
+
+    # Counting argument over the wumpuses still alive: when the known ones
+    # and pairwise disjoint disjunctions, each holding at least one more,
+    # already account for all of them, no other cell holds one. Disjunctions
+    # are taken smallest first so the rest of the frontier is cleared the
+    # most. Returns whether anything was ruled out.
+    def count_wumpuses(self, disjunctions):
+        need = self.wumpus_count - self.known_wumpus.count
+        cover = set()
+        for opts in sorted(disjunctions, key=len):
+            if need <= 0:
+                break
+            if (next(iter(opts))[0] == 'W' and cover.isdisjoint(opts)
+                    and not any(f in self.kb.facts for f in opts)):
+                cover |= opts
+                need -= 1
+        if need > 0:
+            return False
+        free = [f for f in self.maybe if f[0] == 'W' and f not in cover and f not in self.kb.facts]
+        self.dismiss(free)
+        for fact in free:
+            self.kb.addFact(f"-{fact}")
+        return bool(free)
+
+    # Take in how an arrow shot from (x, y) along (dx, dy) went. A miss
+    # clears the whole line of fire. A hit kills the first wumpus on it,
+    # somewhere up to the first known wumpus on the line: the disjunctions
+    # naming those cells may have lost their wumpus and are dropped, and
+    # that known wumpus is only possible again. If only one cell could have
+    # held the kill, it is now empty, and safe as a wumpus never shares a
+    # cell with a pit.
+    def record_shot(self, x, y, dx, dy, hit, remaining=None):
+        name = cell_name
+        line = []
+        i, j = x + dx, y + dy
+        while 0 <= i < self.size and 0 <= j < self.size:
+            line.append((i, j))
+            i, j = i + dx, j + dy
+        belief = self.wumpus_belief
+        if belief is not None:
+            self.log_belief()
+            if remaining is not None:
+                belief.count = remaining
+        if remaining is not None:
+            self.set_wumpus_count(remaining)
+        if not hit:
+            for cell in line:
+                self.kb.addFact(f"-W{name(*cell)}")
+                if belief is not None:
+                    belief.clear(*cell)
+        else:
+            reach = []
+            for cell in line:
+                if not self.refuted(f"W{name(*cell)}"):
+                    reach.append(cell)
+                    if cell in self.known_wumpus:
+                        break
+            if reach:
+                cells = set(reach)
+                self.kb.log(setattr, self, 'uncertains', self.uncertains)
+                self.uncertains = [opts for opts in self.uncertains
+                                   if not any(f[0] == 'W' and fact_cell(f) in cells for f in opts)]
+                fact = f"W{name(*reach[-1])}"
+                if reach[-1] in self.known_wumpus:
+                    self.forget_wumpus(fact)
+                    self.consider([fact])
+            if len(reach) == 1:
+                tag = name(*reach[0])
+                self.dismiss([f"W{tag}"])
+                self.kb.addFact(f"-W{tag}")
+                self.kb.addFact(f"-P{tag}")
+                self.kb.addFact(f"Safe{tag}")
+                if belief is not None:
+                    belief.clear(*reach[0])
+        if belief is not None:
+            belief.normalize()
+        self.propagate()
+
+    # Checkpoint the knowledge so hypothetical percepts can be rolled back.
+    # The live status grid is saved with it; cells whose status changed in
+    # between are logged again on pop(), as they changed back.
+    def push(self):
+        self.drain()
+        live = self.live.copy() if self.live is not None else None
+        self.live_marks.append((live, self.dirty.copy(), self.status_version(),
+                                self.shown, self.live_shown))
+        self.kb.push()
+
+    def pop(self):
+        self.kb.pop()
+        self.checked = {}  # the rollback does not go through note()
+        self.live, self.dirty, version, self.shown, self.live_shown = self.live_marks.pop()
+        if version < self.status_base:
+            self.restart_status_log()
+        else:
+            self.status_log.extend(self.status_log[version - self.status_base:])
+
+    # Keep the wumpus belief restorable while a checkpoint is open
+    def log_belief(self):
+        belief = self.wumpus_belief
+        if belief is not None and self.kb.marks:
+            self.kb.log(belief.restore, belief.fork())
+
     def reset_wumpus_knowledge(self):
         # """ Removes all facts and rules related to Wumpus locations. """
+        self.dirty.update(fact_cell(f) for f in self.kb.facts if f.startswith('W'))
+        self.dirty.update(fact_cell(f) for f in self.maybe if f.startswith('W'))
+        self.checked = {}  # the fact sets are replaced without note()
+        self.kb.log(setattr, self.kb, 'facts', self.kb.facts)
+        self.kb.log(setattr, self.kb, 'neg_facts', self.kb.neg_facts)
+        self.kb.log(setattr, self.kb, 'rules', self.kb.rules)
+        self.kb.log(setattr, self.kb, 'rule_keys', self.kb.rule_keys)
+        self.kb.log(setattr, self, 'uncertains', self.uncertains)
+        self.kb.log(setattr, self, 'maybe', self.maybe)
+        self.kb.log(setattr, self, 'known_wumpus', self.known_wumpus)
+        self.kb.log(setattr, self, 'suspected_wumpus', self.suspected_wumpus)
+        self.known_wumpus = LineIndex()
+        self.suspected_wumpus = LineIndex()
+        self.maybe = {f for f in self.maybe if not f.startswith('W')}
         self.kb.facts = {f for f in self.kb.facts if not f.startswith('W')}
         self.kb.neg_facts = {f for f in self.kb.neg_facts if not f.startswith('W')}
-        self.kb.rules = [r for r in self.kb.rules if not r.conclusion.startswith('W')]
+        self.kb.rehash()
+        self.kb.rules = [r for r in self.kb.rules
+                         if not any(c.startswith('W') for c in r.conclusions)]
+        self.kb.rule_keys = {r.key for r in self.kb.rules}
+        self.uncertains = [opts for opts in self.uncertains
+                           if not any(c.startswith('W') for c in opts)]
+
+    def track_wumpus_move(self, remaining=None):
+        # """ Carries wumpus knowledge across a move using the belief filter. """
+        belief = self.wumpus_belief
+        if belief is None:
+            self.reset_wumpus_knowledge()
+            return
+        self.log_belief()
+        if remaining is not None:
+            belief.count = remaining
+            self.set_wumpus_count(remaining)
+        name = cell_name
+
+        # Fold what the rules proved since the last move into the belief
+        for fact in self.kb.facts:
+            if fact[0] == 'P':
+                belief.mark_pit(*fact_cell(fact))
+            elif fact[0] == 'W':
+                belief.mark_wumpus(*fact_cell(fact))
+        for fact in self.kb.neg_facts:
+            if fact[0] == 'W':
+                belief.clear(*fact_cell(fact))
+        for cell, status in self.resolved.items():
+            if status == "unsafe":
+                belief.mark_pit(*cell)
+        belief.normalize()
+        belief.predict()
+
+        # Replace the stale wumpus facts with what the belief still allows.
+        # Cells left out of both are wumpus-free as far as infer() is concerned.
+        self.reset_wumpus_knowledge()
+        for fact in [f for f in self.kb.facts if f.startswith("Safe")]:
+            if belief.prob[fact_cell(fact)] > belief.threshold:
+                self.kb.removeFact(fact)
+        for cell in [c for c, status in self.resolved.items() if status == "safe"]:
+            if belief.prob[cell] > belief.threshold:
+                self.resolve(cell, None)
+        for i, j in belief.certain_cells():
+            self.kb.addFact(f"W{name(i, j)}")
+            self.learn_wumpus(f"W{name(i, j)}")
+        possible = [f"W{name(i, j)}" for i, j in belief.uncertain_cells()]
+        self.kb.log(setattr, self, 'belief_key', self.belief_key)
+        self.belief_key = 0
+        if possible and belief.count > 0:
+            self.uncertains.append(set(possible))
+            self.kb.log(self.uncertains.pop)
+            self.consider(possible)
+            self.belief_key = keys.combine(('possible', f) for f in possible)
+        self.propagate()
     
     def infer(self, query):
+        # Answers only depend on the hashed state, so repeated states are free
+        cell = (query[0], query[1])
+        key = self.state_hash()
+        known = self.table.get(key)
+        if known is None:
+            known = {}
+            self.table.put(key, known)
+        status = known.get(cell)
+        if status is None:
+            status = known[cell] = self.derive(cell)
+        return status
+
+    # Status codes of every cell after one propagation step, as a read-only
+    # int8 array indexed [x, y]. Cells follow the same precedence as derive().
+    # The grid is built once and then brought up to date only at the cells
+    # whose facts changed since. Cells that differ from the grid returned
+    # last time go to the status log.
+    def status_grid(self, size=None):
+        key = self.state_hash()
+        grid = self.grids.get(key)
+        if grid is None:
+            self.step()
+            if self.live is None:
+                self.build_live(size or self.size)
+            self.drain()
+            live = self.live
+            for cell in self.dirty:
+                status = self.cell_status(cell)
+                if live[cell] != status:
+                    live[cell] = status
+                    if self.live_shown:
+                        self.status_log.append(cell)
+            self.dirty.clear()
+            if not self.live_shown:
+                self.log_difference(live)
+            grid = live.copy()
+            grid.setflags(write=False)
+            self.grids.put(key, grid)
+            self.grids.put(self.state_hash(), grid)
+            self.live_shown = True
+        elif grid is not self.shown:
+            # a grid cached for an earlier state, which the live grid may not match
+            self.log_difference(grid)
+            self.live_shown = False
+        self.shown = grid
+        if len(self.status_log) > STATUS_LOG_MAX:
+            self.restart_status_log()
+        return grid
+
+    # Log every cell where grid differs from the one returned last
+    def log_difference(self, grid):
+        if self.shown is None:
+            self.restart_status_log()
+        else:
+            self.status_log.extend(map(tuple, np.argwhere(grid != self.shown).tolist()))
+
+    # Status code of one cell, by the precedence of derive()
+    def cell_status(self, cell):
+        status = self.resolved.get(cell)
+        if status is not None:
+            return SAFE if status == "safe" else UNSAFE
+        tag = cell_name(*cell)
+        facts = self.kb.facts
+        if f"Safe{tag}" in facts:
+            return SAFE
+        if f"W{tag}" in facts or f"P{tag}" in facts:
+            return UNSAFE
+        if f"W{tag}" in self.maybe or f"P{tag}" in self.maybe:
+            return UNCERTAIN
+        return SAFE
+
+    # Build the live grid from every fact, once per engine
+    def build_live(self, size):
+        live = np.full((size, size), SAFE, dtype=np.int8)
+        for fact in self.maybe:
+            live[fact_cell(fact)] = UNCERTAIN
+        for fact in self.kb.facts:
+            if fact[0] in "WP":
+                live[fact_cell(fact)] = UNSAFE
+        for fact in self.kb.facts:
+            if fact.startswith("Safe"):
+                live[fact_cell(fact)] = SAFE
+        for cell, status in self.resolved.items():
+            live[cell] = SAFE if status == "safe" else UNSAFE
+        self.live = live
+        self.drain()
+        self.dirty.clear()
+        self.restart_status_log()
+
+    # Turn the names of facts changed in the knowledge base into dirty cells
+    def drain(self):
+        changed = self.kb.changed
+        if changed:
+            cells = {fact_cell(fact) for fact in changed}
+            self.dirty |= cells
+            self.unchecked |= cells
+            changed.clear()
+
+    # Version of the status log: how many changes it has seen in all
+    def status_version(self):
+        return self.status_base + len(self.status_log)
+
+    # Drop the logged changes; anyone reading from before must start over
+    def restart_status_log(self):
+        self.status_base = self.status_version() + 1
+        self.status_log = []
+
+    # Cells whose code in status_grid() changed since version `since`, and
+    # the current version. The cells are None when the log no longer reaches
+    # back that far, and the caller should look at the whole grid again.
+    def status_changes(self, since):
+        version = self.status_version()
+        if since < self.status_base:
+            return None, version
+        return self.status_log[since - self.status_base:], version
+
+    # Status codes of many cells at once, in the order given
+    def infer_many(self, cells):
+        cells = np.asarray(cells, dtype=np.intp).reshape(-1, 2)
+        return self.status_grid()[cells[:, 0], cells[:, 1]]
+
+    def derive(self, query):
         xpos, ypos = query
-        name = lambda i, j: f"{i}{j}"
+        name = cell_name
+        status = self.resolved.get((xpos, ypos))
+        if status is not None:
+            return status
         if f"Safe{name(xpos, ypos)}" in self.kb.facts:
             return "safe"
-        changed = True
-        while changed:
-            changed = False
-            for rule in self.kb.rules:
-                if (rule.triggered(self.kb.facts)):
-                    self.uncertains.append(rule.conclusions)
-                    self.kb.removeRule(rule)
-                    changed = True
-            
-            still_uncertain = []
-            for opts in self.uncertains:
-                opts -= self.kb.facts 
-                if len(opts) == 1:
-                    fact = next(iter(opts))
-                    if fact not in self.kb.facts:
-                        self.kb.addFact(fact)
-                        changed = True
-                else:
-                    still_uncertain.append(opts)
-            self.uncertains = still_uncertain
-            
-            is_unsafe = False
-            is_uncertain = False
-            xpos = query[0]
-            ypos = query[1]
-            
-            name = lambda i, j: f"{i}{j}"
-            
-            dangerous_facts = {f"W{name(xpos, ypos)}", f"P{name(xpos, ypos)}"}
-            
-            for fact in dangerous_facts:
-                if fact in self.kb.facts:
-                    is_unsafe = True
-                    break 
-                
-            if not is_unsafe:
-                for opts in self.uncertains:
-                    if (f"W{name(xpos, ypos)}" in opts) or \
-                    (f"P{name(xpos, ypos)}" in opts):
-                        is_uncertain = True
-                        break
+        self.step()
+
+        is_unsafe = False
+        is_uncertain = False
+
+        dangerous_facts = {f"W{name(xpos, ypos)}", f"P{name(xpos, ypos)}"}
+
+        for fact in dangerous_facts:
+            if fact in self.kb.facts:
+                is_unsafe = True
+                break
+
+        if not is_unsafe:
+            is_uncertain = any(fact in self.maybe for fact in dangerous_facts)
+
+        if is_unsafe:
+            return "unsafe"
+        elif is_uncertain:
+            return "uncertain"
+        else:
+            return "safe"
+
+    # One pass of rule firing and disjunction narrowing. Disjunctions that
+    # already hold are dropped, members known to be false are removed, and
+    # what is left goes through minimal(). Every member stays in self.maybe
+    # until it is ruled out, so dropping a disjunction loses no uncertainty.
+    # Returns whether anything changed. A disjunction kept unchanged last time
+    # is only looked at again once a fact about one of its cells changed.
+    def step(self):
+        changed = False
+        for rule in list(self.kb.rules):
+            if (rule.triggered(self.kb.facts)):
+                self.uncertains.append(rule.conclusions)
+                self.kb.log(self.uncertains.pop)
+                self.consider(rule.conclusions)
+                self.kb.removeRule(rule)
+                changed = True
+
+        self.drain()
+        touched = {f"{kind}{cell_name(*cell)}" for cell in self.unchecked for kind in "WP"}
+        self.unchecked = set()
+        checked = self.checked
+        still_uncertain = []
+        facts, pits, refuted = self.kb.facts, self.resolved_pits, self.refuted
+        for opts in self.uncertains:
+            if checked.get(id(opts)) is opts and touched.isdisjoint(opts):
+                still_uncertain.append(opts)
+                continue
+            if not (facts.isdisjoint(opts) and pits.isdisjoint(opts)):  # some member holds()
+                changed = True
+                continue
+            false = [f for f in opts if refuted(f)]
+            if false:
+                opts = opts.difference(false)  # a new set: forks and rules share the old one
+                self.dismiss(false)
+                changed = True
+            if len(opts) == 1:
+                fact = next(iter(opts))
+                self.dismiss(opts)
+                self.kb.addFact(fact)
+                self.learn_wumpus(fact)
+            elif opts:
+                still_uncertain.append(opts)
+        settled = self.settled
+        if len(still_uncertain) == len(settled) and all(map(operator.is_, still_uncertain, settled)):
+            kept = still_uncertain  # the same disjunctions minimal() returned last time
+        else:
+            kept = self.minimal(still_uncertain)
+        self.settled = tuple(kept)
+        self.checked = {id(opts): opts for opts in kept}
+        if self.wumpus_count is not None and self.count_wumpuses(kept):
+            changed = True
+        if changed or len(kept) != len(self.uncertains):
+            self.kb.log(setattr, self, 'uncertains', self.uncertains)
+            self.uncertains = kept
+            return True
+        return False
+
+    # Step until nothing changes, so what the engine holds depends only on
+    # what it was told and not on how often it was queried since
+    def propagate(self):
+        while self.step():
+            pass
+
+    # The disjunctions that no other one implies: a subset holds whenever its
+    # superset would, so duplicates and supersets go. Candidates are found
+    # through the facts they share, so the cost follows the frontier size.
+    def minimal(self, disjunctions):
+        kept = []
+        containing = {}
+        for opts in sorted(disjunctions, key=len):
+            if any(other <= opts for f in opts for other in containing.get(f, ())):
+                continue
+            kept.append(opts)
+            for f in opts:
+                containing.setdefault(f, []).append(opts)
+        return kept
 
-            if is_unsafe:
-                return "unsafe"
-            elif is_uncertain:
-                return "uncertain"
-            else:
-                return "safe"
-    
     def process_percepts(self, x, y, percepts, world):
-        name = lambda i, j: f"{i}{j}"
+        name = cell_name
+        if not self.size_key:
+            self.size = world.size
+            self.size_key = keys.key(('size', world.size))
+        if self.wumpus_belief is not None:
+            self.log_belief()
+            self.wumpus_belief.observe(x, y, 'S' in percepts)
         self.kb.addFact(f"Safe{name(x, y)}")
-        self.kb.addFact(f"-W{x}{y}")
-        self.kb.addFact(f"-P{x}{y}")
+        self.kb.addFact(f"-W{name(x, y)}")
+        self.kb.addFact(f"-P{name(x, y)}")
         
         if 'S' in percepts:
             options = [f"W{name(i,j)}" for i,j in world.adjacent(x, y)]
@@ -121,13 +772,17 @@ class InferenceEngine:
             self.kb.addFact(f"B{name(x,y)}")
         
         if 'S' not in percepts and 'B' not in percepts:
-            self.kb.addFact(f"-W{x}{y}")
-            self.kb.addFact(f"-P{x}{y}")
-            self.kb.addFact(f"Safe{x}{y}")
+            self.kb.addFact(f"-W{name(x, y)}")
+            self.kb.addFact(f"-P{name(x, y)}")
+            self.kb.addFact(f"Safe{name(x, y)}")
             for i, j in world.adjacent(x, y):
-                self.kb.addFact(f"-W{i}{j}")
-                self.kb.addFact(f"-P{i}{j}")
-                self.kb.addFact(f"Safe{i}{j}")
-                
+                self.kb.addFact(f"-W{name(i, j)}")
+                self.kb.addFact(f"-P{name(i, j)}")
+                self.kb.addFact(f"Safe{name(i, j)}")
+
+        self.propagate()
+        if len(self.kb.facts) + len(self.kb.neg_facts) > self.compact_at:
+            self.compact()
+
     def printUncertains(self):
         print("uncertain:", self.uncertains)
\ No newline at end of file
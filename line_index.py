@@ -0,0 +1,63 @@
+# Cells grouped by row and by column, for line-of-fire queries.
+# rows[y] holds the x of every indexed cell in row y, cols[x] the y of every
+# indexed cell in column x.
+class LineIndex:
+    def __init__(self, cells=()):
+        self.rows = {}
+        self.cols = {}
+        self.count = 0
+        for x, y in cells:
+            self.add(x, y)
+
+    def add(self, x, y):
+        row = self.rows.setdefault(y, set())
+        if x not in row:
+            row.add(x)
+            self.cols.setdefault(x, set()).add(y)
+            self.count += 1
+
+    def discard(self, x, y):
+        row = self.rows.get(y)
+        if row is None or x not in row:
+            return
+        row.discard(x)
+        if not row:
+            del self.rows[y]
+        col = self.cols[x]
+        col.discard(y)
+        if not col:
+            del self.cols[x]
+        self.count -= 1
+
+    def copy(self):
+        index = LineIndex()
+        index.rows = {y: set(xs) for y, xs in self.rows.items()}
+        index.cols = {x: set(ys) for x, ys in self.cols.items()}
+        index.count = self.count
+        return index
+
+    def __contains__(self, cell):
+        return cell[0] in self.rows.get(cell[1], ())
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for y, xs in self.rows.items():
+            for x in xs:
+                yield (x, y)
+
+    # Indexed cells strictly ahead of (x, y) when looking along (dx, dy),
+    # as distances from (x, y)
+    def ahead(self, x, y, dx, dy):
+        if dx:
+            return [(xx - x) * dx for xx in self.rows.get(y, ()) if (xx - x) * dx > 0]
+        return [(yy - y) * dy for yy in self.cols.get(x, ()) if (yy - y) * dy > 0]
+
+    # Closest indexed cell ahead of (x, y) along (dx, dy), or None
+    def first_hit(self, x, y, dx, dy):
+        ahead = self.ahead(x, y, dx, dy)
+        if not ahead:
+            return None
+        dist = min(ahead)
+        return (x + dx * dist, y + dy * dist)
@@ -1,14 +1,19 @@
 import pygame
 import sys
+from functools import partial
 from environment import Environment
 from agent import Agent
 from visualizer import Visualizer
-from inference import InferenceEngine
-from planning import make_next_action, reset_planner
+from inference import InferenceEngine, STATUS_NAMES
+from wumpus_belief import WumpusBelief
+import planning
+from planning import shared_planner, perform, reset_planner
 from advanced_planning import make_advanced_action, make_random_action
 from testcases.map1 import map1
 from testcases.map2 import map2
 from testcases.map3 import map3
+from decision_worker import DecisionWorker
+from game_state import GRAB_REWARD, WIN_REWARD, DEATH_PENALTY
 
 pygame.init()
 font = pygame.font.SysFont("Arial", 18)
@@ -18,24 +23,40 @@ info = pygame.display.Info()
 DISPLAY_WIDTH, DISPLAY_HEIGHT = info.current_w - 70, info.current_h - 70
 PANEL_WIDTH = 380
 
+MIN_CELL_SIZE = 24
+MAX_MAP_SIZE = 256
+
 # Input settings
 def calculate_cell_size(n):
-    return min((DISPLAY_WIDTH - PANEL_WIDTH) // n, DISPLAY_HEIGHT // n)
+    return max(MIN_CELL_SIZE, min((DISPLAY_WIDTH - PANEL_WIDTH) // n, DISPLAY_HEIGHT // n))
+
+# Columns and rows of the board that fit on screen; larger maps scroll
+def calculate_view(n):
+    return (min(n, max(1, (DISPLAY_WIDTH - PANEL_WIDTH) // CELL_SIZE)),
+            min(n, max(1, DISPLAY_HEIGHT // CELL_SIZE)))
 
 map_size = 8
 CELL_SIZE = calculate_cell_size(map_size)
-WINDOW_WIDTH = CELL_SIZE * map_size + PANEL_WIDTH
-WINDOW_HEIGHT = max(CELL_SIZE * map_size, 600)
+view_cols, view_rows = calculate_view(map_size)
+WINDOW_WIDTH = CELL_SIZE * view_cols + PANEL_WIDTH
+WINDOW_HEIGHT = max(CELL_SIZE * view_rows, 600)
 screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
 pygame.display.set_caption("Wumpus World Game")
 clock = pygame.time.Clock()
+planning.time_budget = 0.1  # keep each frame responsive on large maps
+
+# Think on a worker thread while the UI draws; --serial thinks in the frame
+worker = None if "--serial" in sys.argv else DecisionWorker()
 
 # Game state variables
 wumpus_count = 2
 pit_ratio = 0.2
 current_setting = "basic"
 action_log = []
+log_printed = False
 lose_game = False
+step_begun = False  # begin_step() ran and end_step() has not yet
+observed_step = 0  # last step whose percepts the inference engine took in
 
 def draw_button(surface, rect, text, active):
     color = (0, 255, 0) if active else (200, 200, 200)
@@ -114,10 +135,10 @@ initial_map_data = None
 def reset_game(preset_map=None, use_saved=False):
     global env, agent, vis, score, step_count, percepts, game_end, inference_engine
     global auto_play, paused, game_won, game_lose, game_tie, lose_game
-    global initial_map_data
-
-    inference_engine = InferenceEngine()
+    global initial_map_data, action_log, log_printed, step_begun, observed_step
 
+    if worker is not None:
+        worker.cancel()  # the worker must let go of the old game first
     if use_saved and initial_map_data:
         env = Environment.read_map_from_file(initial_map_data["grid"], initial_map_data["size"])
     elif preset_map is not None:
@@ -141,8 +162,9 @@ def reset_game(preset_map=None, use_saved=False):
 
     env.grid[0][0].has_pit = False
     env.grid[0][0].has_wumpus = False
+    inference_engine = InferenceEngine(WumpusBelief(env.size, env.remaining_wumpuses))
     agent = Agent()
-    vis = Visualizer(env, agent)
+    vis = Visualizer(env, agent, cell_size=min(64, CELL_SIZE), view=calculate_view(env.size))
     score = 0
     step_count = 0
     game_end = False
@@ -153,8 +175,92 @@ def reset_game(preset_map=None, use_saved=False):
     game_lose = False
     game_tie = False
     lose_game = False
+    action_log = []
+    log_printed = False
+    step_begun = False
+    observed_step = 0
     reset_planner()
 
+# Start a step: pay for it, pick up gold seen last step and read the percepts
+def begin_step():
+    global score, step_count, percepts, step_begun
+    score -= 1
+    step_count += 1
+    step_begun = True
+    if 'G' in percepts:
+        if agent.grab(env):
+            score += GRAB_REWARD
+    env.agent_pos = agent.position
+    percepts = env.get_percepts()
+
+# Inference and planning for a step: returns the planner's action (None
+# when it is not asked) and the full safety map. Runs on the worker in
+# pipelined mode; percepts are taken in once even if a cancelled job ran.
+def think(agent, env, inference_engine, percepts, step, plan, cancelled=None):
+    global observed_step
+    if observed_step != step:
+        inference_engine.process_percepts(env.agent_pos[0], env.agent_pos[1], percepts, env)
+        observed_step = step
+    action = None
+    if plan and not (cancelled is not None and cancelled.is_set()):
+        action = shared_planner(env.size).plan(agent, inference_engine, env)
+    return action, inference_engine.status_grid(env.size)
+
+# Finish a step: carry out the action and settle win, tie, death and
+# wumpus moves
+def end_step(action, safety):
+    global score, auto_play, paused, game_end, game_won, game_lose, game_tie, step_begun
+    step_begun = False
+    actions = []
+    if current_setting == "random":
+        make_random_action(agent, env, actions, action_log)
+    elif action:
+        actions.append(action)
+        action_log.append(action)
+        perform(agent, env, action, inference_engine)
+
+    for action in actions:
+
+        # Check if game completed successfully
+        if action == "climb" and agent.has_gold and tuple(agent.position) == (0, 0):
+            score += WIN_REWARD
+            auto_play = False
+            game_end = True
+            game_won = True
+            break
+
+        if action == "climb" and not agent.has_gold and tuple(agent.position) == (0, 0):
+            auto_play = False
+            game_end = True
+            game_tie = True
+            break
+
+    print("Arrows left:", agent.arrows)
+    shown = [(0, 0), *env.adjacent(env.agent_pos[0], env.agent_pos[1])]
+    for di, dj in shown:
+        print(f"cell({di}, {dj}) is " + STATUS_NAMES[safety[di, dj]])
+    inference_engine.kb.show()
+
+    x, y = agent.position
+    cell = env.grid[x][y]
+    if cell.has_pit or cell.has_wumpus:
+        game_end = True
+        game_lose = True
+        auto_play = False
+        paused = True
+
+    if current_setting == "advanced" and step_count > 0 and step_count % planning.params.wumpus_move_every == 0:
+        print(f"--- Wumpuses are moving (end of step {step_count}) ---")
+        env.move_wumpuses()
+
+        inference_engine.track_wumpus_move(env.remaining_wumpuses)  # Carry wumpus beliefs through the move
+        # Check if a Wumpus moved into the agent's cell
+        x, y = agent.position
+        if env.grid[x][y].has_wumpus:
+            game_lose = True
+            game_end = True
+            win_message = "You lose! A Wumpus moved on top of you!"
+
 
 # Initial setup
 auto_play = False
@@ -170,9 +276,10 @@ reset_game()
 
 while True:
     clock.tick(5)
-    panel_left = CELL_SIZE * map_size
+    view_cols, view_rows = calculate_view(map_size)
+    panel_left = CELL_SIZE * view_cols
     WINDOW_WIDTH = panel_left + PANEL_WIDTH
-    WINDOW_HEIGHT = max(CELL_SIZE * map_size, 600)
+    WINDOW_HEIGHT = max(CELL_SIZE * view_rows, 600)
     screen.fill((255, 255, 255))
 
     # Update button and input positions
@@ -243,16 +350,17 @@ while True:
                                 map_size = int(input_texts["size"])
                                 wumpus_count = int(input_texts["wumpus"])
                                 pit_ratio = float(input_texts["pit"])
-                                if not (1 <= map_size <= 12):
-                                    error_message = "Map size must be between 1 and 12."
+                                if not (1 <= map_size <= MAX_MAP_SIZE):
+                                    error_message = f"Map size must be between 1 and {MAX_MAP_SIZE}."
                                     map_size = map_size_current
                                 elif wumpus_count >= map_size * map_size or not (0 <= pit_ratio < 1):
                                     error_message = "Invalid map settings."
                                     map_size = map_size_current
                                 else:
                                     CELL_SIZE = calculate_cell_size(map_size)
-                                    WINDOW_WIDTH = CELL_SIZE * map_size + PANEL_WIDTH + 50
-                                    WINDOW_HEIGHT = max(CELL_SIZE * map_size + 50, 600)
+                                    view_cols, view_rows = calculate_view(map_size)
+                                    WINDOW_WIDTH = CELL_SIZE * view_cols + PANEL_WIDTH + 50
+                                    WINDOW_HEIGHT = max(CELL_SIZE * view_rows + 50, 600)
                                     screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
                                     game_won = False
                                     reset_game()
@@ -265,6 +373,8 @@ while True:
                         paused = False
                     elif key == "pause":
                         paused = True
+                        if worker is not None:
+                            worker.cancel()
                     elif key == "restart":
                         auto_play = False
                         paused = False
@@ -278,72 +388,34 @@ while True:
                 active_input = None
             else:
                 input_texts[active_input] += event.unicode
+        elif event.type == pygame.KEYDOWN:
+            # Arrow keys scroll maps larger than the window
+            scroll = {pygame.K_LEFT: (-1, 0), pygame.K_RIGHT: (1, 0),
+                      pygame.K_UP: (0, 1), pygame.K_DOWN: (0, -1)}.get(event.key)
+            if scroll:
+                vis.scroll(*scroll)
 
     # Only runs when game is active
     if auto_play and not paused and not game_end:
-        score -= 1
-        step_count += 1
-        if 'G' in percepts:
-            if agent.grab(env):
-                score += 10
-        
-        env.agent_pos = agent.position
-        percepts = env.get_percepts()
-        #inference engine to deduce neighboring cells are safe or not
-        inference_engine.process_percepts(env.agent_pos[0], env.agent_pos[1], percepts, env)
-        
-        actions = []
-        if (current_setting == "basic"):
-            make_next_action(agent, inference_engine, env, actions, action_log)
-        elif (current_setting == "advanced"):
-            make_next_action(agent, inference_engine, env, actions, action_log)
-        elif (current_setting == "random"):
-            make_random_action(agent, env, actions, action_log)
-        
-        for action in actions:
-            
-            # Check if game completed successfully
-            if action == "climb" and agent.has_gold and tuple(agent.position) == (0, 0):
-                score += 1000
-                auto_play = False
-                game_end = True
-                game_won = True
-                break
-            
-            if action == "climb" and not agent.has_gold and tuple(agent.position) == (0, 0):
-                auto_play = False
-                game_end = True
-                game_tie = True
-                break
-        
-        print("Arrows left:", agent.arrows)
-        print(f"cell(0, 0) is " + inference_engine.infer((0, 0)))
-        for di, dj in env.adjacent(env.agent_pos[0], env.agent_pos[1]):
-            print(f"cell({di}, {dj}) is " + inference_engine.infer((di, dj)))
-        inference_engine.kb.show()
-        
-        x, y = agent.position
-        cell = env.grid[x][y]
-        if cell.has_pit or cell.has_wumpus:
-           game_end = True
-           game_lose = True
-           auto_play = False
-           paused = True
-
-        if current_setting == "advanced" and step_count > 0 and step_count % 5 == 0:
-            print(f"--- Wumpuses are moving (end of step {step_count}) ---")
-            env.move_wumpuses()
-            
-            inference_engine.reset_wumpus_knowledge()  # Agent's knowledge of Wumpus locations is now outdated
-            # Check if a Wumpus moved into the agent's cell
-            x, y = agent.position
-            if env.grid[x][y].has_wumpus:
-                game_lose = True
-                game_end = True
-                win_message = "You lose! A Wumpus moved on top of you!"
+        plan = current_setting != "random"
+        if worker is None:
+            begin_step()
+            end_step(*think(agent, env, inference_engine, percepts, step_count, plan))
+        else:
+            # Take the decision made while the last frames were drawn, then
+            # start on the next one
+            decision = worker.poll()
+            if decision is not None:
+                end_step(*decision)
+            if auto_play and not game_end and not worker.busy():
+                if not step_begun:
+                    begin_step()
+                worker.submit(partial(think, agent, env, inference_engine, percepts, step_count, plan))
         # auto_play = False
        
 
+    if auto_play and not paused:
+        vis.follow()
     vis.draw(screen)
     pygame.draw.rect(screen, (200, 200, 200), (panel_left, 0, PANEL_WIDTH, WINDOW_HEIGHT))
 
@@ -363,21 +435,22 @@ while True:
     draw_percepts_table(screen, panel_left + 10, 310, percepts)
     draw_score(screen, panel_left + 10, 430, score)
     
+    if game_end and not log_printed:
+        print(f"Action log: {action_log}")
+        log_printed = True
+
     if game_end:
         if game_won:
             win_surf = small_font.render("You win! Agent escaped with gold!", True, (0, 200, 100))
-            print(f"Action log: {action_log}")
             screen.blit(win_surf, (panel_left + 10, 460))
         elif game_lose:
             if lose_game:
-                score -= 1000
+                score -= DEATH_PENALTY
                 lose_game = True
             lose_surf = small_font.render("You lose!", True, (255, 0, 0))
-            print(f"Action log: {action_log}")
             screen.blit(lose_surf, (panel_left + 10, 460))
         elif game_tie:
             win_surf = small_font.render("Agent escaped without gold!", True, (0, 0, 0))
-            print(f"Action log: {action_log}")
             screen.blit(win_surf, (panel_left + 10, 460))
 
     if error_message:
@@ -0,0 +1,499 @@
+import math
+import time
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from environment import DIRECTIONS
+from topology import topology, DIRECTION_DELTAS
+from inference import fact_cell
+from planning import perform
+from game_state import GRAB_REWARD, WIN_REWARD, DEATH_PENALTY
+from world_sampler import WorldSampler
+
+# Monte Carlo tree search over hidden maps (POMCP with macro actions).
+#
+# Every simulation takes a complete map that agrees with what the agent has
+# perceived, drawn in batches by world_sampler, then walks the tree on it.
+# Tree actions are macros: walk over visited cells and step into one
+# frontier cell ("go", cell), step into the nearest cell known to be safe
+# ("explore"), walk to a visited cell and fire along a row or column with
+# suspected wumpuses ("shoot", cell, direction), or walk home and climb out
+# ("home"). Entering a cell yields an observation (breeze, stench, glitter)
+# and a shot whether it killed; each distinct observation gets its own
+# child node. New nodes are valued by a rollout of a cheap greedy policy
+# that explores safe cells and then goes home, like Planner. Grabbing the gold ends the simulation with
+# the walk home, since visited cells stay safe in the static game.
+#
+# With workers > 1 every process grows its own tree for the same budget from
+# its own seed and the root statistics are summed (root parallelism).
+# Wumpuses are treated as static.
+
+BATCH = 64  # maps drawn from the sampler at a time
+SHOTS = 3  # shoot macros tried per node, the lines with most suspects first
+TURNS = (0, 1, 2, 1)  # turns needed for a change of heading by 0, 1, 2 or 3 quarters
+HEADINGS = {delta: d for d, delta in DIRECTION_DELTAS.items()}
+
+def turn_cost(current, target):
+    return TURNS[(DIRECTIONS.index(target) - DIRECTIONS.index(current)) % 4]
+
+# First turn towards a heading, turning right for a half turn like Planner
+def turn_toward(current, target):
+    return "turn_left" if (DIRECTIONS.index(target) - DIRECTIONS.index(current)) % 4 == 3 else "turn_right"
+
+# What the agent has perceived, plus what the inference engine has proven
+class Knowledge:
+    def __init__(self, size, remaining=0):
+        self.size = size
+        self.visited = set()
+        self.frontier = set()  # unvisited cells next to a visited one
+        self.breezy = set()
+        self.stenchy = set()
+        self.no_pit = set()
+        self.no_wumpus = set()
+        self.pits = set()  # proven pits
+        self.wumpuses = set()  # proven wumpuses
+        self.gold = None  # cell seen glittering
+        self.remaining = remaining  # wumpuses left on the map
+        self.pos = (0, 0)
+        self.direction = "E"
+        self.has_gold = False
+        self.arrows = 1
+
+    def copy(self):
+        k = Knowledge.__new__(Knowledge)
+        k.__dict__ = self.__dict__.copy()
+        for name in ("visited", "frontier", "breezy", "stenchy", "no_pit", "no_wumpus"):
+            setattr(k, name, getattr(self, name).copy())
+        return k
+
+    def observe(self, cell, breeze, stench, glitter):
+        neighbors = topology(self.size).neighbors[cell[0]][cell[1]]
+        self.visited.add(cell)
+        self.frontier.discard(cell)
+        self.frontier.update(n for n in neighbors if n not in self.visited)
+        self.no_pit.add(cell)
+        self.no_wumpus.add(cell)
+        if breeze:
+            self.breezy.add(cell)
+        else:
+            self.no_pit.update(neighbors)
+        if stench:
+            self.stenchy.add(cell)
+        else:
+            self.no_wumpus.update(neighbors)
+        if glitter:
+            self.gold = cell
+
+    def safe(self, cell):
+        return cell in self.no_pit and cell in self.no_wumpus
+
+    # Cells an arrow fired from cell towards direction passes, nearest first
+    def line(self, cell, direction):
+        dx, dy = DIRECTION_DELTAS[direction]
+        x, y = cell[0] + dx, cell[1] + dy
+        cells = []
+        while 0 <= x < self.size and 0 <= y < self.size:
+            cells.append((x, y))
+            x, y = x + dx, y + dy
+        return cells
+
+    # Take in a shot as InferenceEngine.record_shot does: a miss clears the
+    # line; a hit kills somewhere up to the first proven wumpus, whose cell
+    # is then only possible, and empties the cell if only one could hold it.
+    # The first cell the arrow could hit is free of wumpuses either way, and
+    # stenches next to those cells may have died with the wumpus.
+    def shot(self, cell, direction, hit):
+        self.arrows -= 1
+        line = self.line(cell, direction)
+        if not hit:
+            self.no_wumpus.update(line)
+            return
+        reach = []
+        for c in line:
+            if c not in self.no_wumpus:
+                reach.append(c)
+                if c in self.wumpuses:
+                    break
+        if not reach:
+            return
+        self.no_wumpus.add(reach[0])
+        self.wumpuses = self.wumpuses - {reach[-1]}
+        neighbors = topology(self.size).neighbors
+        self.stenchy = self.stenchy - {n for c in reach for n in neighbors[c[0]][c[1]]}
+        if len(reach) == 1:
+            self.no_pit.add(reach[0])
+
+    # Cells that may hold a wumpus: proven ones, and unexplored cells next
+    # to a stench that nothing has cleared
+    def suspects(self):
+        neighbors = topology(self.size).neighbors
+        suspects = set(self.wumpuses)
+        for cell in self.stenchy:
+            suspects.update(n for n in neighbors[cell[0]][cell[1]]
+                            if n not in self.visited and n not in self.no_wumpus and n not in self.pits)
+        return suspects
+
+    # Up to SHOTS ("shoot", cell, direction) macros from visited cells in
+    # line with suspects, the most suspects passed first, then the nearest
+    def shots(self):
+        if self.arrows <= 0:
+            return []
+        suspects = self.suspects()
+        if not suspects:
+            return []
+        options = []
+        for cell in self.visited:
+            for direction in DIRECTIONS:
+                count = sum(1 for c in self.line(cell, direction) if c in suspects)
+                if count:
+                    dist = abs(cell[0] - self.pos[0]) + abs(cell[1] - self.pos[1])
+                    options.append((-count, dist, cell, direction))
+        options.sort()
+        return [("shoot", cell, direction) for _, _, cell, direction in options[:SHOTS]]
+
+    # Cells from pos to the first cell accepted by want, over visited cells
+    # only (the last cell may be unvisited); None if there is none
+    def route(self, want):
+        start = self.pos
+        if want(start):
+            return [start]
+        prev = {start: None}
+        queue = deque([start])
+        neighbors = topology(self.size).neighbors
+        while queue:
+            cell = queue.popleft()
+            for n in neighbors[cell[0]][cell[1]]:
+                if n in prev:
+                    continue
+                prev[n] = cell
+                if want(n):
+                    path = [n]
+                    while prev[path[-1]] is not None:
+                        path.append(prev[path[-1]])
+                    return path[::-1]
+                if n in self.visited:
+                    queue.append(n)
+        return None
+
+    # Walk a route, returning the number of actions it takes
+    def walk(self, path):
+        cost = 0
+        for cell in path[1:]:
+            heading = HEADINGS[(cell[0] - self.pos[0], cell[1] - self.pos[1])]
+            cost += turn_cost(self.direction, heading) + 1
+            self.direction = heading
+            self.pos = cell
+        return cost
+
+class Node:
+    __slots__ = ("visits", "actions", "stats", "children")
+
+    def __init__(self):
+        self.visits = 0
+        self.actions = None
+        self.stats = {}  # action -> [visits, total return]
+        self.children = {}  # (action, observation) -> Node
+
+class Search:
+    def __init__(self, knowledge, pit_prob, exploration=0.5, depth=1, seed=None):
+        self.root_knowledge = knowledge
+        self.pit_prob = pit_prob
+        self.exploration = exploration
+        self.depth = depth
+        self.rng = random.Random(seed)
+        self.root = Node()
+        self.sampler = WorldSampler.from_knowledge(knowledge, pit_prob, seed)
+        self.worlds = iter(())
+
+    # Next sampled map as ([x][y] pits, [x][y] wumpuses, gold cell), drawn
+    # BATCH at a time
+    def sample(self):
+        world = next(self.worlds, None)
+        if world is None:
+            batch = self.sampler.sample(BATCH)
+            self.worlds = (batch.world(i) for i in range(BATCH))
+            world = next(self.worlds)
+        return world
+
+    def run(self, deadline=None, simulations=None):
+        done = 0
+        while (simulations is None or done < simulations) and (deadline is None or time.perf_counter() < deadline):
+            k = self.root_knowledge.copy()
+            world = self.sample()
+            self.simulate(self.root, k, world, 0)
+            done += 1
+        return self.root.stats
+
+    # Macros worth trying from k: nearest safe cell, each uncertain frontier
+    # cell, the best shots, home. Below the root, gambles are only tried once
+    # no safe cell is left, so bad gambles explored there do not drag down
+    # the value of the root action that led to them.
+    def candidates(self, k, root):
+        actions = []
+        if any(k.safe(c) for c in k.frontier):
+            actions.append("explore")
+            if not root:
+                return actions + ["home"]
+        for cell in sorted(k.frontier):
+            if not k.safe(cell) and cell not in k.pits and cell not in k.wumpuses:
+                actions.append(("go", cell))
+        actions.extend(k.shots())
+        actions.append("home")
+        return actions
+
+    # Play a macro on the sampled world: (reward, observation, terminal)
+    def apply(self, k, world, action):
+        pits, wumpuses, gold = world
+        if action == "home":
+            path = k.route(lambda c: c == (0, 0))
+            cost = k.walk(path) + 1
+            return (WIN_REWARD if k.has_gold else 0) - cost, None, True
+        if action[0] == "shoot":
+            return self.shoot(k, wumpuses, action[1], action[2])
+        if action == "explore":
+            path = k.route(lambda c: c not in k.visited and k.safe(c))
+        else:
+            target = action[1]
+            path = k.route(lambda c: c == target)
+        if path is None:
+            return 0, None, True
+        reward = -k.walk(path)
+        cell = k.pos
+        if pits[cell[0]][cell[1]] or wumpuses[cell[0]][cell[1]]:
+            return reward - DEATH_PENALTY, None, True
+        neighbors = topology(k.size).neighbors[cell[0]][cell[1]]
+        breeze = any(pits[x][y] for x, y in neighbors)
+        stench = any(wumpuses[x][y] for x, y in neighbors)
+        glitter = cell == gold
+        k.observe(cell, breeze, stench, glitter)
+        if glitter:
+            k.has_gold = True
+            home = k.route(lambda c: c == (0, 0))
+            return reward - 1 + GRAB_REWARD - (k.walk(home) + 1) + WIN_REWARD, None, True
+        return reward, (breeze, stench), False
+
+    # Walk to cell, face direction and fire; the first wumpus on the line dies
+    def shoot(self, k, wumpuses, cell, direction):
+        path = k.route(lambda c: c == cell)
+        if path is None:
+            return 0, None, True
+        reward = -k.walk(path) - turn_cost(k.direction, direction) - 1
+        k.direction = direction
+        hit = next(((x, y) for x, y in k.line(cell, direction) if wumpuses[x][y]), None)
+        if hit is not None:
+            wumpuses[hit[0]][hit[1]] = False
+            k.remaining -= 1
+        k.shot(cell, direction, hit is not None)
+        return reward, hit is not None, False
+
+    # Greedy default policy: nearest safe cell until there is none, then home
+    def rollout(self, k, world):
+        total = 0
+        for _ in range(4 * k.size * k.size):
+            action = "explore" if any(k.safe(c) for c in k.frontier) else "home"
+            reward, _, terminal = self.apply(k, world, action)
+            total += reward
+            if terminal:
+                break
+        return total
+
+    def select(self, node):
+        for action in node.actions:
+            if action not in node.stats:
+                return action
+        log_n = math.log(node.visits)
+        return max(node.actions, key=lambda a: node.stats[a][1] / (node.stats[a][0] * WIN_REWARD)
+                   + self.exploration * math.sqrt(log_n / node.stats[a][0]))
+
+    def simulate(self, node, k, world, depth):
+        if depth >= self.depth or (node.visits == 0 and depth > 0):
+            node.visits += 1
+            return self.rollout(k, world)
+        if node.actions is None:
+            node.actions = self.candidates(k, depth == 0)
+        action = self.select(node)
+        reward, observation, terminal = self.apply(k, world, action)
+        if not terminal:
+            key = (action, observation)
+            child = node.children.get(key)
+            if child is None:
+                child = node.children[key] = Node()
+            reward += self.simulate(child, k, world, depth + 1)
+        stats = node.stats.setdefault(action, [0, 0.0])
+        stats[0] += 1
+        stats[1] += reward
+        node.visits += 1
+        return reward
+
+# One worker's share of a decision: root statistics after budget seconds
+def search(knowledge, pit_prob, exploration, depth, seed, budget, simulations):
+    deadline = None if budget is None else time.perf_counter() + budget
+    return Search(knowledge, pit_prob, exploration, depth, seed).run(deadline, simulations)
+
+class MCTSPlanner:
+    def __init__(self, time_budget=0.1, simulations=None, workers=0, exploration=0.5,
+                 depth=1, pit_prob=None, seed=None):
+        self.time_budget = time_budget  # seconds per decision, per worker
+        self.simulations = simulations  # simulations per decision, per worker
+        self.workers = workers  # processes searching in parallel; 0 searches in this one
+        self.exploration = exploration  # UCT constant, on returns scaled by WIN_REWARD
+        # Macros chosen by UCT before the rollout takes over. At a tenth of a
+        # second per decision deeper trees spread the samples too thin to beat
+        # the greedy rollout, so only the root is searched by default.
+        self.depth = depth
+        self.pit_prob = pit_prob  # prior for unseen cells; the map's own if None
+        self.prior = pit_prob
+        self.rng = random.Random(seed)
+        self.pool = None
+        self.inference = None
+        self.knowledge = None
+        self.target = None
+        self.aim = None  # (cell, direction) to fire from once there
+        self.fired = None  # (cell, direction) of the shot whose outcome is not yet known
+        self.last_stats = {}
+
+    # Start over for a new game, recognised by a new inference engine
+    def reset(self, env=None, inference=None):
+        self.inference = inference
+        self.knowledge = Knowledge(env.size) if env is not None else None
+        self.prior = self.pit_prob if self.pit_prob is not None or env is None else env.pit_prob or 0.2
+        self.target = None
+        self.aim = None
+        self.fired = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    # Record the percepts at the agent's cell; True on a first visit
+    def observe(self, agent, env):
+        k = self.knowledge
+        pos = tuple(agent.position)
+        percepts = env.get_percepts()
+        new = pos not in k.visited
+        if self.fired is not None:
+            k.shot(*self.fired, env.remaining_wumpuses < k.remaining)
+            self.fired = None
+        k.observe(pos, 'B' in percepts, 'S' in percepts, 'G' in percepts)
+        k.pos, k.direction, k.has_gold = pos, agent.direction, agent.has_gold
+        k.remaining = env.remaining_wumpuses
+        k.arrows = agent.arrows
+        return new
+
+    # Add what the inference engine has proven about hazards. Proven
+    # wumpuses are taken afresh, as a shot may have killed one.
+    def learn(self, inference):
+        k = self.knowledge
+        k.wumpuses = set()
+        for fact in inference.kb.neg_facts:
+            if fact[0] == 'W':
+                k.no_wumpus.add(fact_cell(fact))
+        for fact in inference.kb.facts:
+            if fact[0] == 'P':
+                k.pits.add(fact_cell(fact))
+            elif fact[0] == 'W':
+                k.wumpuses.add(fact_cell(fact))
+            elif fact.startswith("Safe"):
+                cell = fact_cell(fact)
+                k.no_pit.add(cell)
+                k.no_wumpus.add(cell)
+        for cell, status in inference.resolved.items():
+            if status == "unsafe":
+                k.pits.add(cell)
+            else:
+                k.no_pit.add(cell)
+                k.no_wumpus.add(cell)
+
+    # Root statistics of a search from the current knowledge
+    def search(self):
+        pit_prob = self.prior
+        seeds = [self.rng.randrange(1 << 30) for _ in range(max(1, self.workers))]
+        args = (self.knowledge, pit_prob, self.exploration, self.depth)
+        if self.workers <= 1:
+            return search(*args, seeds[0], self.time_budget, self.simulations)
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+        futures = [self.pool.submit(search, *args, seed, self.time_budget, self.simulations)
+                   for seed in seeds]
+        merged = {}
+        for future in futures:
+            for action, (n, total) in future.result().items():
+                stats = merged.setdefault(action, [0, 0.0])
+                stats[0] += n
+                stats[1] += total
+        return merged
+
+    # The macro with the best mean return among those simulated at least a
+    # tenth as often as the most simulated one, as a cell to walk to
+    def choose(self, inference):
+        k = self.knowledge
+        self.learn(inference)
+        self.last_stats = stats = self.search()
+        if not stats:
+            return (0, 0)
+        most = max(n for n, _ in stats.values())
+        action = max((a for a in stats if stats[a][0] * 10 >= most),
+                     key=lambda a: stats[a][1] / stats[a][0])
+        if action == "home":
+            return (0, 0)
+        if action[0] == "shoot":
+            self.aim = action[1:]
+            return action[1]
+        if action == "explore":
+            path = k.route(lambda c: c not in k.visited and k.safe(c))
+            return path[-1] if path else (0, 0)
+        return action[1]
+
+    # Next primitive action
+    def act(self, agent, inference, env):
+        if inference is not self.inference:
+            self.reset(env, inference)
+        new = self.observe(agent, env)
+        k = self.knowledge
+        pos = k.pos
+        if 'G' in env.get_percepts() and not agent.has_gold:
+            return "grab"
+        if agent.has_gold:
+            self.target = (0, 0)
+            self.aim = None
+        elif self.aim is not None and pos == self.aim[0]:
+            direction = self.aim[1]
+            if agent.direction != direction:
+                return turn_toward(agent.direction, direction)
+            self.fired, self.aim, self.target = self.aim, None, None
+            return "shoot"
+        elif self.target is None or new or pos == self.target:
+            self.aim = None
+            self.target = self.choose(inference)
+        if pos == self.target == (0, 0):
+            return "climb"
+        target = self.target
+        path = k.route(lambda c: c == target)
+        if path is None or len(path) < 2:
+            self.target = (0, 0)
+            return "climb" if pos == (0, 0) else None
+        step = (path[1][0] - pos[0], path[1][1] - pos[1])
+        heading = HEADINGS[step]
+        if heading == agent.direction:
+            return "move_forward"
+        return turn_toward(agent.direction, heading)
+
+planners = {}  # the MCTS planner shared by the batch runner, created on first use
+
+def shared_planner():
+    planner = planners.get("mcts")
+    if planner is None:
+        planner = planners["mcts"] = MCTSPlanner()
+    return planner
+
+# Make the agent do the next action chosen by tree search
+def make_mcts_action(agent, inference, env, actions, action_log, planner=None):
+    if planner is None:
+        planner = shared_planner()
+    action = planner.act(agent, inference, env)
+    if not action:
+        return
+    actions.append(action)
+    action_log.append(action)
+    perform(agent, env, action, inference)
@@ -0,0 +1,147 @@
+import random
+import argparse
+from collections import deque
+from environment import Environment, DIRECTIONS
+from topology import DIRECTION_DELTAS
+from zobrist import keys, TranspositionTable
+import planning
+from runner import POLICIES
+from tournament import play
+from game_state import GRAB_REWARD, WIN_REWARD
+
+# Best possible play on a known map, scored like runner.run_episode:
+# -1 per step, +10 for the grab, +1000 for climbing out with the gold.
+#
+# Every action costs the same, so a breadth-first search over
+# (x, y, direction, has_gold, arrows, alive wumpuses) finds the shortest
+# winning action sequence. Wumpuses stay put, as in the static game; the
+# alive set is a bitmask over env.wumpus_positions. The runner charges per
+# policy call, and make_advanced_action may turn twice in one call, so a
+# half turn ("turn_around") is a single step here too; otherwise the oracle
+# would not bound every policy.
+
+# Results per map, keyed by map_hash()
+oracle_table = TranspositionTable(65536)
+
+def map_hash(env):
+    h = keys.key(("size", env.size))
+    for x, y in env.topology.cells:
+        cell = env.grid[x][y]
+        if cell.has_pit:
+            h ^= keys.key(("pit", x, y))
+        if cell.has_wumpus:
+            h ^= keys.key(("wumpus", x, y))
+        if cell.has_gold:
+            h ^= keys.key(("gold", x, y))
+    return h
+
+# First live wumpus hit by an arrow fired from (x, y) along direction d
+def first_hit(wumpuses, alive, x, y, d):
+    dx, dy = DIRECTION_DELTAS[d]
+    best, best_dist = None, None
+    for k, (wx, wy) in enumerate(wumpuses):
+        if not alive >> k & 1:
+            continue
+        dist = (wx - x) * dx if dx else (wy - y) * dy
+        if dist > 0 and (wy == y if dx else wx == x) and (best is None or dist < best_dist):
+            best, best_dist = k, dist
+    return best
+
+def solve(env, arrows=1):
+    key = map_hash(env) ^ keys.key(("arrows", arrows))
+    cached = oracle_table.get(key)
+    if cached is not None:
+        return cached
+
+    size = env.size
+    grid = env.grid
+    wumpuses = [tuple(p) for p in env.wumpus_positions]
+    where = {cell: k for k, cell in enumerate(wumpuses)}
+    gold = next(((x, y) for x, y in env.topology.cells if grid[x][y].has_gold), None)
+
+    start = (0, 0, 1, False, arrows, (1 << len(wumpuses)) - 1)  # facing E, as Agent starts
+    parent = {start: None}
+    queue = deque([start])
+    goal = None
+    while queue and gold is not None:
+        state = queue.popleft()
+        x, y, d, has_gold, left, alive = state
+        if has_gold and (x, y) == (0, 0):
+            goal = state
+            break
+        moves = [((x, y, (d - 1) % 4, has_gold, left, alive), "turn_left"),
+                 ((x, y, (d + 1) % 4, has_gold, left, alive), "turn_right"),
+                 ((x, y, (d + 2) % 4, has_gold, left, alive), "turn_around")]
+        dx, dy = DIRECTION_DELTAS[DIRECTIONS[d]]
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < size and 0 <= ny < size and not grid[nx][ny].has_pit:
+            k = where.get((nx, ny))
+            if k is None or not alive >> k & 1:
+                moves.append(((nx, ny, d, has_gold, left, alive), "move_forward"))
+        if not has_gold and (x, y) == gold:
+            moves.append(((x, y, d, True, left, alive), "grab"))
+        if left > 0:
+            k = first_hit(wumpuses, alive, x, y, DIRECTIONS[d])
+            moves.append(((x, y, d, has_gold, left - 1, alive if k is None else alive & ~(1 << k)),
+                          "shoot"))
+        for nxt, action in moves:
+            if nxt not in parent:
+                parent[nxt] = (state, action)
+                queue.append(nxt)
+
+    if goal is None:
+        result = {"outcome": "tie", "score": -1, "actions": ["climb"]}
+    else:
+        actions = ["climb"]
+        state = goal
+        while parent[state] is not None:
+            state, action = parent[state]
+            actions.append(action)
+        actions.reverse()
+        result = {"outcome": "win", "score": GRAB_REWARD + WIN_REWARD - len(actions),
+                  "actions": actions}
+    oracle_table.put(key, result)
+    return result
+
+# Oracle score minus policy score on each seeded map
+def regret(policies, episodes=200, seed=0, size=8, num_wumpus=2, pit_prob=0.2, max_steps=1000):
+    names = list(policies)
+    rows = []
+    verbose = planning.verbose
+    planning.verbose = False
+    try:
+        for episode in range(episodes):
+            map_seed = seed + 2 * episode
+            random.seed(map_seed)
+            best = solve(Environment(size=size, num_wumpus=num_wumpus, pit_prob=pit_prob))["score"]
+            row = {"oracle": best}
+            for name in names:
+                score = play(policies[name], map_seed, size, num_wumpus, pit_prob, max_steps, False)
+                row[name] = best - score
+            rows.append(row)
+    finally:
+        planning.verbose = verbose
+    return rows
+
+def print_regret(rows, names):
+    n = max(1, len(rows))
+    print(f"Maps: {len(rows)}  mean oracle score: {sum(r['oracle'] for r in rows) / n:.1f}")
+    for name in names:
+        values = sorted(r[name] for r in rows)
+        median = values[len(values) // 2] if values else 0
+        optimal = sum(1 for v in values if v == 0)
+        print(f"  {name:>12}: mean regret {sum(values) / n:8.1f}, median {median}, optimal on {optimal / n:.0%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regret of policies against the full-information optimum")
+    parser.add_argument("--policies", nargs="+", choices=sorted(POLICIES), default=["basic", "advanced"])
+    parser.add_argument("--episodes", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--wumpus", type=int, default=2)
+    parser.add_argument("--pit", type=float, default=0.2)
+    args = parser.parse_args()
+
+    policies = {name: POLICIES[name] for name in args.policies}
+    rows = regret(policies, args.episodes, args.seed, args.size, args.wumpus, args.pit)
+    print_regret(rows, args.policies)
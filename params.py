@@ -0,0 +1,35 @@
+import json
+import hashlib
+
+# Tunable planner and game constants. The defaults are the values the game
+# was tuned with; sweep.py searches over them.
+DEFAULTS = {
+    "uncertain_penalty": 10,        # Planner.dijkstra cost of stepping on an uncertain tile
+    "advanced_uncertain_cost": 1000,  # make_advanced_action costs per entered cell
+    "advanced_visited_cost": 2,
+    "advanced_unvisited_cost": 1,
+    "wumpus_move_every": 5,         # steps between wumpus moves in dynamic games
+}
+
+class Params:
+    def __init__(self, **values):
+        unknown = set(values) - set(DEFAULTS)
+        if unknown:
+            raise TypeError(f"unknown parameters: {', '.join(sorted(unknown))}")
+        for name, default in DEFAULTS.items():
+            setattr(self, name, values.get(name, default))
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in DEFAULTS}
+
+    # Copy with some values changed
+    def replace(self, **changes):
+        return Params(**{**self.as_dict(), **changes})
+
+    # Stable identifier of the values, for caches that outlive the process
+    def key(self):
+        text = json.dumps(self.as_dict(), sort_keys=True)
+        return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+    def __repr__(self):
+        return f"Params({', '.join(f'{k}={v}' for k, v in self.as_dict().items())})"
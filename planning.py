@@ -1,38 +1,146 @@
+import time
 import heapq
+import numpy as np
 from typing import List, Tuple, Optional
+from zobrist import keys, TranspositionTable
+from line_index import LineIndex
+from topology import topology, DIRECTION_DELTAS
+from params import Params
+from inference import SAFE, UNCERTAIN, UNSAFE, STATUS_NAMES, cell_name
+from distance_field import DistanceField
+from region_graph import RegionGraph, Route
+from cell_buckets import CellBuckets
+
+verbose = True  # print search details to the terminal; batch runs turn this off
+time_budget = None  # seconds per decision for the shared planner; None means unbounded
+params = Params()  # cost constants for the shared planner and make_advanced_action
+INFO_CANDIDATES = 8  # nearest safe frontier tiles scored in "information" exploration
+HIERARCHY_SIZE = 32  # boards at least this wide find paths over a RegionGraph
 
 class Planner:
     #Initialization
-    def __init__(self, env_size: int):
+    def __init__(self, env_size: int, time_budget: Optional[float] = None,
+                 node_budget: Optional[int] = None, exploration: str = "distance",
+                 params: Optional[Params] = None):
         self.env_size = env_size
+        self.params = params or Params()
+        self.exploration = exploration  # "distance": nearest safe tile; "information": most resolved per step
+        self.topology = topology(env_size)
         self.visited = set()
         self.returning = False
         self.directions = ["N", "E", "S", "W"]
         self.dir_map = {(0, 1): "N", (1, 0): "E", (0, -1): "S", (-1, 0): "W"}
-        self.direction_deltas = {"N": (0, 1), "E": (1, 0), "S": (0, -1), "W": (-1, 0)}
+        self.direction_deltas = DIRECTION_DELTAS
+        self.visited_hash = 0
+        self.visited_lines = LineIndex()  # visited tiles by row and column, for shot positions
+        self.frontier = set()  # unvisited tiles next to a visited one
+        self.safe_frontier = CellBuckets()  # frontier tiles the inference grid calls safe
+        self.uncertain_frontier = CellBuckets()  # and those it calls uncertain
+        self.unsorted = set()  # frontier tiles not yet put in either by sort_frontier
+        self.status_source = None  # inference engine the buckets were sorted against
+        self.status_version = -1  # its status_changes() version at the time
+        self.known = np.zeros((env_size, env_size), dtype=bool)  # visited or frontier, as a grid
+        self.home = DistanceField(env_size)  # steps home over known safe tiles
+        self.regions = RegionGraph(env_size) if env_size >= HIERARCHY_SIZE else None
+        self.marked = None
+        self.route = None  # Route being walked on large boards
+        self.table = TranspositionTable(4096)  # state hash -> (action, marked tile), kept across resets
+        self.time_budget = time_budget  # seconds per decision
+        self.node_budget = node_budget  # dijkstra expansions per decision
+        self.deadline = None
+        self.nodes = 0
+        self.complete = True
+        self.last_decision_complete = True  # False when the budget cut the last search short
+        self.grid = None  # inference status grid for the decision in progress
+
+    # Copy with its own visited set for lookahead; the decision table is
+    # keyed by full state hashes, so it is shared
+    def fork(self):
+        planner = Planner.__new__(Planner)
+        planner.__dict__ = self.__dict__.copy()
+        planner.visited = self.visited.copy()
+        planner.visited_lines = self.visited_lines.copy()
+        planner.frontier = self.frontier.copy()
+        planner.safe_frontier = self.safe_frontier.copy()
+        planner.uncertain_frontier = self.uncertain_frontier.copy()
+        planner.unsorted = self.unsorted.copy()
+        planner.status_source = None  # the fork is used with a fork of the engine
+        planner.known = self.known.copy()
+        planner.home = self.home.copy()
+        planner.regions = self.regions.copy() if self.regions is not None else None
+        planner.route = None
+        planner.grid = None
+        return planner
 
     # Reset the planner
     def reset(self):
         self.visited.clear()
+        self.visited_hash = 0
+        self.visited_lines = LineIndex()
+        self.frontier = set()
+        self.safe_frontier = CellBuckets()
+        self.uncertain_frontier = CellBuckets()
+        self.unsorted = set()
+        self.status_source = None
+        self.known[:] = False
+        self.home = DistanceField(self.env_size)
+        self.regions = RegionGraph(self.env_size) if self.regions is not None else None
+        self.route = None
         self.returning = False
 
+    # Add a tile to the visited set, keeping its hash up to date
+    def mark_visited(self, pos):
+        if pos not in self.visited:
+            self.visited.add(pos)
+            self.visited_hash ^= keys.key(("visited", pos))
+            self.visited_lines.add(*pos)
+            self.frontier.discard(pos)
+            self.safe_frontier.discard(pos)
+            self.uncertain_frontier.discard(pos)
+            self.unsorted.discard(pos)
+            fresh = [n for n in self.get_neighbors(pos) if n not in self.visited and n not in self.frontier]
+            self.frontier.update(fresh)
+            self.unsorted.update(fresh)
+            self.known[pos] = True
+            for n in self.get_neighbors(pos):
+                self.known[n] = True
+
+    # Tiles the agent has seen or stands next to; searches never leave them
+    def is_known(self, pos):
+        return pos in self.visited or pos in self.frontier
+
+    # Hash of everything plan() looks at once the grab/climb checks are done
+    def state_key(self, agent, inference, percepts):
+        return (inference.state_hash() ^ self.visited_hash
+                ^ keys.key(("pose", tuple(agent.position), agent.direction))
+                ^ keys.key(("flags", agent.has_gold, agent.arrows, self.returning, 'G' in percepts)))
+
+    # Start the budget for one decision
+    def start_budget(self):
+        self.deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+        self.nodes = 0
+        self.complete = True
+
+    # Count one search expansion; True once the decision has used up its budget
+    def out_of_budget(self) -> bool:
+        self.nodes += 1
+        if self.node_budget is not None and self.nodes > self.node_budget:
+            return True
+        return self.deadline is not None and time.perf_counter() > self.deadline
+
     # Get positions of neighbors
     def get_neighbors(self, pos):
-        x, y = pos
-        neighbors = []
-        for dx, dy in self.dir_map:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < self.env_size and 0 <= ny < self.env_size:
-                neighbors.append((nx, ny))
-        return neighbors
+        return self.topology.neighbors[pos[0]][pos[1]]
     
 
     # Check is a position is safe to move to    
     def is_safe(self, pos, inference, env):
         if not (0 <= pos[0] < env.size and 0 <= pos[1] < env.size):
             return False
-        print(f"Checking safety of position {pos} with inference {inference.infer(pos)}")
-        if inference.infer(pos) == 'safe':
+        status = self.status_at(pos, inference)
+        if verbose:
+            print(f"Checking safety of position {pos} with inference {STATUS_NAMES[status]}")
+        if status == SAFE:
             return True
         return False
         if inference.infer(pos) == 'unsafe':
@@ -43,7 +151,13 @@ class Planner:
 
     # Check is a position is uncertain
     def is_uncertain(self, pos, inference):
-        return inference.infer(pos) == 'uncertain'
+        return self.status_at(pos, inference) == UNCERTAIN
+
+    # Inference status code of a tile; the grid is fetched once per decision
+    def status_at(self, pos, inference):
+        if self.grid is None:
+            return inference.status_grid(self.env_size)[pos]
+        return self.grid[pos]
 
     # Dijkstra for pathfinding
     def dijkstra(self, start, goal, inference, env) -> Optional[List[Tuple[int, int]]]:
@@ -54,11 +168,23 @@ class Planner:
 
         while pq:
             cost, current = heapq.heappop(pq)
-            print(f"Visiting {current} with cost {cost}")
+            if verbose:
+                print(f"Visiting {current} with cost {cost}")
             if current in visited:
                 continue
             visited.add(current)
 
+            # Out of budget: head for the expanded tile closest to the goal
+            if current != goal and self.out_of_budget():
+                self.complete = False
+                current = min(visited, key=lambda p: (abs(p[0] - goal[0]) + abs(p[1] - goal[1]), dist[p]))
+                path = []
+                while current in prev:
+                    path.append(current)
+                    current = prev[current]
+                path.append(start)
+                return path[::-1]
+
             if current == goal:
                 path = []
                 while current in prev:
@@ -68,48 +194,151 @@ class Planner:
                 return path[::-1]
 
             for neighbor in self.get_neighbors(current):
-                print(f"Checking neighbor {neighbor}")
-                if neighbor in visited:
-                    print(f"Neighbor {neighbor} already visited")
-                if not self.is_safe(neighbor, inference, env):
-                    print(f"Neighbor {neighbor} is not safe")
+                if verbose:
+                    print(f"Checking neighbor {neighbor}")
+                    if neighbor in visited:
+                        print(f"Neighbor {neighbor} already visited")
+                    if not self.is_safe(neighbor, inference, env):
+                        print(f"Neighbor {neighbor} is not safe")
                     
-                if neighbor in visited or not self.is_safe(neighbor, inference, env):
+                if neighbor in visited or not self.is_known(neighbor) or not self.is_safe(neighbor, inference, env):
                     continue
                 
                 extra = 1
-                if inference.infer(neighbor) == 'uncertain':
-                    extra = 10
+                if self.is_uncertain(neighbor, inference):
+                    extra = self.params.uncertain_penalty
 
                 new_cost = cost + extra
-                print(f"New cost to {neighbor}: {new_cost} (previous: {dist.get(neighbor, float('inf'))})")
+                if verbose:
+                    print(f"New cost to {neighbor}: {new_cost} (previous: {dist.get(neighbor, float('inf'))})")
                 if neighbor not in dist or new_cost < dist[neighbor]:
-                    print(f"Updating neighbor {neighbor} with new cost {new_cost}")
+                    if verbose:
+                        print(f"Updating neighbor {neighbor} with new cost {new_cost}")
                     dist[neighbor] = new_cost
                     prev[neighbor] = current
                     heapq.heappush(pq, (new_cost, neighbor))
         return None
     
+    # Tiles paths may use: known and safe
+    def passable(self, inference):
+        grid = self.grid if self.grid is not None else inference.status_grid(self.env_size)
+        return self.known & (grid == SAFE)
+
+    # Path from start to goal over known safe tiles. On large boards, far
+    # goals are reached by walking a Route over the region graph, refined a
+    # leg at a time; everything else runs dijkstra.
+    def find_path(self, start, goal, inference, env) -> Optional[List[Tuple[int, int]]]:
+        route = self.route
+        far = abs(start[0] - goal[0]) + abs(start[1] - goal[1]) >= HIERARCHY_SIZE // 2
+        if self.regions is None or not (far or (route is not None and route.goal == goal)):
+            return self.dijkstra(start, goal, inference, env)
+        self.regions.update(self.passable(inference))
+        if route is not None and route.goal == goal:
+            path = route.ahead(start)
+            if path is not None:
+                return path
+        waypoints = self.regions.route(start, goal)
+        self.route = Route(self.regions, waypoints) if waypoints is not None else None
+        return self.route.ahead(start) if self.route is not None else None
+
+    # Shortest path home over known safe tiles, read from the distance field,
+    # which is brought up to date with the tiles that changed since last time
+    def home_path(self, pos, agent, inference) -> Optional[List[Tuple[int, int]]]:
+        self.home.update(np.where(self.passable(inference), 1.0, np.inf))
+        dx, dy = self.direction_deltas[agent.direction]
+        return self.home.path(pos, prefer=(pos[0] + dx, pos[1] + dy))
+
+    # Bring the safe and uncertain frontier buckets up to date with the
+    # inference grid. Only tiles new to the frontier and tiles whose status
+    # changed since the last call are looked at, unless the engine cannot
+    # tell which changed; then the whole frontier is sorted again.
+    def sort_frontier(self, inference):
+        grid = self.grid if self.grid is not None else inference.status_grid(self.env_size)
+        since = self.status_version if inference is self.status_source else -1
+        changed, self.status_version = inference.status_changes(since)
+        self.status_source = inference
+        if changed is None:
+            self.safe_frontier = CellBuckets()
+            self.uncertain_frontier = CellBuckets()
+            tiles = self.frontier
+        else:
+            tiles = self.unsorted.union(p for p in changed if p in self.frontier)
+        for p in tiles:
+            status = grid[p]
+            if status == SAFE:
+                self.safe_frontier.add(p)
+            else:
+                self.safe_frontier.discard(p)
+            if status == UNCERTAIN:
+                self.uncertain_frontier.add(p)
+            else:
+                self.uncertain_frontier.discard(p)
+        self.unsorted.clear()
+
     # Returns the position of the closest safe and unvisited tile
     def get_target(self, pos, inference, env) -> Optional[Tuple[int, int]]:
-        # print("Get target")
-        target = []
-        for x in range(self.env_size):
-            for y in range(self.env_size):
-                p = (x, y)
-                if p not in self.visited and self.is_safe(p, inference, env) and any(n in self.visited for n in self.get_neighbors(p)):
-                    dist = abs(pos[0] - x) + abs(pos[1] - y)
-                    target.append((dist, p))
-        if target:
-            target.sort()
-            # print(f"Target found: {target[0][1]}")
-            return target[0][1]
-        return None
+        self.sort_frontier(inference)
+        if self.exploration == "information":
+            target = self.safe_frontier.nearest(pos, INFO_CANDIDATES)
+            return self.most_informative(target, inference, env) if target else None
+        target = self.safe_frontier.nearest(pos)
+        return target[0][1] if target else None
+
+    # Chance that the percept caused by `kind` ("P" or "W") is felt on tile p:
+    # known hazards count fully, each open disjunction spreads one hazard evenly
+    def percept_chance(self, p, kind, inference, grid) -> float:
+        clear = 1.0
+        for n in self.get_neighbors(p):
+            if grid[n] == UNSAFE:
+                return 1.0
+            if grid[n] != UNCERTAIN:
+                continue
+            fact = kind + cell_name(*n)
+            share = max((1.0 / len(opts) for opts in inference.uncertains if fact in opts), default=0.0)
+            clear *= 1.0 - share
+        return 1.0 - clear
+
+    # Expected number of uncertain tiles a visit to p would settle, found by
+    # asserting each possible breeze/stench reading and rolling it back
+    def information_gain(self, p, inference, env) -> float:
+        before = inference.status_grid(self.env_size)
+        open_before = before == UNCERTAIN
+        breeze = self.percept_chance(p, "P", inference, before)
+        stench = self.percept_chance(p, "W", inference, before)
+        gain = 0.0
+        for percepts, chance in (((), (1 - breeze) * (1 - stench)), (("B",), breeze * (1 - stench)),
+                                 (("S",), (1 - breeze) * stench), (("B", "S"), breeze * stench)):
+            if chance == 0:
+                continue
+            inference.push()
+            try:
+                inference.process_percepts(p[0], p[1], set(percepts), env)
+                after = inference.status_grid(self.env_size)
+                gain += chance * int((open_before & (after != UNCERTAIN)).sum())
+            finally:
+                inference.pop()
+        return gain
+
+    # The candidate (dist, tile) with the most expected information per step of
+    # travel, counting the visited tile itself; nearest first among equals
+    def most_informative(self, candidates, inference, env) -> Tuple[int, int]:
+        best = None
+        for dist, p in candidates:
+            if self.out_of_budget():
+                self.complete = False
+                break
+            score = (1 + self.information_gain(p, inference, env)) / max(1, dist)
+            if best is None or score > best[0]:
+                best = (score, p)
+        return best[1] if best else candidates[0][1]
     
     # Returns the position of the closest safe and visited tile
     def get_backtrack_target(self, pos, inference, env) -> Optional[Tuple[int, int]]:
         target = []
         for p in self.visited:
+            if self.out_of_budget():
+                self.complete = False
+                break
             if not self.is_safe(p, inference, env):
                 continue
             for neighbor in self.get_neighbors(p):
@@ -124,19 +353,9 @@ class Planner:
     
     # Returns the position of the closest uncertain and unvisited tile
     def get_uncertain_target(self, pos, inference) -> Optional[Tuple[int, int]]:
-        # print("Get uncertain target")
-        target = []
-        for x in range(self.env_size):
-            for y in range(self.env_size):
-                p = (x, y)
-                if p not in self.visited and self.is_uncertain(p, inference) and any(n in self.visited for n in self.get_neighbors(p)):
-                    dist = abs(pos[0] - x) + abs(pos[1] - y)
-                    target.append((dist, p))
-        if target:
-            target.sort()
-            # print(f"Uncertain target found: {target[0][1]}")
-            return target[0][1]
-        return None
+        self.sort_frontier(inference)
+        target = self.uncertain_frontier.nearest(pos)
+        return target[0][1] if target else None
     
     # Turn towards a direction
     def turn_toward(self, current_dir, target_dir):
@@ -150,65 +369,61 @@ class Planner:
             return "turn_right"
         return None
 
-    # Find wumpus
+    # Value of firing from pos towards a direction: (expected kills, suspects cleared).
+    # The arrow stops at the first known wumpus; suspected cells before it are
+    # either hit or proven empty.
+    def shot_value(self, pos, direction, known, suspected):
+        dx, dy = self.direction_deltas[direction]
+        hit = known.ahead(pos[0], pos[1], dx, dy)
+        reach = min(hit) if hit else self.env_size
+        cleared = sum(1 for d in suspected.ahead(pos[0], pos[1], dx, dy) if d < reach)
+        return (1 if hit else 0, cleared)
+
+    # Best direction to shoot from pos and its value
+    def best_shot(self, pos, known, suspected, desperate=False):
+        best = None
+        for direction in self.directions:
+            value = self.shot_value(pos, direction, known, suspected)
+            if value[0] == 0 and not (desperate and value[1] > 0):
+                continue
+            if best is None or value > best[0]:
+                best = (value, direction)
+        return best
+
+    # Find the visited tile to shoot from: most expected kills, then most cleared
+    # suspects, then closest. Only tiles sharing a row or column with a target count.
     def find_wumpus_tile(self, pos, inference, desperate=False) -> Optional[Tuple[int, int]]:
-        x0, y0 = pos
-        target = []
+        known, suspected = inference.wumpus_lines()
+        targets = [known, suspected] if desperate else [known]
+        candidates = set()
+        for index in targets:
+            for y in index.rows:
+                candidates.update((x, y) for x in self.visited_lines.rows.get(y, ()))
+            for x in index.cols:
+                candidates.update((x, y) for y in self.visited_lines.cols.get(x, ()))
 
-        # Get all known or suspected Wumpus positions
-        for x in range(self.env_size):
-            for y in range(self.env_size):
-                is_known_wumpus = f"W{x}{y}" in inference.kb.facts
-                is_uncertain = inference.infer((x, y)) == 'uncertain'
-                if is_known_wumpus or (desperate and is_uncertain):
-                    wx, wy = x, y
-
-                    # Vertical
-                    if x == x0:
-                        dy = 1 if wy > y0 else -1
-                        clear_path = True
-                        for ty in range(y0 + dy, wy, dy):
-                            if not (0 <= ty < self.env_size):
-                                clear_path = False
-                                break
-                        if clear_path:
-                            stench_tile = (x0, wy - dy)
-                            dist = abs(wy - y0)
-                            target.append((dist, stench_tile))
-
-                    # Horizontally
-                    elif y == y0:
-                        dx = 1 if wx > x0 else -1
-                        clear_path = True
-                        for tx in range(x0 + dx, wx, dx):
-                            if not (0 <= tx < self.env_size):
-                                clear_path = False
-                                break
-                        if clear_path:
-                            stench_tile = (wx - dx, y0)
-                            dist = abs(wx - x0)
-                            target.append((dist, stench_tile))
-                            
+        target = []
+        for tile in candidates:
+            shot = self.best_shot(tile, known, suspected, desperate)
+            if shot:
+                dist = abs(pos[0] - tile[0]) + abs(pos[1] - tile[1])
+                target.append((-shot[0][0], -shot[0][1], dist, tile))
         if target:
             target.sort()
-            return target[0][1]
+            return target[0][3]
         return None
     
-    # Get the Wumpus direction from stench cell
-    def get_wumpus_direction_from_tile(self, pos, inference) -> Optional[str]:
-        x0, y0 = pos
-        for dir in self.directions:
-            dx, dy = self.direction_deltas[dir]
-            x, y = x0 + dx, y0 + dy
-            if 0 <= x < self.env_size and 0 <= y < self.env_size:
-                if f"W{x}{y}" in inference.kb.facts:
-                    return dir
-        return None
+    # Get the direction to shoot in from a tile
+    def get_wumpus_direction_from_tile(self, pos, inference, desperate=False) -> Optional[str]:
+        known, suspected = inference.wumpus_lines()
+        shot = self.best_shot(pos, known, suspected, desperate)
+        return shot[1] if shot else None
     
     # The plan of the agent
     def plan(self, agent, inference, env) -> Optional[str]:
+        self.last_decision_complete = True
         pos = tuple(agent.position)
-        self.visited.add(pos)
+        self.mark_visited(pos)
 
         percepts = env.get_percepts()
         if 'G' in percepts and not agent.has_gold:
@@ -217,8 +432,9 @@ class Planner:
         # Prioritize returning when has gold
         if agent.has_gold:
             x, y = agent.position
-            env.grid[x][y].has_gold = False
-            env.grid[x][y].glitter = False
+            cell = env.cell(x, y)
+            cell.has_gold = False
+            cell.glitter = False
             self.returning = True
 
         # Climb if has gold and at (0, 0)
@@ -226,12 +442,60 @@ class Planner:
             agent.has_gold = True
             return "climb"
 
+        # Reuse the decision made the last time this exact situation came up
+        key = self.state_key(agent, inference, percepts)
+        cached = self.table.get(key)
+        if cached is not None:
+            action, marked = cached
+            if marked is not None:
+                self.mark_visited(marked)
+            return action
+
+        self.marked = None
+        self.start_budget()
+        self.grid = inference.status_grid(self.env_size)
+        try:
+            action = self.search(pos, agent, inference, env)
+            if not self.complete:
+                # A cut-short search is not worth replaying; fall back if it found nothing
+                self.last_decision_complete = False
+                return action or self.fallback(pos, agent, inference, env)
+        finally:
+            self.grid = None
+        self.table.put(key, (action, self.marked))
+        return action
+
+    # Cheap move when the budget ran out: step to a safe unvisited neighbour,
+    # otherwise to the safe neighbour closest to home
+    def fallback(self, pos, agent, inference, env) -> Optional[str]:
+        if pos == (0, 0) and self.returning:
+            return "climb"
+        safe = [n for n in self.get_neighbors(pos) if self.is_safe(n, inference, env)]
+        if not safe:
+            return "climb" if pos == (0, 0) else None
+        fresh = [n for n in safe if n not in self.visited]
+        if fresh and not self.returning:
+            next_pos = fresh[0]
+        else:
+            next_pos = min(safe, key=lambda n: n[0] + n[1])
+        desired_dir = self.dir_map[(next_pos[0] - pos[0], next_pos[1] - pos[1])]
+        if agent.direction != desired_dir:
+            return self.turn_toward(agent.direction, desired_dir)
+        return "move_forward"
+
+    # Choose the next action from the current knowledge
+    def search(self, pos, agent, inference, env) -> Optional[str]:
         # Find a safe new location to move to next
         target = (0, 0) if self.returning else self.get_target(pos, inference, env)
         if target:
-            print(f"Target found: {target}")
-            path = self.dijkstra(pos, target, inference, env)
-            print(f"Path to target: {path}")
+            if verbose:
+                print(f"Target found: {target}")
+            if self.returning:
+                path = self.home_path(pos, agent, inference)
+            else:
+                path = self.find_path(pos, target, inference, env)
+            if verbose:
+                print(f"Path to target: {path}")
             if path and len(path) >= 2:
                 next_pos = path[1]
                 dx = next_pos[0] - pos[0]
@@ -246,11 +510,14 @@ class Planner:
         # Find a uncertain new location to move to next
         uncertain_target = self.get_uncertain_target(pos, inference)
         if uncertain_target:
-            print(f"Uncertain target found: {uncertain_target}")
-            path = self.dijkstra(pos, uncertain_target, inference, env)
-            print(f"Path to uncertain target: {path}")
+            if verbose:
+                print(f"Uncertain target found: {uncertain_target}")
+            path = self.find_path(pos, uncertain_target, inference, env)
+            if verbose:
+                print(f"Path to uncertain target: {path}")
             if path and len(path) >= 2:
-                self.visited.add(uncertain_target)
+                self.mark_visited(uncertain_target)
+                self.marked = uncertain_target
                 next_pos = path[1]
                 dx = next_pos[0] - pos[0]
                 dy = next_pos[1] - pos[1]
@@ -264,7 +531,7 @@ class Planner:
         # Find a safe old location to move to next
         backtrack_target = self.get_backtrack_target(pos, inference, env)
         if backtrack_target:
-            path = self.dijkstra(pos, backtrack_target, inference, env)
+            path = self.find_path(pos, backtrack_target, inference, env)
             if path and len(path) >= 2:
                 next_pos = path[1]
                 dx = next_pos[0] - pos[0]
@@ -291,7 +558,7 @@ class Planner:
             
             # Otherwise, move toward it
             if stench_tile:
-                path = self.dijkstra(pos, stench_tile, inference, env)
+                path = self.find_path(pos, stench_tile, inference, env)
                 if path and len(path) >= 2:
                     next_pos = path[1]
                     dx = next_pos[0] - pos[0]
@@ -305,7 +572,7 @@ class Planner:
                             
         # Agent stuck and returning to (0, 0) without gold
         if pos != (0, 0):
-            path = self.dijkstra(pos, (0, 0), inference, env)
+            path = self.home_path(pos, agent, inference)
             if path and len(path) >= 2:
                 next_pos = path[1]
                 dx = next_pos[0] - pos[0]
@@ -319,13 +586,23 @@ class Planner:
         else:
             return "climb"
 
-planner = None
+planners = {}  # exploration mode -> planner shared by the UI and the batch runner
+
+def shared_planner(size, exploration="distance"):
+    planner = planners.get(exploration)
+    if planner is None or planner.env_size != size:
+        planner = planners[exploration] = Planner(size, exploration=exploration, params=params)
+    if planner.params is not params:
+        planner.params = params
+        planner.table.clear()  # cached decisions were made with other costs
+    planner.time_budget = time_budget
+    return planner
 
-# Make the agent do the next action
-def make_next_action(agent, inference, env, actions, action_log):
-    global planner
+# Make the agent do the next action. Callers running several games at once
+# pass their own planner; otherwise the module-wide one is used.
+def make_next_action(agent, inference, env, actions, action_log, planner=None):
     if planner is None:
-        planner = Planner(env.size)
+        planner = shared_planner(env.size)
 
     action = planner.plan(agent, inference, env)
     if not action:
@@ -333,7 +610,11 @@ def make_next_action(agent, inference, env, actions, action_log):
     
     actions.append(action)
     action_log.append(action)
+    perform(agent, env, action, inference)
 
+# Carry out one planner action; the inference engine, if given, learns
+# where a shot went and whether it killed
+def perform(agent, env, action, inference=None):
     if action == "move_forward":
         agent.move_forward(env)
     elif action == "turn_right":
@@ -345,10 +626,18 @@ def make_next_action(agent, inference, env, actions, action_log):
     elif action == "climb":
         agent.climb(env)
     elif action == "shoot":
-        agent.shoot_arrow(env)
+        x, y = agent.position
+        dx, dy = DIRECTION_DELTAS[agent.direction]
+        fired = agent.arrows > 0
+        hit = agent.shoot_arrow(env)
+        if fired and inference is not None:
+            inference.record_shot(x, y, dx, dy, hit, env.remaining_wumpuses)
+
+# Exploration ordered by expected information gain per step
+def make_informed_action(agent, inference, env, actions, action_log):
+    make_next_action(agent, inference, env, actions, action_log, shared_planner(env.size, "information"))
 
 # Reset the planner after the game ends
 def reset_planner():
-    global planner
-    if planner is not None:
+    for planner in planners.values():
         planner.reset()
\ No newline at end of file
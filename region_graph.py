@@ -0,0 +1,238 @@
+import heapq
+from collections import deque
+import numpy as np
+from topology import topology
+
+# Hierarchical path planning over passable cells, after HPA*. The board is
+# cut into square regions. Two neighbouring regions are linked by one
+# entrance per run of passable cells facing each other across their border,
+# and each region caches the walking distances between its own entrances.
+# A long query searches the small graph of entrances instead of the cells,
+# so its cost grows with the number of regions crossed rather than with the
+# explored area. A Route refines its path into cells one leg at a time, as
+# the walker gets there.
+#
+# update() takes the current passable grid and rebuilds only the borders and
+# regions around the cells that changed. Paths are near-shortest: they pass
+# through one chosen cell of each entrance.
+
+GOAL = (-1, -1)  # search node standing for the goal cell
+
+class RegionGraph:
+    def __init__(self, size, region=8):
+        self.size = size
+        self.region = region  # width of a region, in cells
+        self.topology = topology(size)
+        self.passable = np.zeros((size, size), dtype=bool)
+        self.entrances = {}  # (region, region) -> [(cell, cell)] pairs facing each other
+        self.nodes = {}  # region -> set of entrance cells in it
+        self.inner = {}  # region -> {entrance: {entrance: distance}}: its own, and across borders
+
+    def copy(self):
+        graph = RegionGraph.__new__(RegionGraph)
+        graph.__dict__ = self.__dict__.copy()
+        graph.passable = self.passable.copy()
+        graph.entrances = dict(self.entrances)
+        graph.nodes = dict(self.nodes)
+        graph.inner = dict(self.inner)
+        return graph
+
+    def region_of(self, cell):
+        return (cell[0] // self.region, cell[1] // self.region)
+
+    def borders(self, r):
+        count = -(-self.size // self.region)
+        for other in ((r[0] - 1, r[1]), (r[0] + 1, r[1]), (r[0], r[1] - 1), (r[0], r[1] + 1)):
+            if 0 <= other[0] < count and 0 <= other[1] < count:
+                yield (min(r, other), max(r, other))
+
+    # Take the current passable grid and rebuild what changed
+    def update(self, passable):
+        changed = np.argwhere(passable != self.passable)
+        if not len(changed):
+            return
+        self.passable = passable.copy()
+        dirty = {self.region_of(cell) for cell in changed.tolist()}
+        rebuild = set(dirty)
+        for border in {b for r in dirty for b in self.borders(r)}:
+            entrances = self.find_entrances(border)
+            if entrances != self.entrances.get(border, []):
+                self.entrances[border] = entrances
+                rebuild.update(border)
+        for r in rebuild:
+            self.build_region(r)
+
+    # One facing pair per run of passable pairs along a border, at its middle
+    def find_entrances(self, border):
+        (ax, ay), (bx, by) = border
+        size, width, passable = self.size, self.region, self.passable
+        if bx == ax + 1:
+            x = bx * width
+            pairs = [((x - 1, y), (x, y)) for y in range(ay * width, min((ay + 1) * width, size))]
+        else:
+            y = by * width
+            pairs = [((x, y - 1), (x, y)) for x in range(ax * width, min((ax + 1) * width, size))]
+        entrances, run = [], []
+        for a, b in pairs:
+            if passable[a] and passable[b]:
+                run.append((a, b))
+            elif run:
+                entrances.append(run[len(run) // 2])
+                run = []
+        if run:
+            entrances.append(run[len(run) // 2])
+        return entrances
+
+    def build_region(self, r):
+        nodes = set()
+        for border in self.borders(r):
+            for a, b in self.entrances.get(border, ()):
+                nodes.add(a if self.region_of(a) == r else b)
+        inner = {}
+        for node in nodes:
+            dist, _ = self.local(node)
+            inner[node] = {other: dist[other] for other in nodes if other != node and other in dist}
+        for border in self.borders(r):
+            for a, b in self.entrances.get(border, ()):
+                if a in inner:
+                    inner[a][b] = 1
+                else:
+                    inner[b][a] = 1
+        self.nodes[r] = nodes
+        self.inner[r] = inner
+
+    # Breadth-first search from start over passable cells of its own region;
+    # start itself need not be passable. Returns (dist, prev).
+    def local(self, start):
+        r = self.region_of(start)
+        width, passable, neighbors = self.region, self.passable, self.topology.neighbors
+        dist, prev = {start: 0}, {}
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            for n in neighbors[cell[0]][cell[1]]:
+                if n not in dist and passable[n] and n[0] // width == r[0] and n[1] // width == r[1]:
+                    dist[n] = dist[cell] + 1
+                    prev[n] = cell
+                    queue.append(n)
+        return dist, prev
+
+    # Cells of the shortest walk from a to b inside a's region, or to b
+    # next door across a border; None if b cannot be reached that way
+    def refine(self, a, b):
+        if b in self.topology.neighbors[a[0]][a[1]]:
+            return [a, b] if self.passable[b] else None
+        _, prev = self.local(a)
+        if b not in prev:
+            return None
+        cells = [b]
+        while cells[-1] != a:
+            cells.append(prev[cells[-1]])
+        return cells[::-1]
+
+    # Waypoints from start to goal (start, entrances..., goal), or None when
+    # the goal cannot be reached; goal must be passable, start need not be
+    def route(self, start, goal):
+        if start == goal:
+            return [start]
+        if not self.passable[goal]:
+            return None
+        start_dist, _ = self.local(start)
+        goal_dist, _ = self.local(goal)
+        exits = {n: goal_dist[n] for n in self.nodes.get(self.region_of(goal), ()) if n in goal_dist}
+
+        def h(cell):
+            return abs(cell[0] - goal[0]) + abs(cell[1] - goal[1])
+
+        best = {}
+        came = {}
+        heap = []
+        # Leave through the entrances of the start's region, or, when start
+        # is not passable and so no entrance of its own, straight across.
+        # A walk inside one region to the goal bounds the search; it only
+        # goes on while leaving the region could still be shorter.
+        origins = [(start, start_dist, 0)]
+        if not self.passable[start]:
+            for n in self.topology.neighbors[start[0]][start[1]]:
+                if self.passable[n] and self.region_of(n) != self.region_of(start):
+                    came.setdefault(n, start)
+                    origins.append((n, self.local(n)[0], 1))
+        for origin, dist, offset in origins:
+            if goal in dist and dist[goal] + offset < best.get(GOAL, float("inf")):
+                best[GOAL] = dist[goal] + offset
+                came[GOAL] = origin
+            for node in self.nodes.get(self.region_of(origin), ()):
+                if node in dist and dist[node] + offset < best.get(node, float("inf")):
+                    best[node] = dist[node] + offset
+                    if node != origin:
+                        came[node] = origin
+                    heapq.heappush(heap, (best[node] + h(node), -best[node], node))
+        if GOAL in best:
+            heapq.heappush(heap, (best[GOAL], -best[GOAL], GOAL))
+        while heap:
+            _, g, node = heapq.heappop(heap)
+            g = -g  # deeper nodes first among equals
+            if node == GOAL:
+                break
+            if g > best[node]:
+                continue
+            if node in exits and g + exits[node] < best.get(GOAL, float("inf")):
+                best[GOAL] = g + exits[node]
+                came[GOAL] = node
+                heapq.heappush(heap, (best[GOAL], -best[GOAL], GOAL))
+            for other, d in self.inner[self.region_of(node)][node].items():
+                if g + d < best.get(other, float("inf")):
+                    best[other] = g + d
+                    came[other] = node
+                    heapq.heappush(heap, (g + d + h(other), -g - d, other))
+        if GOAL not in came:
+            return None
+        waypoints = [goal]
+        node = came[GOAL]
+        while node != start:
+            waypoints.append(node)
+            node = came[node]
+        waypoints.append(start)
+        return waypoints[::-1]
+
+    # Cells from start to goal, or None
+    def path(self, start, goal):
+        waypoints = self.route(start, goal)
+        if waypoints is None:
+            return None
+        cells = [start]
+        for a, b in zip(waypoints, waypoints[1:]):
+            if a != b:
+                cells.extend(self.refine(a, b)[1:])
+        return cells
+
+# A route being walked. Its waypoints are refined into cells one leg at a
+# time as the walker gets to them, and it is followed to the end rather
+# than searched again every step, since a fresh near-shortest route from
+# the next cell may lead back the other way.
+class Route:
+    def __init__(self, graph, waypoints):
+        self.graph = graph
+        self.goal = waypoints[-1]
+        self.waypoints = deque(waypoints[1:])
+        self.cells = deque(waypoints[:1])  # refined cells, from the walker's position on
+
+    # Cells from pos along the route, with at least the next step refined;
+    # None once pos is off the route or the way ahead is blocked
+    def ahead(self, pos):
+        cells = self.cells
+        if pos not in cells:
+            return None
+        while cells[0] != pos:
+            cells.popleft()
+        while len(cells) < 2 and self.waypoints:
+            b = self.waypoints.popleft()
+            if b != cells[-1]:
+                leg = self.graph.refine(cells[-1], b)
+                if leg is None:
+                    return None
+                cells.extend(leg[1:])
+        passable = self.graph.passable
+        if any(not passable[c] for c in list(cells)[1:]):
+            return None
+        return list(cells)
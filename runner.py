@@ -0,0 +1,95 @@
+import time
+import random
+import argparse
+from environment import Environment
+import planning
+from planning import make_next_action, make_informed_action, reset_planner
+from advanced_planning import make_advanced_action, make_random_action
+from mcts import make_mcts_action
+from game_state import GameState
+from telemetry import TelemetryRecorder, action_code, percept_bits, neighbor_summary, DIRECTIONS
+
+# Headless version of the game loop in main.py, for batch runs
+
+def random_policy(agent, inference, env, actions, action_log):
+    make_random_action(agent, env, actions, action_log)
+
+POLICIES = {
+    "basic": make_next_action,
+    "informed": make_informed_action,
+    "advanced": make_advanced_action,
+    "random": random_policy,
+    "mcts": make_mcts_action,
+}
+
+# Play one episode through a GameState and return its outcome, score and
+# action list
+def run_episode(env, policy=make_next_action, max_steps=1000, dynamic=False,
+                recorder=None, episode=0):
+    state = GameState(env, dynamic)
+    agent, inference = state.agent, state.inference
+    reset_planner()
+
+    while state.outcome is None and state.steps < max_steps:
+        x, y = agent.position
+        direction = agent.direction  # the state the action is taken in
+        t0 = time.perf_counter()
+        percepts = state.sense()
+        t1 = time.perf_counter()
+        actions = state.act(policy)
+        t2 = time.perf_counter()
+
+        if recorder is not None:
+            recorder.record(episode=episode, step=state.steps, x=x, y=y,
+                            direction=DIRECTIONS.index(direction),
+                            action=action_code(actions[0] if actions else None),
+                            percepts=percept_bits(percepts),
+                            neighbors=neighbor_summary(x, y, inference, env.size),
+                            frontier=len(inference.uncertains),
+                            infer_time=t1 - t0, plan_time=t2 - t1)
+        state.settle(actions)
+
+    return {"outcome": state.outcome or "timeout", "score": state.score, "steps": state.steps,
+            "actions": state.action_log, "memory": inference.footprint()["bytes"]}
+
+# Run many random episodes; planner output is silenced while they run
+def run_batch(episodes, size=8, num_wumpus=2, pit_prob=0.2, policy="basic", seed=0,
+              max_steps=1000, dynamic=False, recorder=None):
+    verbose = planning.verbose
+    planning.verbose = False
+    results = []
+    try:
+        for episode in range(episodes):
+            random.seed(seed + episode)
+            env = Environment(size=size, num_wumpus=num_wumpus, pit_prob=pit_prob)
+            result = run_episode(env, POLICIES[policy], max_steps, dynamic, recorder, episode)
+            del result["actions"]
+            results.append(result)
+    finally:
+        planning.verbose = verbose
+        if recorder is not None:
+            recorder.close()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run Wumpus World episodes without the UI")
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--wumpus", type=int, default=2)
+    parser.add_argument("--pit", type=float, default=0.2)
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="basic")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-steps", type=int, default=1000)
+    parser.add_argument("--dynamic", action="store_true", help="move wumpuses every params.wumpus_move_every steps")
+    parser.add_argument("--telemetry", help="directory for per-step .npz chunks")
+    args = parser.parse_args()
+
+    recorder = TelemetryRecorder(args.telemetry) if args.telemetry else None
+    results = run_batch(args.episodes, args.size, args.wumpus, args.pit, args.policy,
+                        args.seed, args.max_steps, args.dynamic, recorder)
+    outcomes = {}
+    for r in results:
+        outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+    print(f"Episodes: {len(results)}  outcomes: {outcomes}")
+    print(f"Mean score: {sum(r['score'] for r in results) / max(1, len(results)):.1f}")
+    print(f"Largest end-of-episode knowledge size: {max((r['memory'] for r in results), default=0) / 1024:.1f} KiB")
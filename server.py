@@ -0,0 +1,296 @@
+import json
+import random
+import socket
+import asyncio
+import argparse
+from environment import Environment
+from agent import Agent
+from inference import InferenceEngine
+from wumpus_belief import WumpusBelief
+from topology import DIRECTION_DELTAS
+import planning
+from planning import Planner, make_next_action
+from game_state import settle_step
+
+# Headless game server: many independent games driven over a local socket.
+#
+# One request per line, one reply per line, replies in request order, so
+# clients may pipeline. Words are separated by spaces:
+#
+#   NEW [size] [wumpus] [pit] [seed] [dynamic]   -> OK <id> <percepts>
+#   LOAD <json rows, top row first>               -> OK <id> <percepts>
+#   STEP <id> <action>                            -> OK <percepts> <score> <status>
+#   PERCEPTS <id>                                 -> OK <percepts>
+#   SNAP <id>                                     -> OK <json>
+#   CLOSE <id>                                    -> OK
+#
+# Actions are forward, left, right, grab, shoot, climb, or auto to let the
+# built-in planner pick one. Percepts are letters from "BGS", "-" for none.
+# Status is playing, win, tie, lose or timeout. Failures reply ERR <reason>.
+
+ACTIONS = {
+    "forward": "move_forward",
+    "left": "turn_left",
+    "right": "turn_right",
+    "grab": "grab",
+    "shoot": "shoot",
+    "climb": "climb",
+}
+
+MAX_LINE = 1 << 20       # longest request accepted, LOAD maps included
+HIGH_WATER = 1 << 16     # pending reply bytes before a client stops being read
+
+def percept_text(percepts):
+    return "".join(sorted(percepts)) or "-"
+
+class Session:
+    def __init__(self, env, dynamic=False, max_steps=1000, step_budget=None):
+        env.grid[0][0].has_pit = False
+        env.grid[0][0].has_wumpus = False
+        self.env = env
+        self.agent = Agent()
+        self.dynamic = dynamic
+        self.max_steps = max_steps
+        self.step_budget = step_budget  # planner seconds per auto step
+        self.score = 0
+        self.steps = 0
+        self.status = "playing"
+        self.action_log = []
+        # Built lazily: games driven only by external agents never pay for inference
+        self.inference = None
+        self.planner = None
+        # (method, args) calls not yet made on the inference engine, in order
+        self.unseen = [(InferenceEngine.set_wumpus_count, (env.remaining_wumpuses,))]
+        self.observe()
+
+    # Percepts at the agent's cell, queued for the inference engine
+    def observe(self):
+        self.env.agent_pos = self.agent.position
+        self.percepts = self.env.get_percepts()
+        x, y = self.agent.position
+        self.unseen.append((InferenceEngine.process_percepts, (x, y, self.percepts, self.env)))
+
+    # Let the built-in planner choose the next action
+    def auto(self):
+        if self.inference is None:
+            self.inference = InferenceEngine(WumpusBelief(self.env.size, self.env.remaining_wumpuses))
+            self.planner = Planner(self.env.size, self.step_budget)
+        for method, args in self.unseen:
+            method(self.inference, *args)
+        self.unseen = []
+        actions = []
+        make_next_action(self.agent, self.inference, self.env, actions, self.action_log, self.planner)
+        return actions[0] if actions else None
+
+    def step(self, action):
+        if self.status != "playing":
+            raise ValueError(f"game over: {self.status}")
+        agent, env = self.agent, self.env
+        if action != "auto" and action not in ACTIONS:
+            raise ValueError("unknown action")
+        had_gold = agent.has_gold
+        self.steps += 1
+
+        if action == "auto":
+            action = self.auto()
+        else:
+            action = ACTIONS[action]
+            self.action_log.append(action)
+            if action == "move_forward":
+                agent.move_forward(env)
+            elif action == "turn_left":
+                agent.turn_left()
+            elif action == "turn_right":
+                agent.turn_right()
+            elif action == "grab":
+                agent.grab(env)
+            elif action == "shoot" and agent.arrows > 0:
+                x, y = agent.position
+                dx, dy = DIRECTION_DELTAS[agent.direction]
+                hit = agent.shoot_arrow(env)
+                self.unseen.append((InferenceEngine.record_shot, (x, y, dx, dy, hit, env.remaining_wumpuses)))
+
+        gained, outcome = settle_step(env, agent, had_gold, action == "climb", self.steps,
+                                      self.dynamic, self.wumpuses_moved)
+        self.score += gained
+        if outcome is not None:
+            self.status = outcome
+        elif self.steps >= self.max_steps:
+            self.status = "timeout"
+        self.observe()
+
+    def wumpuses_moved(self):
+        self.unseen.append((InferenceEngine.track_wumpus_move, (self.env.remaining_wumpuses,)))
+
+    def snapshot(self):
+        env, agent = self.env, self.agent
+        return {
+            "size": env.size,
+            "grid": [[("P" if cell.has_pit else "") +
+                      ("W" if cell.has_wumpus else "") +
+                      ("G" if cell.has_gold else "")
+                      for cell in row] for row in env.grid[::-1]],
+            "agent": {"position": list(agent.position), "direction": agent.direction,
+                      "has_gold": agent.has_gold, "arrows": agent.arrows},
+            "percepts": percept_text(self.percepts),
+            "score": self.score,
+            "steps": self.steps,
+            "status": self.status,
+            "actions": self.action_log,
+            "complete": self.planner.last_decision_complete if self.planner else True,
+        }
+
+class GameServer:
+    def __init__(self, max_sessions=100000, max_steps=1000, step_budget=None):
+        self.sessions = {}
+        self.next_id = 1
+        self.max_sessions = max_sessions
+        self.max_steps = max_steps
+        self.step_budget = step_budget
+
+    def add(self, env, dynamic=False):
+        if len(self.sessions) >= self.max_sessions:
+            raise ValueError("too many sessions")
+        sid = self.next_id
+        self.next_id += 1
+        self.sessions[sid] = Session(env, dynamic, self.max_steps, self.step_budget)
+        return sid
+
+    def session(self, word):
+        try:
+            return self.sessions[int(word)]
+        except (ValueError, KeyError):
+            raise ValueError("no such session")
+
+    # Answer one request line; games are isolated, so no locking is needed
+    def handle(self, line):
+        words = line.split(None, 1) if line.startswith("LOAD") else line.split()
+        if not words:
+            raise ValueError("empty request")
+        verb = words[0].upper()
+        if verb == "STEP" and len(words) == 3:
+            session = self.session(words[1])
+            session.step(words[2].lower())
+            return f"OK {percept_text(session.percepts)} {session.score} {session.status}"
+        if verb == "NEW":
+            size = int(words[1]) if len(words) > 1 else 8
+            num_wumpus = int(words[2]) if len(words) > 2 else 2
+            pit_prob = float(words[3]) if len(words) > 3 else 0.2
+            if not (1 <= size <= 512) or num_wumpus >= size * size or not (0 <= pit_prob < 1):
+                raise ValueError("invalid map settings")
+            # A seeded game draws from its own generator, so no other game can shift it
+            rng = random.Random(int(words[4])) if len(words) > 4 else random.Random()
+            env = Environment(size=size, num_wumpus=num_wumpus, pit_prob=pit_prob, rng=rng)
+            sid = self.add(env, len(words) > 5 and words[5] == "dynamic")
+            return f"OK {sid} {percept_text(self.sessions[sid].percepts)}"
+        if verb == "LOAD" and len(words) == 2:
+            grid = json.loads(words[1])
+            env = Environment.read_map_from_file(grid, len(grid))
+            env.rng = random.Random()
+            sid = self.add(env)
+            return f"OK {sid} {percept_text(self.sessions[sid].percepts)}"
+        if verb == "PERCEPTS" and len(words) == 2:
+            return f"OK {percept_text(self.session(words[1]).percepts)}"
+        if verb == "SNAP" and len(words) == 2:
+            return "OK " + json.dumps(self.session(words[1]).snapshot(), separators=(",", ":"))
+        if verb == "CLOSE" and len(words) == 2:
+            self.session(words[1])
+            del self.sessions[int(words[1])]
+            return "OK"
+        raise ValueError("bad request")
+
+    async def serve_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    writer.write(b"ERR request too long\n")
+                    break
+                if not line:
+                    break
+                try:
+                    reply = self.handle(line.decode().strip())
+                except Exception as e:
+                    reply = f"ERR {e}"
+                writer.write(reply.encode() + b"\n")
+                # Backpressure: stop reading from a client that is not reading its replies
+                if writer.transport.get_write_buffer_size() > HIGH_WATER:
+                    await writer.drain()
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=7878, path=None):
+        if path:
+            server = await asyncio.start_unix_server(self.serve_client, path, limit=MAX_LINE)
+        else:
+            server = await asyncio.start_server(self.serve_client, host, port, limit=MAX_LINE)
+        async with server:
+            await server.serve_forever()
+
+# Blocking client for scripts and test harnesses. send() queues a request
+# and replies() reads them back, so many requests can share one round trip.
+class Client:
+    def __init__(self, host="127.0.0.1", port=7878, path=None):
+        if path:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(path)
+        else:
+            self.sock = socket.create_connection((host, port))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile("rwb")
+        self.pending = 0
+
+    def send(self, *words):
+        self.file.write(" ".join(str(w) for w in words).encode() + b"\n")
+        self.pending += 1
+
+    def replies(self):
+        self.file.flush()
+        out = []
+        for _ in range(self.pending):
+            line = self.file.readline().decode().rstrip("\n")
+            if not line.startswith("OK"):
+                raise RuntimeError(line)
+            out.append(line[3:])
+        self.pending = 0
+        return out
+
+    def request(self, *words):
+        self.send(*words)
+        return self.replies()[0]
+
+    def new(self, size=8, num_wumpus=2, pit_prob=0.2, seed=0):
+        return int(self.request("NEW", size, num_wumpus, pit_prob, seed).split()[0])
+
+    def step(self, sid, action):
+        percepts, score, status = self.request("STEP", sid, action).split()
+        return percepts, int(score), status
+
+    def snapshot(self, sid):
+        return json.loads(self.request("SNAP", sid))
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Wumpus World games over a local socket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7878)
+    parser.add_argument("--unix", help="listen on a Unix socket at this path instead")
+    parser.add_argument("--max-sessions", type=int, default=100000)
+    parser.add_argument("--max-steps", type=int, default=1000)
+    parser.add_argument("--step-budget", type=float, default=0.01,
+                        help="planner seconds per auto step, so one game cannot stall the others")
+    args = parser.parse_args()
+
+    planning.verbose = False
+    server = GameServer(args.max_sessions, args.max_steps, args.step_budget)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
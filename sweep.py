@@ -0,0 +1,137 @@
+import os
+import json
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from environment import Environment
+from params import Params, DEFAULTS
+from oracle import map_hash
+import planning
+from runner import POLICIES
+from tournament import play
+
+# Search over planner parameters on a fixed corpus of seeded maps.
+#
+# Each (parameter set, map) result is appended to a JSON-lines cache as soon
+# as it arrives, keyed by Params.key() and the map hash, so an interrupted
+# sweep picks up where it stopped. Work is spread over a process pool in
+# chunks of maps per parameter set.
+
+# Parameter sets from lists of values per name, every combination
+def grid_points(values):
+    names = sorted(values)
+    return [Params(**dict(zip(names, combo)))
+            for combo in itertools.product(*(values[name] for name in names))]
+
+# n parameter sets drawn uniformly from integer (low, high) ranges per name
+def random_points(ranges, n, seed=0):
+    rng = random.Random(seed)
+    return [Params(**{name: rng.randint(low, high) for name, (low, high) in sorted(ranges.items())})
+            for _ in range(n)]
+
+# Seeds and map hashes of the corpus, the same seeding as the tournament
+def corpus(maps, seed=0, size=8, num_wumpus=2, pit_prob=0.2):
+    out = []
+    for episode in range(maps):
+        map_seed = seed + 2 * episode
+        random.seed(map_seed)
+        env = Environment(size=size, num_wumpus=num_wumpus, pit_prob=pit_prob)
+        out.append((map_seed, format(map_hash(env), "016x")))
+    return out
+
+# Worker: play one parameter set on some maps
+def evaluate(values, policy, seeds, size, num_wumpus, pit_prob, max_steps, dynamic):
+    planning.verbose = False
+    planning.params = Params(**values)
+    return [(map_seed, play(POLICIES[policy], map_seed, size, num_wumpus, pit_prob, max_steps, dynamic))
+            for map_seed in seeds]
+
+def load_cache(path):
+    cache = {}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by an interrupted run
+                cache[(entry["run"], entry["params"], entry["map"])] = entry["score"]
+    return cache
+
+def run_sweep(points, policy="basic", maps=200, seed=0, size=8, num_wumpus=2, pit_prob=0.2,
+              max_steps=1000, dynamic=False, workers=None, cache_path="sweep-cache.jsonl", chunk=25):
+    maps = corpus(maps, seed, size, num_wumpus, pit_prob)
+    run = f"{policy}/{size}/{num_wumpus}/{pit_prob}/{max_steps}/{int(dynamic)}"
+    cache = load_cache(cache_path)
+    out = open(cache_path, "a") if cache_path else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for params in points:
+                key = params.key()
+                todo = [(s, h) for s, h in maps if (run, key, h) not in cache]
+                for i in range(0, len(todo), chunk):
+                    part = todo[i:i + chunk]
+                    future = pool.submit(evaluate, params.as_dict(), policy, [s for s, _ in part],
+                                         size, num_wumpus, pit_prob, max_steps, dynamic)
+                    futures[future] = (key, dict(part))
+            for future in as_completed(futures):
+                key, hashes = futures[future]
+                for map_seed, score in future.result():
+                    cache[(run, key, hashes[map_seed])] = score
+                    if out:
+                        out.write(json.dumps({"run": run, "params": key, "map": hashes[map_seed],
+                                              "score": score}) + "\n")
+                if out:
+                    out.flush()
+    finally:
+        if out:
+            out.close()
+
+    results = []
+    for params in points:
+        key = params.key()
+        scores = [cache[(run, key, h)] for _, h in maps]
+        results.append((sum(scores) / len(scores), params))
+    results.sort(key=lambda r: -r[0])
+    return results
+
+# "name=1,2,3" or "name=low:high"
+def parse_spec(text):
+    name, _, values = text.partition("=")
+    if name not in DEFAULTS:
+        raise argparse.ArgumentTypeError(f"unknown parameter {name}")
+    if ":" in values:
+        low, high = values.split(":")
+        return name, (int(low), int(high))
+    return name, [int(v) for v in values.split(",")]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep planner parameters over seeded maps")
+    parser.add_argument("specs", nargs="+", type=parse_spec,
+                        help="name=v1,v2,... for a grid, or name=low:high with --random")
+    parser.add_argument("--random", type=int, help="sample this many points instead of the full grid")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="basic")
+    parser.add_argument("--maps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--wumpus", type=int, default=2)
+    parser.add_argument("--pit", type=float, default=0.2)
+    parser.add_argument("--dynamic", action="store_true")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--cache", default="sweep-cache.jsonl")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    specs = dict(args.specs)
+    if args.random:
+        points = random_points({n: v if isinstance(v, tuple) else (min(v), max(v)) for n, v in specs.items()},
+                               args.random, args.seed)
+    else:
+        points = grid_points({n: list(range(v[0], v[1] + 1)) if isinstance(v, tuple) else v
+                              for n, v in specs.items()})
+    results = run_sweep(points, args.policy, args.maps, args.seed, args.size, args.wumpus, args.pit,
+                        dynamic=args.dynamic, workers=args.workers, cache_path=args.cache)
+    for mean, params in results[:args.top]:
+        print(f"{mean:9.1f}  {params}")
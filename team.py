@@ -0,0 +1,201 @@
+import random
+import argparse
+import threading
+from environment import Environment
+from agent import Agent
+from inference import InferenceEngine, SAFE
+from wumpus_belief import WumpusBelief
+from zobrist import keys
+import planning
+from planning import Planner, perform
+from game_state import GRAB_REWARD, WIN_REWARD, DEATH_PENALTY
+
+# Several agents exploring one board together. Every agent's percepts go to
+# one shared inference engine, so each planner reads the same safety map,
+# which the engine caches by knowledge state and so computes once for the
+# whole team. Each round a coordinator hands every exploring agent its own
+# safe frontier tile, so two agents do not walk to the same place, and every
+# tile any agent visits counts as visited for all of them.
+#
+# Agents move in rounds: within a round each agent takes one action, so the
+# team's length in rounds is the time it would take agents moving at once.
+
+# One inference engine behind a lock, fed by every agent. Hold the lock
+# while reading the engine, as planning does.
+class SharedKnowledge:
+    def __init__(self, env):
+        self.size = env.size
+        self.inference = InferenceEngine(WumpusBelief(env.size, env.remaining_wumpuses))
+        self.lock = threading.RLock()
+
+    def observe(self, x, y, percepts, env):
+        with self.lock:
+            self.inference.process_percepts(x, y, percepts, env)
+
+    def status_grid(self):
+        with self.lock:
+            return self.inference.status_grid(self.size)
+
+    def track_wumpus_move(self, remaining):
+        with self.lock:
+            self.inference.track_wumpus_move(remaining)
+
+# A planner that explores towards the tile the coordinator gave it
+class TeamPlanner(Planner):
+    def __init__(self, env_size, **kwargs):
+        super().__init__(env_size, **kwargs)
+        self.target = None  # frontier tile assigned for this round
+
+    # Decisions depend on the assigned tile as well
+    def state_key(self, agent, inference, percepts):
+        return super().state_key(agent, inference, percepts) ^ keys.key(("target", self.target))
+
+    def get_target(self, pos, inference, env):
+        if self.target is not None and self.target in self.frontier:
+            return self.target
+        return super().get_target(pos, inference, env)
+
+class Member:
+    def __init__(self, planner):
+        self.agent = Agent()
+        self.planner = planner
+        self.action_log = []
+        self.state = "exploring"  # then "climbed" or "dead"
+
+class Coordinator:
+    def __init__(self, env, agents=2, params=None):
+        self.knowledge = SharedKnowledge(env)
+        self.members = [Member(TeamPlanner(env.size, params=params or planning.params))
+                        for _ in range(agents)]
+
+    def active(self):
+        return [m for m in self.members if m.state == "exploring"]
+
+    # A tile visited by one agent is visited for every planner
+    def visit(self, pos):
+        for member in self.members:
+            member.planner.mark_visited(pos)
+
+    # Give every exploring agent its own safe frontier tile, the closest
+    # agent and tile pairs first. Agents left over, when there are fewer
+    # tiles than agents, go for their nearest tile even if it is taken.
+    def assign(self, members):
+        grid = self.knowledge.status_grid()
+        pairs = []
+        nearest = {}
+        for i, member in enumerate(members):
+            x, y = member.agent.position
+            for p in member.planner.frontier:
+                if grid[p] == SAFE:
+                    d = abs(x - p[0]) + abs(y - p[1])
+                    pairs.append((d, i, p))
+                    if i not in nearest or (d, p) < nearest[i]:
+                        nearest[i] = (d, p)
+        pairs.sort()
+        targets, taken = {}, set()
+        for d, i, p in pairs:
+            if i not in targets and p not in taken:
+                targets[i] = p
+                taken.add(p)
+        for i, member in enumerate(members):
+            member.planner.target = targets.get(i, nearest.get(i, (0, None))[1])
+
+    # Play one round: everyone reports what they sense, targets are handed
+    # out, then each agent acts. Returns (outcome or None, score change).
+    def round(self, env):
+        knowledge = self.knowledge
+        members = self.active()
+        for member in members:
+            env.agent_pos = member.agent.position
+            x, y = member.agent.position
+            knowledge.observe(x, y, env.get_percepts(), env)
+            self.visit((x, y))
+        carrier = next((m for m in members if m.agent.has_gold), None)
+        if carrier is not None:
+            members = [carrier]  # the others have nothing left to find
+        self.assign(members)
+
+        score = 0
+        for member in members:
+            agent = member.agent
+            score -= 1
+            with knowledge.lock:
+                env.agent_pos = agent.position
+                had_gold = agent.has_gold
+                action = member.planner.plan(agent, knowledge.inference, env)
+                if action:
+                    member.action_log.append(action)
+                    perform(agent, env, action, knowledge.inference)
+            if agent.has_gold and not had_gold:
+                score += GRAB_REWARD
+            x, y = agent.position
+            if action == "climb" and (x, y) == (0, 0):
+                member.state = "climbed"
+                if agent.has_gold:
+                    return "win", score + WIN_REWARD
+            elif env.grid[x][y].has_pit or env.grid[x][y].has_wumpus:
+                member.state = "dead"
+                score -= DEATH_PENALTY
+                if agent.has_gold:
+                    return "lose", score
+        if not self.active():
+            climbed = any(m.state == "climbed" for m in self.members)
+            return ("tie" if climbed else "lose"), score
+        return None, score
+
+    # Every exploring agent standing where a wumpus moved dies
+    def wumpuses_moved(self, env):
+        self.knowledge.track_wumpus_move(env.remaining_wumpuses)
+        score = 0
+        for member in self.active():
+            x, y = member.agent.position
+            if env.grid[x][y].has_wumpus:
+                member.state = "dead"
+                score -= DEATH_PENALTY
+        return score
+
+# Play one episode with a team of agents; steps counts rounds
+def run_team(env, agents=2, max_steps=1000, dynamic=False):
+    env.grid[0][0].has_pit = False
+    env.grid[0][0].has_wumpus = False
+    coordinator = Coordinator(env, agents)
+    score = 0
+    outcome = None
+    step = 0
+    while outcome is None and step < max_steps:
+        step += 1
+        outcome, gained = coordinator.round(env)
+        score += gained
+        if outcome is None and dynamic and step % planning.params.wumpus_move_every == 0:
+            score += coordinator.wumpuses_moved(env)
+            if not coordinator.active():
+                outcome = "lose"
+    return {"outcome": outcome or "timeout", "score": score, "steps": step,
+            "actions": sum(len(m.action_log) for m in coordinator.members)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Explore maps with a team of agents sharing one knowledge base")
+    parser.add_argument("--agents", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--episodes", type=int, default=50)
+    parser.add_argument("--size", type=int, default=16)
+    parser.add_argument("--wumpus", type=int, default=2)
+    parser.add_argument("--pit", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-steps", type=int, default=1000)
+    parser.add_argument("--dynamic", action="store_true", help="move wumpuses every params.wumpus_move_every rounds")
+    args = parser.parse_args()
+
+    planning.verbose = False
+    for agents in args.agents:
+        results = []
+        for episode in range(args.episodes):
+            random.seed(args.seed + episode)
+            env = Environment(size=args.size, num_wumpus=args.wumpus, pit_prob=args.pit)
+            results.append(run_team(env, agents, args.max_steps, args.dynamic))
+        outcomes = {}
+        for r in results:
+            outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+        n = max(1, len(results))
+        print(f"Agents: {agents}  outcomes: {outcomes}  mean score: {sum(r['score'] for r in results) / n:.1f}"
+              f"  mean rounds: {sum(r['steps'] for r in results) / n:.1f}"
+              f"  mean actions: {sum(r['actions'] for r in results) / n:.1f}")
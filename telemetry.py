@@ -0,0 +1,120 @@
+import os
+import glob
+import numpy as np
+
+# Action names from every policy, mapped to small integer codes
+ACTIONS = ["none", "move_forward", "turn_left", "turn_right", "grab", "climb", "shoot", "no_op"]
+ACTION_ALIASES = {"forward": "move_forward"}
+ACTION_CODES = {name: code for code, name in enumerate(ACTIONS)}
+
+DIRECTIONS = ["N", "E", "S", "W"]
+PERCEPT_BITS = {"B": 1, "S": 2, "G": 4}
+STATUS_CODES = {"safe": 0, "uncertain": 1, "unsafe": 2}
+OFF_BOARD = 3
+
+# One column per recorded field
+COLUMNS = {
+    "run": np.int32,          # recorder run within the directory, from 0
+    "episode": np.int32,
+    "step": np.int32,
+    "x": np.int16,
+    "y": np.int16,
+    "direction": np.int8,
+    "action": np.int8,
+    "percepts": np.uint8,     # PERCEPT_BITS
+    "neighbors": np.uint8,    # 2-bit STATUS_CODES of the N, E, S, W neighbours
+    "frontier": np.int32,     # open disjunctions in the knowledge base
+    "infer_time": np.float32,
+    "plan_time": np.float32,
+}
+
+def action_code(action):
+    name = action.lower() if action else "none"
+    return ACTION_CODES.get(ACTION_ALIASES.get(name, name), 0)
+
+def percept_bits(percepts):
+    bits = 0
+    for p in percepts:
+        bits |= PERCEPT_BITS.get(p, 0)
+    return bits
+
+# Pack the inferred status of the four neighbours of (x, y) into one byte
+def neighbor_summary(x, y, inference, size):
+    packed = 0
+    for shift, (dx, dy) in enumerate([(0, 1), (1, 0), (0, -1), (-1, 0)]):
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < size and 0 <= ny < size:
+            code = STATUS_CODES[inference.infer((nx, ny))]
+        else:
+            code = OFF_BOARD
+        packed |= code << (2 * shift)
+    return packed
+
+# Per-step records kept in a fixed-size columnar ring buffer.
+# With a directory, every full buffer is written out as one compressed .npz
+# chunk and reused; without one, the oldest records are overwritten. A
+# recorder writing to a directory that already holds chunks starts a new
+# run: its chunks are named and its records tagged with the next run id,
+# so episode ids of different runs stay apart.
+class TelemetryRecorder:
+    def __init__(self, directory=None, capacity=65536):
+        self.directory = directory
+        self.capacity = capacity
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.size = 0           # records currently held
+        self.head = 0           # next slot to write
+        self.total = 0          # records seen overall
+        self.chunks = 0
+        self.run = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.run = len({chunk_run(p) for p in chunk_paths(directory)})
+
+    def record(self, **fields):
+        i = self.head
+        fields["run"] = self.run
+        for name, column in self.columns.items():
+            column[i] = fields.get(name, 0)
+        self.head = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.total += 1
+        if self.directory and self.size == self.capacity:
+            self.flush()
+
+    # Records in the buffer, oldest first
+    def snapshot(self):
+        if self.size < self.capacity:
+            return {name: column[:self.size].copy() for name, column in self.columns.items()}
+        return {name: np.roll(column, -self.head) for name, column in self.columns.items()}
+
+    def flush(self):
+        if not self.directory or self.size == 0:
+            return None
+        path = os.path.join(self.directory, f"chunk-{self.run:04d}-{self.chunks:06d}.npz")
+        np.savez_compressed(path, **self.snapshot())
+        self.chunks += 1
+        self.size = 0
+        self.head = 0
+        return path
+
+    def close(self):
+        return self.flush()
+
+def chunk_paths(directory):
+    return sorted(glob.glob(os.path.join(directory, "chunk-*.npz")))
+
+# Run id in a chunk file name, e.g. "chunk-0002-000013.npz" -> 2
+def chunk_run(path):
+    return int(os.path.basename(path).split("-")[1])
+
+# Concatenate the chunks written to a directory, in run order; with run,
+# only that run's
+def load(directory, run=None):
+    paths = [p for p in chunk_paths(directory) if run is None or chunk_run(p) == run]
+    parts = {name: [] for name in COLUMNS}
+    for path in paths:
+        with np.load(path) as chunk:
+            for name in COLUMNS:
+                parts[name].append(chunk[name])
+    return {name: np.concatenate(arrays) if arrays else np.zeros(0, dtype=COLUMNS[name])
+            for name, arrays in parts.items()}
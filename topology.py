@@ -0,0 +1,61 @@
+import numpy as np
+
+# Neighbour order used everywhere; Environment.move_wumpuses draws from it,
+# so changing it changes seeded games
+DELTAS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+DIRECTION_DELTAS = {"N": (0, 1), "E": (1, 0), "S": (0, -1), "W": (-1, 0)}
+
+# Source and destination slices for shifting a grid by (dx, dy)
+def shift_slices(dx, dy, size):
+    src = (slice(max(0, -dx), size - max(0, dx)), slice(max(0, -dy), size - max(0, dy)))
+    dst = (slice(max(0, dx), size - max(0, -dx)), slice(max(0, dy), size - max(0, -dy)))
+    return src, dst
+
+# Everything about a size x size board that does not change during a game.
+# Cells are (x, y) tuples; flat indices are x * size + y, matching a
+# C-ordered numpy grid indexed [x, y].
+class Topology:
+    def __init__(self, size):
+        self.size = size
+        self.count = size * size
+        self.cells = tuple((x, y) for x in range(size) for y in range(size))
+        # neighbors[x][y]: in-bounds neighbours of (x, y), in DELTAS order
+        self.neighbors = tuple(
+            tuple(tuple((x + dx, y + dy) for dx, dy in DELTAS
+                        if 0 <= x + dx < size and 0 <= y + dy < size)
+                  for y in range(size))
+            for x in range(size))
+        # neighbor_index[i, :degree[i]]: flat indices of the neighbours of flat cell i
+        self.degree = np.array([len(self.neighbors[x][y]) for x, y in self.cells], dtype=np.intp)
+        self.neighbor_index = np.full((self.count, len(DELTAS)), -1, dtype=np.intp)
+        for i, (x, y) in enumerate(self.cells):
+            self.neighbor_index[i, :self.degree[i]] = [nx * size + ny for nx, ny in self.neighbors[x][y]]
+        # (src, dst) slice pairs that shift a grid one step along each of DELTAS
+        self.shifts = tuple(shift_slices(dx, dy, size) for dx, dy in DELTAS)
+
+    def index(self, x, y):
+        return x * self.size + y
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.size and 0 <= y < self.size
+
+    # Flat indices of the neighbours of (x, y), as a view
+    def neighbor_indices(self, x, y):
+        i = x * self.size + y
+        return self.neighbor_index[i, :self.degree[i]]
+
+    # Cells next to at least one cell set in a boolean grid
+    def spread(self, mask):
+        out = np.zeros_like(mask)
+        for src, dst in self.shifts:
+            out[dst] |= mask[src]
+        return out
+
+_topologies = {}
+
+# The shared Topology for a board size, built on first use
+def topology(size):
+    topo = _topologies.get(size)
+    if topo is None:
+        topo = _topologies[size] = Topology(size)
+    return topo
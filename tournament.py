@@ -0,0 +1,127 @@
+import math
+import random
+import argparse
+from itertools import combinations
+from environment import Environment
+import planning
+from runner import run_episode, POLICIES
+
+# Head-to-head comparison of policies on identical seeded maps.
+#
+# Every policy plays the same map with the same random stream (common random
+# numbers), so the per-map score differences are paired and far less noisy
+# than independent runs. After every `check_every` maps each pair gets a
+# paired z-test at level alpha / looks (Bonferroni over the planned looks),
+# and the tournament stops as soon as the leader beats every other policy
+# significantly, or every pair is decided.
+
+# Two-sided p-value of a paired mean difference
+def paired_p_value(diffs):
+    n = len(diffs)
+    if n < 2:
+        return 1.0
+    mean = sum(diffs) / n
+    var = sum((d - mean) ** 2 for d in diffs) / (n - 1)
+    if var == 0:
+        return 0.0 if mean != 0 else 1.0
+    z = mean / math.sqrt(var / n)
+    return math.erfc(abs(z) / math.sqrt(2))
+
+class PairStats:
+    def __init__(self, a, b):
+        self.a = a
+        self.b = b
+        self.diffs = []     # score of a minus score of b, per map
+        self.wins = 0.0     # maps where a beat b, ties count half
+
+    def add(self, score_a, score_b):
+        self.diffs.append(score_a - score_b)
+        if score_a > score_b:
+            self.wins += 1
+        elif score_a == score_b:
+            self.wins += 0.5
+
+    def mean(self):
+        return sum(self.diffs) / len(self.diffs) if self.diffs else 0.0
+
+    def win_rate(self):
+        return self.wins / len(self.diffs) if self.diffs else 0.0
+
+    def p_value(self):
+        return paired_p_value(self.diffs)
+
+def play(policy, seed, size, num_wumpus, pit_prob, max_steps, dynamic):
+    random.seed(seed)
+    env = Environment(size=size, num_wumpus=num_wumpus, pit_prob=pit_prob)
+    random.seed(seed + 1)  # same in-episode random stream for every policy
+    return run_episode(env, policy, max_steps, dynamic)["score"]
+
+def run_tournament(policies, max_episodes=1000, check_every=20, min_episodes=40, alpha=0.05,
+                   seed=0, size=8, num_wumpus=2, pit_prob=0.2, max_steps=1000, dynamic=False):
+    names = list(policies)
+    pairs = {(a, b): PairStats(a, b) for a, b in combinations(names, 2)}
+    totals = {name: 0 for name in names}
+    looks = max(1, max_episodes // check_every)
+    level = alpha / looks
+    episodes = 0
+    stopped_early = False
+
+    verbose = planning.verbose
+    planning.verbose = False
+    try:
+        while episodes < max_episodes:
+            map_seed = seed + 2 * episodes
+            scores = {name: play(policies[name], map_seed, size, num_wumpus, pit_prob,
+                                 max_steps, dynamic) for name in names}
+            for name in names:
+                totals[name] += scores[name]
+            for (a, b), stats in pairs.items():
+                stats.add(scores[a], scores[b])
+            episodes += 1
+
+            if episodes >= min_episodes and episodes % check_every == 0:
+                leader = max(names, key=lambda name: totals[name])
+                leader_pairs = [s for (a, b), s in pairs.items() if leader in (a, b)]
+                if all(s.p_value() < level for s in leader_pairs) or \
+                   all(s.p_value() < level for s in pairs.values()):
+                    stopped_early = episodes < max_episodes
+                    break
+    finally:
+        planning.verbose = verbose
+
+    return {
+        "episodes": episodes,
+        "stopped_early": stopped_early,
+        "level": level,
+        "mean_score": {name: totals[name] / max(1, episodes) for name in names},
+        "pairs": pairs,
+    }
+
+def print_report(result):
+    print(f"Episodes played: {result['episodes']}"
+          f"{' (stopped early)' if result['stopped_early'] else ''}")
+    for name, mean in sorted(result["mean_score"].items(), key=lambda kv: -kv[1]):
+        print(f"  {name:>12}: mean score {mean:9.1f}")
+    for (a, b), stats in result["pairs"].items():
+        verdict = "significant" if stats.p_value() < result["level"] else "undecided"
+        print(f"  {a} - {b}: mean diff {stats.mean():8.1f}, {a} wins {stats.win_rate():.0%},"
+              f" p = {stats.p_value():.4f} ({verdict})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare policies on common seeded maps")
+    parser.add_argument("--policies", nargs="+", choices=sorted(POLICIES), default=["basic", "advanced"])
+    parser.add_argument("--max-episodes", type=int, default=1000)
+    parser.add_argument("--check-every", type=int, default=20)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--wumpus", type=int, default=2)
+    parser.add_argument("--pit", type=float, default=0.2)
+    parser.add_argument("--dynamic", action="store_true", help="move wumpuses every params.wumpus_move_every steps")
+    args = parser.parse_args()
+
+    policies = {name: POLICIES[name] for name in args.policies}
+    result = run_tournament(policies, args.max_episodes, args.check_every, alpha=args.alpha,
+                            seed=args.seed, size=args.size, num_wumpus=args.wumpus,
+                            pit_prob=args.pit, dynamic=args.dynamic)
+    print_report(result)
@@ -9,26 +9,60 @@ MARGIN = 2
 ICON_SIZE = 48
 
 class Visualizer:
-    def __init__(self, env: Environment, agent: Agent):
+    def __init__(self, env: Environment, agent: Agent, cell_size=CELL_SIZE, view=None):
         self.env = env
         self.agent = agent
         self.shot_arrow = None
+        self.cell_size = cell_size
+        # Only a window of view = (columns, rows) cells is drawn; origin is its bottom-left cell
+        cols, rows = view if view else (env.size, env.size)
+        self.view = (min(cols, env.size), min(rows, env.size))
+        self.origin = [0, 0]
+        scale = cell_size / CELL_SIZE
+        icon = max(1, int(ICON_SIZE * scale))
+        small = max(1, int(24 * scale))
         # load & scale images
         self.images = {k: pygame.transform.scale(pygame.image.load(f"images/{'pit' if k=='pit' else k}.png"),
-                                                (ICON_SIZE, ICON_SIZE))
+                                                (icon, icon))
                        for k in ("agent","arrow","shot","breeze","pit","stench","treasure","wumpus")}
         for k in ("agent","pit","wumpus"):
             self.images[k] = pygame.transform.scale(self.images[k],
-                (CELL_SIZE - MARGIN*2, CELL_SIZE - MARGIN*2))
-        self.images["arrow"] = pygame.transform.scale(self.images["arrow"], (24, 24))
-        self.images["shot"] = pygame.transform.scale(self.images["shot"], (24, 24))
+                (cell_size - MARGIN*2, cell_size - MARGIN*2))
+        self.images["arrow"] = pygame.transform.scale(self.images["arrow"], (small, small))
+        self.images["shot"] = pygame.transform.scale(self.images["shot"], (small, small))
+
+    # Move the viewport by whole cells, staying on the board
+    def scroll(self, dx, dy):
+        cols, rows = self.view
+        self.origin[0] = max(0, min(self.env.size - cols, self.origin[0] + dx))
+        self.origin[1] = max(0, min(self.env.size - rows, self.origin[1] + dy))
+
+    # Scroll just enough to keep the agent a few cells away from the edge
+    def follow(self, margin=2):
+        cols, rows = self.view
+        ax, ay = self.agent.position
+        mx, my = min(margin, (cols - 1) // 2), min(margin, (rows - 1) // 2)
+        dx = min(0, ax - mx - self.origin[0]) + max(0, ax + mx - (self.origin[0] + cols - 1))
+        dy = min(0, ay - my - self.origin[1]) + max(0, ay + my - (self.origin[1] + rows - 1))
+        if dx or dy:
+            self.scroll(dx, dy)
+
+    def in_view(self, x, y):
+        return (0 <= x - self.origin[0] < self.view[0]) and (0 <= y - self.origin[1] < self.view[1])
+
+    # Top-left pixel of a board cell
+    def to_screen(self, x, y):
+        return ((x - self.origin[0]) * self.cell_size,
+                (self.view[1] - 1 - (y - self.origin[1])) * self.cell_size)
 
     def draw(self, surface):
-        for x in range(self.env.size):
-            for y in range(self.env.size):
+        size = self.cell_size
+        ox, oy = self.origin
+        for x in range(ox, ox + self.view[0]):
+            for y in range(oy, oy + self.view[1]):
                 cell = self.env.grid[x][y]
-                px, py = x * CELL_SIZE + MARGIN, (self.env.size - 1 - y) * CELL_SIZE + MARGIN
-                rect = pygame.Rect(px, py, CELL_SIZE - MARGIN * 2, CELL_SIZE - MARGIN * 2)
+                px, py = self.to_screen(x, y)
+                rect = pygame.Rect(px + MARGIN, py + MARGIN, size - MARGIN * 2, size - MARGIN * 2)
                 pygame.draw.rect(surface, (150,150,150) if cell.visited else (60,60,60), rect)
                 if cell.has_pit:
                     surface.blit(self.images["pit"], rect); continue
@@ -44,27 +78,28 @@ class Visualizer:
 
         # draw agent last
         ax, ay = self.agent.position
-        rect = pygame.Rect(ax * CELL_SIZE + MARGIN, (self.env.size - 1 - ay) * CELL_SIZE + MARGIN,
-                           CELL_SIZE - MARGIN * 2, CELL_SIZE - MARGIN * 2)
-        surface.blit(self.images["agent"], rect)
-
-        # Draw direction arrow
         dir_map = {"N": 90, "E": 0, "S": -90, "W": 180}
-        angle = dir_map.get(self.agent.direction, 0)
-        rotated_arrow = pygame.transform.rotate(self.images["arrow"], angle)
-        arrow_rect = rotated_arrow.get_rect(center=rect.center)
-        surface.blit(rotated_arrow, arrow_rect)
+        if self.in_view(ax, ay):
+            px, py = self.to_screen(ax, ay)
+            rect = pygame.Rect(px + MARGIN, py + MARGIN, size - MARGIN * 2, size - MARGIN * 2)
+            surface.blit(self.images["agent"], rect)
+
+            # Draw direction arrow
+            angle = dir_map.get(self.agent.direction, 0)
+            rotated_arrow = pygame.transform.rotate(self.images["arrow"], angle)
+            arrow_rect = rotated_arrow.get_rect(center=rect.center)
+            surface.blit(rotated_arrow, arrow_rect)
 
         # Draw flying shot if active
         if self.shot_arrow:
             x, y, direction = self.shot_arrow
             if 0 <= x < self.env.size and 0 <= y < self.env.size:
-                angle = dir_map.get(direction, 0)
-                rotated_shot = pygame.transform.rotate(self.images["shot"], angle)
-                px = x * CELL_SIZE + CELL_SIZE // 2
-                py = (self.env.size - 1 - y) * CELL_SIZE + CELL_SIZE // 2
-                shot_rect = rotated_shot.get_rect(center=(px, py))
-                surface.blit(rotated_shot, shot_rect)
+                if self.in_view(x, y):
+                    angle = dir_map.get(direction, 0)
+                    rotated_shot = pygame.transform.rotate(self.images["shot"], angle)
+                    px, py = self.to_screen(x, y)
+                    shot_rect = rotated_shot.get_rect(center=(px + size // 2, py + size // 2))
+                    surface.blit(rotated_shot, shot_rect)
 
                 # Check for wumpus hit
                 cell = self.env.grid[x][y]
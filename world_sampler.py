@@ -0,0 +1,324 @@
+import numpy as np
+from topology import topology
+from environment import Environment
+from inference import fact_cell
+
+# Random complete maps that agree with what the agent has observed, drawn in
+# batches as boolean arrays indexed [sample, x, y].
+#
+# Observations are taken into account exactly as long as rejection succeeds
+# (up to the small effect hazards have on how many cells the generator
+# could have put the wumpuses and gold on, which is ignored).
+#
+# Pits: unknown cells no unexplained breeze touches are drawn independently
+# from the prior. The others are grouped into components linked by shared
+# breezes; each component is drawn from the prior and redrawn until every
+# breeze in it is explained (rejection sampling). Rows that keep failing get
+# a pit for each unexplained breeze and are then mixed by Gibbs sweeps, which
+# never leave a breeze unexplained.
+#
+# Wumpuses: exactly `remaining` of them, on cells that may hold one and have
+# no sampled pit, with a wumpus next to every unexplained stench. Drawn
+# uniformly, and the whole row is redrawn on failure; rows that keep failing
+# are repaired and mixed by moving one wumpus at a time to an empty cell.
+#
+# Gold: the cell seen glittering, otherwise uniform over the unvisited cells
+# free of hazards, as Environment.place_gold draws it.
+#
+# Wumpuses are taken as static. A row that still breaks a constraint after
+# all that is flagged in Worlds.consistent; that is rare unless the
+# observations leave hardly any room, e.g. more wumpuses than free cells.
+
+REJECTION_ROUNDS = 32  # redraws before a row falls back to MCMC
+MCMC_SWEEPS = 8       # Gibbs sweeps, or wumpus moves per constrained cell, for fallback rows
+
+class Worlds:
+    def __init__(self, size, pits, wumpuses, gold, consistent):
+        self.size = size
+        self.pits = pits  # (n, size, size) bool
+        self.wumpuses = wumpuses  # (n, size, size) bool
+        self.gold = gold  # (n,) flat index of the gold cell, -1 for none
+        self.consistent = consistent  # (n,) bool, False where a constraint could not be met
+
+    def __len__(self):
+        return len(self.gold)
+
+    # Sample i as nested lists indexed [x][y] and the gold cell, for fast
+    # lookups one cell at a time
+    def world(self, i):
+        gold = int(self.gold[i])
+        return (self.pits[i].tolist(), self.wumpuses[i].tolist(),
+                divmod(gold, self.size) if gold >= 0 else None)
+
+    # Sample i as a playable Environment
+    def environment(self, i):
+        size = self.size
+        env = Environment(size=size, num_wumpus=0, pit_prob=0, generate_random=False)
+        for x, y in zip(*np.nonzero(self.pits[i])):
+            env.grid[x][y].has_pit = True
+        for x, y in zip(*np.nonzero(self.wumpuses[i])):
+            env.grid[x][y].has_wumpus = True
+            env.wumpus_positions.append([int(x), int(y)])
+            env.wumpus_lines.add(int(x), int(y))
+        gold = int(self.gold[i])
+        if gold >= 0:
+            x, y = divmod(gold, size)
+            env.grid[x][y].has_gold = True
+            env.grid[x][y].glitter = True
+        env.update_percepts()
+        env.num_wumpus = env.remaining_wumpuses = len(env.wumpus_positions)
+        return env
+
+class WorldSampler:
+    # Cells are (x, y) tuples. breezy and stenchy are the visited cells where
+    # a breeze or stench was felt; no_pit and no_wumpus the cells known free
+    # of them; pits and wumpuses the cells known to hold them.
+    def __init__(self, size, pit_prob, remaining, breezy=(), stenchy=(), no_pit=(), no_wumpus=(),
+                 pits=(), wumpuses=(), visited=(), gold=None, has_gold=False, seed=None):
+        topo = topology(size)
+        n = topo.count
+        self.size = size
+        self.pit_prob = pit_prob
+        self.rng = np.random.default_rng(seed)
+
+        def mask(cells):
+            out = np.zeros(n, dtype=bool)
+            for x, y in cells:
+                out[x * size + y] = True
+            return out
+
+        self.known_pits = mask(pits)
+        unknown = ~(mask(no_pit) | self.known_pits)
+        unknown[0] = False  # the start cell never holds a hazard
+        breezes = self.constraints(topo, breezy, self.known_pits, unknown)
+        self.components = self.split(breezes)
+        constrained = np.zeros(n, dtype=bool)
+        for cells, _ in self.components:
+            constrained[cells] = True
+        self.free_pits = np.flatnonzero(unknown & ~constrained)
+
+        self.known_wumpuses = mask(wumpuses)
+        open_ = ~(mask(no_wumpus) | self.known_wumpuses | self.known_pits)
+        open_[0] = False
+        self.wumpus_cells = np.flatnonzero(open_)  # cells a sampled wumpus may take
+        self.need = max(0, remaining - int(self.known_wumpuses.sum()))
+        stenches = self.constraints(topo, stenchy, self.known_wumpuses, open_)
+        column = {cell: k for k, cell in enumerate(self.wumpus_cells)}
+        self.stenches = np.zeros((len(stenches), len(self.wumpus_cells)), dtype=np.intp)
+        for k, cells in enumerate(stenches):
+            self.stenches[k, [column[c] for c in cells]] = 1
+
+        self.gold = -1 if gold is None else gold[0] * size + gold[1]
+        self.has_gold = has_gold
+        self.unvisited = ~mask(visited)
+
+    @classmethod
+    def from_knowledge(cls, k, pit_prob, seed=None):
+        return cls(k.size, pit_prob, k.remaining, k.breezy, k.stenchy, k.no_pit, k.no_wumpus,
+                   k.pits, k.wumpuses, k.visited, k.gold, k.has_gold, seed)
+
+    # From the percepts and conclusions in an InferenceEngine. The engine
+    # does not record where the agent has been, so pass visited for the gold
+    # to keep off cells already seen without glitter.
+    @classmethod
+    def from_inference(cls, inference, size, pit_prob, remaining, visited=(), gold=None,
+                       has_gold=False, seed=None):
+        kb = inference.kb
+        breezy, stenchy, pits, wumpuses = [], [], [], []
+        no_pit, no_wumpus = [], []
+        for fact in kb.facts:
+            if fact.startswith("Safe"):
+                no_pit.append(fact_cell(fact))
+                no_wumpus.append(fact_cell(fact))
+            elif fact[0] in "BSPW":
+                {"B": breezy, "S": stenchy, "P": pits, "W": wumpuses}[fact[0]].append(fact_cell(fact))
+        for fact in kb.neg_facts:
+            if fact[0] == "P":
+                no_pit.append(fact_cell(fact))
+            elif fact[0] == "W":
+                no_wumpus.append(fact_cell(fact))
+        for cell, status in inference.resolved.items():
+            if status == "unsafe":
+                pits.append(cell)
+            else:
+                no_pit.append(cell)
+                no_wumpus.append(cell)
+        return cls(size, pit_prob, remaining, breezy, stenchy, no_pit, no_wumpus,
+                   pits, wumpuses, visited, gold, has_gold, seed)
+
+    # For every percept not already explained by a known hazard, the flat
+    # indices of the neighbouring cells that could explain it
+    @staticmethod
+    def constraints(topo, felt, known, possible):
+        out = []
+        for x, y in felt:
+            around = topo.neighbor_indices(x, y)
+            if known[around].any():
+                continue
+            cells = around[possible[around]]
+            if cells.size:
+                out.append(tuple(int(c) for c in cells))
+        return out
+
+    # Group breezes that share cells: [(cells, A)] with A[k, j] = 1 when
+    # breeze k of the component may be explained by a pit on cells[j]
+    @staticmethod
+    def split(constraints):
+        parent = {}
+
+        def find(c):
+            while parent[c] != c:
+                parent[c] = parent[parent[c]]
+                c = parent[c]
+            return c
+
+        for cells in constraints:
+            for c in cells:
+                parent.setdefault(c, c)
+            for c in cells[1:]:
+                parent[find(c)] = find(cells[0])
+        groups = {}
+        for cells in constraints:
+            groups.setdefault(find(cells[0]), []).append(cells)
+        components = []
+        for group in groups.values():
+            cells = np.array(sorted({c for constraint in group for c in constraint}), dtype=np.intp)
+            column = {c: j for j, c in enumerate(cells)}
+            a = np.zeros((len(group), len(cells)), dtype=np.intp)
+            for k, constraint in enumerate(group):
+                a[k, [column[c] for c in constraint]] = 1
+            components.append((cells, a))
+        return components
+
+    def sample(self, n):
+        size = self.size
+        pits = self.draw_pits(n)
+        wumpuses, ok = self.draw_wumpuses(pits)
+        # A stench left unexplained rejects the whole row, pits included:
+        # pits decide where wumpuses fit, so keeping them would skew the pits.
+        # Once rejection has had its rounds, wumpuses are repaired instead.
+        for attempt in range(2 * REJECTION_ROUNDS):
+            if ok.all():
+                break
+            rows = np.flatnonzero(~ok)
+            pits[rows] = self.draw_pits(len(rows))
+            wumpuses[rows], ok[rows] = self.draw_wumpuses(pits[rows], attempt >= REJECTION_ROUNDS)
+        gold = self.draw_gold(pits, wumpuses)
+        return Worlds(size, pits.reshape(n, size, size), wumpuses.reshape(n, size, size), gold, ok)
+
+    def draw_pits(self, n):
+        rng = self.rng
+        pits = np.zeros((n, self.size * self.size), dtype=bool)
+        pits[:, self.known_pits] = True
+        pits[:, self.free_pits] = rng.random((n, len(self.free_pits))) < self.pit_prob
+        for cells, a in self.components:
+            pits[:, cells] = self.draw_component(n, a)
+        return pits
+
+    def draw_component(self, n, a):
+        rng, p = self.rng, self.pit_prob
+        x = rng.random((n, a.shape[1])) < p
+        bad = ((x @ a.T) == 0).any(axis=1)
+        for _ in range(REJECTION_ROUNDS):
+            if not bad.any():
+                return x
+            rows = np.flatnonzero(bad)
+            x[rows] = rng.random((len(rows), a.shape[1])) < p
+            bad[rows] = ((x[rows] @ a.T) == 0).any(axis=1)
+        if bad.any():
+            x[bad] = self.gibbs(x[bad], a)
+        return x
+
+    # Give every unexplained breeze a pit, then resample each cell in turn
+    # from the prior, keeping it a pit wherever it is the only explanation
+    def gibbs(self, x, a):
+        rng, p = self.rng, self.pit_prob
+        n, m = x.shape
+        counts = x @ a.T  # pits explaining each breeze, per row
+        for k in range(a.shape[0]):
+            rows = np.flatnonzero(counts[:, k] == 0)
+            if rows.size:
+                cells = np.flatnonzero(a[k])
+                pick = cells[rng.integers(len(cells), size=rows.size)]
+                x[rows, pick] = True
+                counts[rows] += a[:, pick].T
+        for _ in range(MCMC_SWEEPS):
+            for j in range(m):
+                touches = a[:, j] > 0
+                counts[:, touches] -= x[:, j, None]
+                x[:, j] = (counts[:, touches] == 0).any(axis=1) | (rng.random(n) < p)
+                counts[:, touches] += x[:, j, None]
+        return x
+
+    # (wumpuses, ok): flat wumpus masks for rows of pits, ok where every
+    # stench is explained. With repair, failed rows are fixed by moving
+    # wumpuses instead of being left for the caller to redraw.
+    def draw_wumpuses(self, pits, repair=False):
+        n = len(pits)
+        wumpuses = np.zeros_like(pits)
+        wumpuses[:, self.known_wumpuses] = True
+        a = self.stenches
+        if self.need == 0 or not len(self.wumpus_cells):
+            return wumpuses, np.full(n, self.need == 0 and not len(a))
+        open_ = ~pits[:, self.wumpus_cells]
+        room = open_.sum(axis=1) >= self.need
+        x = self.choose(open_)
+        ok = room & ((x @ a.T) > 0).all(axis=1)
+        rows = np.flatnonzero(room & ~ok)
+        if repair and rows.size:
+            x[rows], ok[rows] = self.swap(x[rows], open_[rows], a)
+        wumpuses[:, self.wumpus_cells] = x
+        return wumpuses, ok
+
+    # `need` open cells per row, uniformly; all of them where there are fewer
+    def choose(self, open_):
+        keys = self.rng.random(open_.shape)
+        keys[~open_] = 2.0
+        need = min(self.need, open_.shape[1])
+        picked = np.argpartition(keys, need - 1, axis=1)[:, :need]
+        x = np.zeros_like(open_)
+        np.put_along_axis(x, picked, True, axis=1)
+        return x & open_
+
+    # Move wumpuses to empty open cells until every stench is explained,
+    # never leaving more stenches unexplained than before, then keep moving
+    # them among consistent placements to mix; (x, ok)
+    def swap(self, x, open_, a):
+        rng = self.rng
+        n, m = x.shape
+        rows = np.arange(n)
+        counts = x @ a.T
+        for k in range(a.shape[0]):
+            need = counts[:, k] == 0
+            # Take a wumpus no other stench depends on to a cell next to stench k
+            spare = x & ~(((counts == 1) @ a) > 0)
+            target = open_ & ~x & (a[k] > 0)
+            src = np.argmax(rng.random((n, m)) * spare, axis=1)
+            dst = np.argmax(rng.random((n, m)) * target, axis=1)
+            move = need & spare[rows, src] & target[rows, dst]
+            x[rows[move], src[move]] = False
+            x[rows[move], dst[move]] = True
+            counts[move] += a[:, dst[move]].T - a[:, src[move]].T
+        broken = (counts == 0).sum(axis=1)
+        for _ in range(MCMC_SWEEPS * max(self.need, int(a.any(axis=0).sum()))):
+            src = np.argmax(rng.random((n, m)) * x, axis=1)
+            dst = np.argmax(rng.random((n, m)) * (open_ & ~x), axis=1)
+            moved = counts - a[:, src].T + a[:, dst].T
+            after = (moved == 0).sum(axis=1)
+            take = x[rows, src] & open_[rows, dst] & ~x[rows, dst] & (after <= broken)
+            x[rows[take], src[take]] = False
+            x[rows[take], dst[take]] = True
+            counts[take] = moved[take]
+            broken[take] = after[take]
+        return x, broken == 0
+
+    def draw_gold(self, pits, wumpuses):
+        n = len(pits)
+        if self.has_gold or self.gold >= 0:
+            return np.full(n, -1 if self.has_gold else self.gold, dtype=np.intp)
+        open_ = self.unvisited & ~pits & ~wumpuses
+        keys = self.rng.random(open_.shape)
+        keys[~open_] = -1.0
+        gold = np.argmax(keys, axis=1)
+        gold[~open_.any(axis=1)] = -1
+        return gold
@@ -0,0 +1,180 @@
+import numpy as np
+from topology import topology
+
+class WumpusBelief:
+    # prob[x, y] is the probability that a wumpus stands on (x, y).
+    # Cells with probability 0 are ruled out, cells with probability 1 are known.
+    #
+    # A percept only changes the cells around the agent, but renormalizing
+    # rescales every undecided cell. observe() keeps that rescaling in
+    # self.factor instead: an undecided cell's probability is prob * factor
+    # until apply_factor() writes it to the board, which everything reading
+    # the whole board does first. mass and known keep the sums normalize()
+    # needs, so a percept costs the same on any board size.
+    def __init__(self, size, num_wumpus, threshold=0.02):
+        self.size = size
+        self.count = num_wumpus
+        self.threshold = threshold      # risk below which a cell is treated as wumpus-free
+        self.pits = np.zeros((size, size), dtype=bool)   # known pits block wumpus moves
+        self.prob = np.zeros((size, size))
+        if size * size > 1:
+            self.prob[:] = min(1.0, num_wumpus / (size * size - 1))
+        self.prob[0, 0] = 0.0
+        self.topology = topology(size)
+        self.slices = self.topology.shifts
+        self.factor = 1.0  # pending scale of the undecided cells
+        self.recount()
+
+    # Recompute mass (the undecided cells' total, before factor), known
+    # (cells at 1) and top (an upper bound on an undecided cell, before factor)
+    def recount(self):
+        free = (self.prob > 0.0) & (self.prob < 1.0)
+        self.mass = float(self.prob[free].sum())
+        self.known = int((self.prob >= 1.0).sum())
+        self.top = float(self.prob[free].max()) if free.any() else 0.0
+
+    # Write the pending scale into the board
+    def apply_factor(self):
+        if self.factor != 1.0:
+            free = (self.prob > 0.0) & (self.prob < 1.0)
+            self.prob[free] *= self.factor
+            self.mass *= self.factor
+            self.top *= self.factor
+            self.factor = 1.0
+
+    # Probability of a wumpus on (x, y)
+    def value(self, x, y):
+        p = self.prob[x, y]
+        return p * self.factor if 0.0 < p < 1.0 else p
+
+    # Set the probability of a wumpus on (x, y), keeping the sums
+    def put(self, x, y, p):
+        if 0.0 < p < 1.0 and p >= self.factor:
+            self.apply_factor()  # so the stored value stays below 1
+        old = self.prob[x, y]
+        if old >= 1.0:
+            self.known -= 1
+        elif old > 0.0:
+            self.mass -= old
+        if p >= 1.0:
+            self.prob[x, y] = 1.0
+            self.known += 1
+        elif p > 0.0:
+            raw = p / self.factor
+            self.prob[x, y] = raw
+            self.mass += raw
+            self.top = max(self.top, raw)
+        else:
+            self.prob[x, y] = 0.0
+
+    def fork(self):
+        belief = WumpusBelief.__new__(WumpusBelief)
+        belief.__dict__ = self.__dict__.copy()
+        belief.prob = self.prob.copy()
+        belief.pits = self.pits.copy()
+        return belief
+
+    # Restore the state saved by fork(), for rolling back a checkpoint
+    def restore(self, saved):
+        self.__dict__ = saved.__dict__
+
+    def mark_pit(self, x, y):
+        self.pits[x, y] = True
+        self.put(x, y, 0.0)
+
+    def mark_wumpus(self, x, y):
+        self.put(x, y, 1.0)
+
+    def clear(self, x, y):
+        self.put(x, y, 0.0)
+
+    # Bayes update from a stench / no-stench reading while standing on (x, y).
+    # Cells are treated as independent, so P(stench) = 1 - prod(1 - p_n).
+    def observe(self, x, y, stench):
+        self.put(x, y, 0.0)
+        cells = self.topology.neighbors[x][y]
+        if not stench:
+            for cell in cells:
+                self.put(*cell, 0.0)
+        else:
+            near = [self.value(*cell) for cell in cells]
+            clear = 1.0
+            for p in near:
+                clear *= 1.0 - p
+            p_stench = 1.0 - clear
+            if p_stench > 0:
+                for cell, p in zip(cells, near):
+                    self.put(*cell, min(1.0, p / p_stench))
+        self.rescale()
+
+    # Push probabilities through one round of Environment.move_wumpuses:
+    # each wumpus stays or steps to a uniformly chosen neighbour that is not a pit.
+    # Collisions between wumpuses are ignored.
+    def predict(self):
+        self.apply_factor()
+        open_cells = ~self.pits
+        choices = np.ones((self.size, self.size))
+        allowed = []
+        for src, dst in self.slices:
+            can = np.zeros((self.size, self.size), dtype=bool)
+            can[src] = open_cells[dst]
+            choices += can
+            allowed.append(can)
+        share = self.prob / choices
+        moved = share.copy()
+        for (src, dst), can in zip(self.slices, allowed):
+            moved[dst] += np.where(can[src], share[src], 0.0)
+        self.prob = moved
+        self.normalize()
+
+    # Rescale undecided cells so the expected wumpus count matches self.count
+    def normalize(self):
+        self.apply_factor()
+        self.normalize_board()
+        self.recount()
+
+    def normalize_board(self):
+        for _ in range(8):
+            known = self.prob >= 1.0
+            free = (self.prob > 0.0) & ~known
+            target = self.count - known.sum()
+            if target <= 0:
+                self.prob[free] = 0.0
+                return
+            mass = self.prob[free].sum()
+            if mass == 0 or abs(mass - target) < 1e-9:
+                return
+            self.prob[free] *= target / mass
+            np.minimum(self.prob, 1.0, out=self.prob)
+
+    # normalize() after a few cells changed: while no undecided cell would
+    # reach 1, the rescaling only goes into self.factor
+    def rescale(self):
+        target = self.count - self.known
+        mass = self.mass * self.factor
+        if target <= 0:
+            self.normalize()
+            return
+        if mass <= 0 or abs(mass - target) < 1e-9:
+            return
+        scale = target / mass
+        if self.top * self.factor * scale >= 1.0:
+            self.normalize()
+            return
+        self.factor *= scale
+
+    def possible(self):
+        self.apply_factor()
+        return self.prob > self.threshold
+
+    # Cells known to hold a wumpus
+    def certain_cells(self):
+        self.apply_factor()
+        xs, ys = np.nonzero(self.prob >= 1.0)
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    # Cells that may hold a wumpus but are not known to
+    def uncertain_cells(self):
+        self.apply_factor()
+        xs, ys = np.nonzero((self.prob > self.threshold) & (self.prob < 1.0))
+        return list(zip(xs.tolist(), ys.tolist()))
@@ -0,0 +1,66 @@
+import hashlib
+from collections import OrderedDict
+
+# 64-bit Zobrist keys for arbitrary hashable items (fact names, poses, flags).
+# Keys are derived from the item itself, so they agree across episodes and
+# across processes; a state hash is the XOR of the keys of its parts and is
+# updated incrementally by XOR-ing a key in or out. Computed keys are
+# memoized, and the memo is cleared once it holds max_keys items, so a long
+# run does not grow it without bound.
+class ZobristKeys:
+    def __init__(self, salt=b"wumpus", max_keys=1 << 16):
+        self.salt = salt
+        self.max_keys = max_keys
+        self.keys = {}
+
+    def key(self, item):
+        k = self.keys.get(item)
+        if k is None:
+            digest = hashlib.blake2b(repr(item).encode(), digest_size=8, key=self.salt).digest()
+            if len(self.keys) >= self.max_keys:
+                self.keys.clear()
+            k = self.keys[item] = int.from_bytes(digest, "little")
+        return k
+
+    # Hash of a whole collection of items, for full recomputation
+    def combine(self, items):
+        h = 0
+        for item in items:
+            h ^= self.key(item)
+        return h
+
+keys = ZobristKeys()
+
+# Bounded LRU map from state hash to cached results
+class TranspositionTable:
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries